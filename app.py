@@ -6,17 +6,57 @@ import json
 import logging
 import tempfile
 import time
+STARTUP_BEGIN = time.perf_counter()  # Inicio del arranque para el desglose de tiempos
 import subprocess
 import re
-from flask import Flask, request, jsonify, send_file, render_template
-from google.cloud import speech
-from google.cloud import translate_v2 as translate
-from google.cloud import storage
-from google.cloud import texttospeech
-from google.cloud import texttospeech_v1beta1
-import moviepy.editor as mp
-from moviepy.config import change_settings
-from pydub import AudioSegment
+import threading
+import uuid
+import math
+import random
+import shutil
+import mimetypes
+from array import array
+from fractions import Fraction
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from collections import deque
+import hashlib
+import zipfile
+import codecs
+import importlib
+import base64
+import io
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, request, jsonify, send_file, render_template, Response, stream_with_context
+
+class LazyModule:
+    """Módulo que se importa en el primer acceso a uno de sus atributos"""
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    LAZY_IMPORT_TIMINGS[self._name] = round((time.perf_counter() - started) * 1000, 1)
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+# Librerías de Google Cloud: se importan al usarse por primera vez, no al arrancar
+LAZY_IMPORT_TIMINGS = {}
+speech = LazyModule('google.cloud.speech')
+translate = LazyModule('google.cloud.translate_v2')
+storage = LazyModule('google.cloud.storage')
+texttospeech = LazyModule('google.cloud.texttospeech')
+texttospeech_v1beta1 = LazyModule('google.cloud.texttospeech_v1beta1')
 
 # Configurar logging primero
 logging.basicConfig(
@@ -25,39 +65,98 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Configurar MoviePy para usar GPU (NVIDIA)
+# Desglose del tiempo de arranque por fase (ms)
+STARTUP_TIMINGS = []
+_startup_mark = STARTUP_BEGIN
+
+def mark_startup_phase(phase):
+    global _startup_mark
+    now = time.perf_counter()
+    STARTUP_TIMINGS.append({'phase': phase, 'ms': round((now - _startup_mark) * 1000, 1)})
+    _startup_mark = now
+
+mark_startup_phase('imports')
+
+# Detección de aceleración por GPU (NVIDIA): perezosa y cacheada en disco por binario de ffmpeg
+GPU_PROBE = {}
+GPU_PROBE_LOCK = threading.Lock()
+
+def ffmpeg_binary_fingerprint():
+    """Identidad de los binarios de ffmpeg y nvidia-smi (ruta, tamaño, mtime) como clave de la caché"""
+    parts = []
+    for binary in ('ffmpeg', 'nvidia-smi'):
+        path = shutil.which(binary)
+        if path:
+            st = os.stat(path)
+            parts.append(f"{os.path.realpath(path)}|{st.st_size}|{int(st.st_mtime)}")
+        else:
+            parts.append(f"{binary}:missing")
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
 def setup_gpu_acceleration():
     """Configurar aceleración por GPU para procesamiento de video"""
     try:
         # Verificar si FFMPEG con soporte NVIDIA está disponible
+        version = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True).stdout.split('\n')[0]
         result = subprocess.run(['ffmpeg', '-encoders'], capture_output=True, text=True)
         if 'h264_nvenc' in result.stdout:
-            # Configurar FFMPEG para usar GPU NVIDIA
-            change_settings({"FFMPEG_BINARY": "ffmpeg"})
-            
             # Detectar GPUs disponibles
             nvidia_result = subprocess.run(['nvidia-smi', '--query-gpu=index,name', '--format=csv,noheader,nounits'], 
                                          capture_output=True, text=True)
+            gpus = []
             if nvidia_result.returncode == 0:
-                gpus = nvidia_result.stdout.strip().split('\n')
-                logger.info(f"🎮 GPUs NVIDIA detectadas: {len(gpus)}")
-                for gpu in gpus:
-                    if gpu.strip():
-                        logger.info(f"   - {gpu.strip()}")
-                logger.info("🚀 Aceleración GPU habilitada - Selecciona GPU manualmente")
-            else:
-                logger.info("🎮 GPU NVIDIA detectada - Aceleración habilitada")
-            
-            return True
+                gpus = [gpu.strip() for gpu in nvidia_result.stdout.strip().split('\n') if gpu.strip()]
+            return {'available': True, 'gpus': gpus, 'ffmpeg_version': version}
         else:
-            logger.warning("⚠️ FFMPEG sin soporte NVIDIA - Usando CPU")
-            return False
+            return {'available': False, 'gpus': [], 'ffmpeg_version': version}
     except Exception as e:
         logger.warning(f"⚠️ No se pudo configurar GPU: {e}")
-        return False
+        return {'available': False, 'gpus': [], 'ffmpeg_version': None, 'error': str(e)}
+
+def log_gpu_probe(probe):
+    """Registrar el resultado de una detección de GPU recién ejecutada"""
+    if probe['available']:
+        logger.info(f"🎮 GPUs NVIDIA detectadas: {len(probe['gpus'])}")
+        for gpu in probe['gpus']:
+            logger.info(f"   - {gpu}")
+        logger.info("🚀 Aceleración GPU habilitada - Selecciona GPU manualmente")
+    else:
+        logger.warning("⚠️ FFMPEG sin soporte NVIDIA - Usando CPU")
+
+def gpu_available():
+    """¿Hay codificador h264_nvenc? Se detecta en el primer uso y se reutiliza mientras no cambie ffmpeg"""
+    with GPU_PROBE_LOCK:
+        if GPU_PROBE:
+            return GPU_PROBE['available']
+        started = time.perf_counter()
+        cache_path = None
+        probe = None
+        try:
+            cache_path = os.path.join(CACHE_DIR, 'capabilities', f"gpu_{ffmpeg_binary_fingerprint()}.json")
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                probe = {**json.load(f), 'cached': True}
+        except (OSError, ValueError):
+            pass
+        if probe is None:
+            probe = {**setup_gpu_acceleration(), 'cached': False}
+            log_gpu_probe(probe)
+            if cache_path and 'error' not in probe:
+                try:
+                    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                    with open(cache_path, 'w', encoding='utf-8') as f:
+                        json.dump({k: v for k, v in probe.items() if k != 'cached'}, f)
+                except OSError as e:
+                    logger.warning(f"⚠️ No se pudo guardar la detección de GPU: {e}")
+        probe['probe_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        GPU_PROBE.update(probe)
+    return probe['available']
 
-# Configurar GPU al iniciar
-GPU_AVAILABLE = setup_gpu_acceleration()
+def configure_moviepy():
+    """Ajustes de MoviePy que dependen de la GPU; llamar tras importar moviepy.editor"""
+    if gpu_available():
+        from moviepy.config import change_settings
+        # Configurar FFMPEG para usar GPU NVIDIA
+        change_settings({"FFMPEG_BINARY": "ffmpeg"})
 
 # Configuración por defecto (solo para fallback si no existe config.json)
 DEFAULT_CONFIG = {
@@ -78,7 +177,51 @@ DEFAULT_CONFIG = {
     'audio_sample_rate': 16000,
     'audio_quality': 'optimized',
     'audio_channels': 'mono',
-    'audio_optimization': 'dialogue'
+    'audio_optimization': 'dialogue',
+    'job_workers': 2,
+    'job_max_pending': 20,
+    'job_retention_seconds': 21600,
+    'transcript_cache_enabled': True,
+    'transcript_cache_max_mb': 200,
+    'speech_segmented': False,
+    'speech_segment_max_seconds': 55,
+    'speech_segment_workers': 4,
+    'speech_silence_db': -35,
+    'speech_silence_min_seconds': 0.3,
+    'translation_cache_enabled': True,
+    'translation_cache_max_mb': 50,
+    'translation_batch_size': 100,
+    'translation_batch_max_chars': 25000,
+    'speech_audio_encoding': 'flac',
+    'tts_max_input_bytes': 5000,
+    'tts_max_concurrency': 4,
+    'tts_requests_per_minute': 0,
+    'tts_cache_enabled': True,
+    'tts_cache_max_mb': 500,
+    'tts_assembly_mode': 'pcm',
+    'long_audio_poll_initial_seconds': 5,
+    'long_audio_poll_max_seconds': 60,
+    'long_audio_max_age_seconds': 86400,
+    'voice_catalog_ttl_seconds': 3600,
+    'tts_max_in_memory_text_bytes': 1048576,
+    'dialogue_gap_ms': 400,
+    'dialogue_sample_rate': 24000,
+    'batch_max_items': 500,
+    'batch_max_text_mb': 20,
+    'batch_upload_workers': 4,
+    'gcs_upload_chunk_mb': 16,
+    'gcs_upload_retry_deadline': 600,
+    'gcs_composite_threshold_mb': 256,
+    'gcs_composite_parts': 8,
+    'backend_mode': 'google',
+    'local_backend_latency_ms': 0,
+    'local_backend_error_rate': 0.0,
+    'backend_warmup': False,
+    'backend_warmup_timeout_seconds': 10,
+    'backend_reload_timeout_seconds': 60,
+    'video_parallel_encoding': True,
+    'video_parallel_workers': 0,
+    'video_segment_seconds': 10
 }
 
 # Cargar configuración desde archivo
@@ -117,6 +260,70 @@ def load_config():
         config['audio_quality'] = os.getenv('AUDIO_QUALITY', config.get('audio_quality', 'optimized'))
         config['audio_channels'] = os.getenv('AUDIO_CHANNELS', config.get('audio_channels', 'mono'))
         config['audio_optimization'] = os.getenv('AUDIO_OPTIMIZATION', config.get('audio_optimization', 'dialogue'))
+        config['speech_audio_encoding'] = os.getenv('SPEECH_AUDIO_ENCODING', config.get('speech_audio_encoding', 'flac'))
+        
+        # Configuración de trabajos en segundo plano
+        config['job_workers'] = int(os.getenv('JOB_WORKERS', config.get('job_workers', 2)))
+        config['job_max_pending'] = int(os.getenv('JOB_MAX_PENDING', config.get('job_max_pending', 20)))
+        config['job_retention_seconds'] = int(os.getenv('JOB_RETENTION_SECONDS', config.get('job_retention_seconds', 21600)))
+        
+        # Traducción por lotes
+        config['translation_batch_size'] = int(os.getenv('TRANSLATION_BATCH_SIZE', config.get('translation_batch_size', 100)))
+        config['translation_batch_max_chars'] = int(os.getenv('TRANSLATION_BATCH_MAX_CHARS', config.get('translation_batch_max_chars', 25000)))
+        
+        # Lotes de texto por petición
+        config['batch_max_items'] = int(os.getenv('BATCH_MAX_ITEMS', config.get('batch_max_items', 500)))
+        config['batch_max_text_mb'] = int(os.getenv('BATCH_MAX_TEXT_MB', config.get('batch_max_text_mb', 20)))
+        config['batch_upload_workers'] = int(os.getenv('BATCH_UPLOAD_WORKERS', config.get('batch_upload_workers', 4)))
+        
+        # Configuración de cachés en disco
+        config['transcript_cache_enabled'] = os.getenv('TRANSCRIPT_CACHE_ENABLED', str(config.get('transcript_cache_enabled', True))).lower() == 'true'
+        config['transcript_cache_max_mb'] = int(os.getenv('TRANSCRIPT_CACHE_MAX_MB', config.get('transcript_cache_max_mb', 200)))
+        config['translation_cache_enabled'] = os.getenv('TRANSLATION_CACHE_ENABLED', str(config.get('translation_cache_enabled', True))).lower() == 'true'
+        config['translation_cache_max_mb'] = int(os.getenv('TRANSLATION_CACHE_MAX_MB', config.get('translation_cache_max_mb', 50)))
+        config['tts_cache_enabled'] = os.getenv('TTS_CACHE_ENABLED', str(config.get('tts_cache_enabled', True))).lower() == 'true'
+        config['tts_cache_max_mb'] = int(os.getenv('TTS_CACHE_MAX_MB', config.get('tts_cache_max_mb', 500)))
+        
+        # Cuota de Text-to-Speech
+        config['tts_max_concurrency'] = int(os.getenv('TTS_MAX_CONCURRENCY', config.get('tts_max_concurrency', 4)))
+        config['tts_requests_per_minute'] = int(os.getenv('TTS_REQUESTS_PER_MINUTE', config.get('tts_requests_per_minute', 0)))
+        
+        # Síntesis de textos largos y diálogos
+        config['tts_max_input_bytes'] = int(os.getenv('TTS_MAX_INPUT_BYTES', config.get('tts_max_input_bytes', 5000)))
+        config['tts_assembly_mode'] = os.getenv('TTS_ASSEMBLY_MODE', config.get('tts_assembly_mode', 'pcm'))
+        config['tts_max_in_memory_text_bytes'] = int(os.getenv('TTS_MAX_IN_MEMORY_TEXT_BYTES', config.get('tts_max_in_memory_text_bytes', 1048576)))
+        config['long_audio_poll_initial_seconds'] = int(os.getenv('LONG_AUDIO_POLL_INITIAL_SECONDS', config.get('long_audio_poll_initial_seconds', 5)))
+        config['long_audio_poll_max_seconds'] = int(os.getenv('LONG_AUDIO_POLL_MAX_SECONDS', config.get('long_audio_poll_max_seconds', 60)))
+        config['long_audio_max_age_seconds'] = int(os.getenv('LONG_AUDIO_MAX_AGE_SECONDS', config.get('long_audio_max_age_seconds', 86400)))
+        config['voice_catalog_ttl_seconds'] = int(os.getenv('VOICE_CATALOG_TTL_SECONDS', config.get('voice_catalog_ttl_seconds', 3600)))
+        config['dialogue_gap_ms'] = int(os.getenv('DIALOGUE_GAP_MS', config.get('dialogue_gap_ms', 400)))
+        config['dialogue_sample_rate'] = int(os.getenv('DIALOGUE_SAMPLE_RATE', config.get('dialogue_sample_rate', 24000)))
+        
+        # Subidas a Cloud Storage
+        config['gcs_upload_chunk_mb'] = int(os.getenv('GCS_UPLOAD_CHUNK_MB', config.get('gcs_upload_chunk_mb', 16)))
+        config['gcs_upload_retry_deadline'] = int(os.getenv('GCS_UPLOAD_RETRY_DEADLINE', config.get('gcs_upload_retry_deadline', 600)))
+        config['gcs_composite_threshold_mb'] = int(os.getenv('GCS_COMPOSITE_THRESHOLD_MB', config.get('gcs_composite_threshold_mb', 256)))
+        config['gcs_composite_parts'] = int(os.getenv('GCS_COMPOSITE_PARTS', config.get('gcs_composite_parts', 8)))
+        
+        # Backends: 'google' (APIs reales) o 'local' (sustitutos sin conexión para pruebas de carga)
+        config['backend_mode'] = os.getenv('BACKEND_MODE', config.get('backend_mode', 'google'))
+        config['local_backend_latency_ms'] = int(os.getenv('LOCAL_BACKEND_LATENCY_MS', config.get('local_backend_latency_ms', 0)))
+        config['local_backend_error_rate'] = float(os.getenv('LOCAL_BACKEND_ERROR_RATE', config.get('local_backend_error_rate', 0.0)))
+        config['backend_warmup'] = os.getenv('BACKEND_WARMUP', str(config.get('backend_warmup', False))).lower() == 'true'
+        config['backend_warmup_timeout_seconds'] = int(os.getenv('BACKEND_WARMUP_TIMEOUT_SECONDS', config.get('backend_warmup_timeout_seconds', 10)))
+        config['backend_reload_timeout_seconds'] = int(os.getenv('BACKEND_RELOAD_TIMEOUT_SECONDS', config.get('backend_reload_timeout_seconds', 60)))
+        
+        # Reconocimiento segmentado en paralelo
+        config['speech_segmented'] = os.getenv('SPEECH_SEGMENTED', str(config.get('speech_segmented', False))).lower() == 'true'
+        config['speech_segment_workers'] = int(os.getenv('SPEECH_SEGMENT_WORKERS', config.get('speech_segment_workers', 4)))
+        config['speech_segment_max_seconds'] = float(os.getenv('SPEECH_SEGMENT_MAX_SECONDS', config.get('speech_segment_max_seconds', 55)))
+        config['speech_silence_db'] = float(os.getenv('SPEECH_SILENCE_DB', config.get('speech_silence_db', -35)))
+        config['speech_silence_min_seconds'] = float(os.getenv('SPEECH_SILENCE_MIN_SECONDS', config.get('speech_silence_min_seconds', 0.3)))
+        
+        # Codificación de video por segmentos en paralelo
+        config['video_parallel_encoding'] = os.getenv('VIDEO_PARALLEL_ENCODING', str(config.get('video_parallel_encoding', True))).lower() == 'true'
+        config['video_parallel_workers'] = int(os.getenv('VIDEO_PARALLEL_WORKERS', config.get('video_parallel_workers', 0)))
+        config['video_segment_seconds'] = float(os.getenv('VIDEO_SEGMENT_SECONDS', config.get('video_segment_seconds', 10)))
         
         logger.info(f"🌐 Servidor configurado para: {config['host']}:{config['port']}")
         return config
@@ -135,6 +342,7 @@ def save_config(config):
 
 # Cargar configuración
 CONFIG = load_config()
+mark_startup_phase('config')
 
 # Configurar credenciales de Google Cloud
 def setup_google_credentials():
@@ -203,31 +411,544 @@ load_env_file()
 
 # Configurar credenciales
 setup_google_credentials()
+mark_startup_phase('env_credentials')
 
 # Inicializar Flask
 app = Flask(__name__)
 
-# Inicializar clientes de Google Cloud
-try:
-    speech_client = speech.SpeechClient()
-    translate_client = translate.Client()
-    storage_client = storage.Client()
-    tts_client = texttospeech.TextToSpeechClient()
-    tts_long_client = texttospeech_v1beta1.TextToSpeechLongAudioSynthesizeClient()
-    logger.info("✅ Clientes de Google Cloud inicializados correctamente")
-except Exception as e:
-    logger.error(f"❌ Error inicializando clientes de Google Cloud: {e}")
-    speech_client = None
-    translate_client = None
-    storage_client = None
-    tts_client = None
-    tts_long_client = None
+# Backends: clientes de Google Cloud o sustitutos locales sin conexión (CONFIG['backend_mode'])
+BACKEND_NAMES = ('speech', 'translate', 'storage', 'tts', 'tts_long')
+BACKENDS = {}  # Clientes ya creados (None si no están disponibles)
+BACKENDS_LOCK = threading.Lock()
+BACKEND_INIT_TIMINGS = {}
+BACKEND_RELOAD_LOCK = threading.Lock()  # Una sola recarga a la vez
+BACKEND_STATUS = {'state': 'lazy', 'generation': 0, 'started_at': None, 'finished_at': None,
+                  'error': None, 'available': {}, 'warmup_ms': {}}
+LOCAL_STORAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'local_gcs')
+
+class LocalBackendError(Exception):
+    """Error inyectado por los backends locales"""
+
+class LocalBackend:
+    """Base de los sustitutos locales: latencia configurable e inyección de errores"""
+    def __init__(self, latency_ms=0, error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self._random = random.Random(0)
+        self._lock = threading.Lock()
+
+    def _simulate(self, operation):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        with self._lock:
+            failed = self.error_rate and self._random.random() < self.error_rate
+        if failed:
+            raise LocalBackendError(f'Error simulado en {type(self).__name__}.{operation} (503 Service Unavailable)')
+
+class LocalOperation:
+    """Operación de larga duración simulada con la interfaz done()/result()/metadata"""
+    def __init__(self, result_fn, duration_seconds, name=None):
+        self._result_fn = result_fn
+        self._duration = duration_seconds
+        self._started = time.time()
+        self._result = None
+        self._done = False
+        self.operation = SimpleNamespace(name=name or f'operations/local-{uuid.uuid4().hex}')
+
+    @property
+    def metadata(self):
+        elapsed = time.time() - self._started
+        percent = 100 if not self._duration else min(100, int(100 * elapsed / self._duration))
+        return SimpleNamespace(progress_percent=percent)
+
+    def done(self):
+        return time.time() - self._started >= self._duration
+
+    def result(self, timeout=None):
+        remaining = self._duration - (time.time() - self._started)
+        if remaining > 0:
+            time.sleep(remaining)
+        if not self._done:
+            self._result = self._result_fn()
+            self._done = True
+        return self._result
+
+LOCAL_VOCABULARY = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit',
+                    'sed', 'do', 'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore')
+
+def local_storage_path(root, bucket_name, blob_name=None):
+    """Ruta en disco de un bucket/objeto local; ValueError si se sale del directorio raíz"""
+    if not bucket_name or '/' in bucket_name or '\\' in bucket_name or '..' in bucket_name:
+        raise ValueError(f'Nombre de bucket no válido: {bucket_name!r}')
+    base = os.path.realpath(root)
+    bucket_path = os.path.realpath(os.path.join(base, bucket_name))
+    if not bucket_path.startswith(base + os.sep):
+        raise ValueError(f'Nombre de bucket no válido: {bucket_name!r}')
+    if blob_name is None:
+        return bucket_path
+    path = os.path.realpath(os.path.join(bucket_path, blob_name))
+    if not path.startswith(bucket_path + os.sep):
+        raise ValueError(f'Nombre de objeto no válido: {blob_name!r}')
+    return path
+
+def resolve_local_gcs_uri(uri):
+    """Ruta en disco de un URI gs:// del almacenamiento local"""
+    bucket, _, blob_name = uri[len('gs://'):].partition('/')
+    return local_storage_path(LOCAL_STORAGE_DIR, bucket, blob_name)
+
+def audio_duration_seconds(content, sample_rate):
+    """Duración de audio en memoria: WAV directo, FLAC/OGG con ffprobe, si no PCM 16-bit mono"""
+    try:
+        with wave.open(io.BytesIO(content), 'rb') as w:
+            return w.getnframes() / float(w.getframerate())
+    except (wave.Error, EOFError):
+        pass
+    if content[:4] in (b'fLaC', b'OggS'):
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', '-i', 'pipe:0'],
+            input=content, capture_output=True
+        )
+        try:
+            return float(result.stdout.decode().strip())
+        except ValueError:
+            pass
+    return len(content) / float(2 * (sample_rate or 16000))
+
+class LocalSpeechClient(LocalBackend):
+    """Speech-to-Text determinista: una palabra sintética cada 0,4 s de audio"""
+    word_seconds = 0.4
+
+    def _recognize(self, config, audio):
+        if audio.content:
+            content = audio.content
+        else:
+            with open(resolve_local_gcs_uri(audio.uri), 'rb') as f:
+                content = f.read()
+        duration = audio_duration_seconds(content, config.sample_rate_hertz)
+        seed = int(hashlib.sha256(content[:65536]).hexdigest()[:8], 16)
+        words = []
+        t = 0.0
+        i = 0
+        while t + self.word_seconds <= duration:
+            words.append(SimpleNamespace(
+                word=LOCAL_VOCABULARY[(seed + i) % len(LOCAL_VOCABULARY)],
+                start_time=timedelta(seconds=t),
+                end_time=timedelta(seconds=t + self.word_seconds * 0.8)
+            ))
+            t += self.word_seconds
+            i += 1
+        results = []
+        for start in range(0, len(words), 20):
+            group = words[start:start + 20]
+            transcript = ' '.join(w.word for w in group).capitalize() + '.'
+            results.append(SimpleNamespace(alternatives=[SimpleNamespace(transcript=transcript, words=group)]))
+        return SimpleNamespace(results=results)
+
+    def recognize(self, config, audio, **kwargs):
+        self._simulate('recognize')
+        return self._recognize(config, audio)
+
+    def long_running_recognize(self, config, audio, **kwargs):
+        self._simulate('long_running_recognize')
+        return LocalOperation(lambda: self._recognize(config, audio), self.latency_ms / 1000.0)
+
+class LocalTranslateClient(LocalBackend):
+    """Traductor eco: devuelve el mismo texto"""
+    def translate(self, values, target_language=None, format_=None, source_language=None, model=None):
+        self._simulate('translate')
+        items = [values] if isinstance(values, str) else list(values)
+        results = [{'translatedText': v, 'detectedSourceLanguage': source_language or 'und', 'input': v} for v in items]
+        return results[0] if isinstance(values, str) else results
+
+class LocalTTSClient(LocalBackend):
+    """Text-to-Speech que genera un tono de duración proporcional al texto"""
+    sample_rate = 24000
+    seconds_per_char = 0.06
+    max_input_bytes = 5000
+
+    def list_voices(self, language_code=None, **kwargs):
+        self._simulate('list_voices')
+        voices = []
+        for lang in ('es-ES', 'es-MX', 'en-US', 'en-GB', 'fr-FR', 'de-DE', 'it-IT', 'pt-BR', 'ja-JP', 'ko-KR', 'cmn-CN'):
+            if language_code and language_code != lang:
+                continue
+            for suffix, gender in (('Standard-A', 'FEMALE'), ('Standard-B', 'MALE'), ('Wavenet-C', 'FEMALE'), ('Neural2-D', 'MALE')):
+                voices.append(SimpleNamespace(
+                    name=f'{lang}-{suffix}', language_codes=[lang],
+                    ssml_gender=gender, natural_sample_rate_hertz=self.sample_rate
+                ))
+        return SimpleNamespace(voices=voices)
+
+    def tone_wav(self, duration_seconds, sample_rate=None):
+        """WAV PCM 16-bit mono con un tono de 400 Hz"""
+        sample_rate = sample_rate or self.sample_rate
+        period = int(sample_rate / 400)
+        cycle = array('h', (int(8000 * math.sin(2 * math.pi * n / period)) for n in range(period))).tobytes()
+        frames = int(duration_seconds * sample_rate)
+        pcm = (cycle * (frames // period + 1))[:frames * 2]
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(sample_rate)
+            w.writeframes(pcm)
+        return buffer.getvalue()
+
+    def synthesize_speech(self, input=None, voice=None, audio_config=None, **kwargs):
+        self._simulate('synthesize_speech')
+        source = input.ssml or input.text
+        if len(source.encode('utf-8')) > self.max_input_bytes:
+            raise LocalBackendError('400 Either `input.text` or `input.ssml` is longer than the limit of 5000 bytes.')
+        spoken = re.sub(r'<[^>]+>', '', source) if input.ssml else source
+        rate = audio_config.speaking_rate or 1.0
+        wav = self.tone_wav(max(0.2, len(spoken) * self.seconds_per_char / rate),
+                            audio_config.sample_rate_hertz or None)
+        encoding = audio_config.audio_encoding
+        if encoding == texttospeech.AudioEncoding.LINEAR16:
+            return SimpleNamespace(audio_content=wav)
+        codec = {texttospeech.AudioEncoding.MP3: ('mp3', 'libmp3lame'),
+                 texttospeech.AudioEncoding.OGG_OPUS: ('ogg', 'libopus')}.get(encoding, ('mp3', 'libmp3lame'))
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'wav', '-i', 'pipe:0',
+             '-c:a', codec[1], '-f', codec[0], 'pipe:1'],
+            input=wav, capture_output=True
+        )
+        if result.returncode != 0:
+            raise LocalBackendError(f'No se pudo codificar el tono: {result.stderr.decode(errors="ignore")[-300:]}')
+        return SimpleNamespace(audio_content=result.stdout)
+
+class LocalBlob:
+    """Objeto del bucket local respaldado por un archivo"""
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.path = local_storage_path(bucket.client.root, bucket.name, name)
+        self.content_type = mimetypes.guess_type(name)[0]
+        self.chunk_size = None
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else None
+
+    @property
+    def updated(self):
+        if not os.path.exists(self.path):
+            return None
+        return datetime.fromtimestamp(os.path.getmtime(self.path), timezone.utc)
+
+    def exists(self, **kwargs):
+        return os.path.exists(self.path)
+
+    def upload_from_file(self, file_obj, content_type=None, size=None, **kwargs):
+        self.bucket.client._simulate('upload')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'wb') as out:
+            if size is None:
+                shutil.copyfileobj(file_obj, out, 1024 * 1024)
+            else:
+                remaining = size
+                while remaining > 0:
+                    block = file_obj.read(min(remaining, 1024 * 1024))
+                    if not block:
+                        break
+                    out.write(block)
+                    remaining -= len(block)
+        self.content_type = content_type or self.content_type
+
+    def compose(self, sources, **kwargs):
+        self.bucket.client._simulate('compose')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'wb') as out:
+            for source in sources:
+                with open(source.path, 'rb') as f:
+                    shutil.copyfileobj(f, out, 1024 * 1024)
+
+    def upload_from_filename(self, filename, content_type=None, **kwargs):
+        with open(filename, 'rb') as f:
+            self.upload_from_file(f, content_type=content_type)
+
+    def upload_from_string(self, data, content_type=None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.upload_from_file(io.BytesIO(data), content_type=content_type)
+
+    def download_to_filename(self, filename, **kwargs):
+        self.bucket.client._simulate('download')
+        shutil.copyfile(self.path, filename)
+
+    def delete(self, **kwargs):
+        os.unlink(self.path)
+
+    def generate_signed_url(self, **kwargs):
+        return f"/api/local-storage/{self.bucket.name}/{self.name}"
+
+class LocalBucket:
+    """Bucket respaldado por un directorio en disco"""
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.path = local_storage_path(client.root, name)
+
+    def blob(self, blob_name, **kwargs):
+        return LocalBlob(self, blob_name)
+
+    def list_blobs(self, prefix=None, **kwargs):
+        self.client._simulate('list_blobs')
+        for root, _, files in os.walk(self.path):
+            for filename in sorted(files):
+                blob_name = os.path.relpath(os.path.join(root, filename), self.path).replace(os.sep, '/')
+                if not prefix or blob_name.startswith(prefix):
+                    yield LocalBlob(self, blob_name)
+
+    def delete_blobs(self, blobs, on_error=None, **kwargs):
+        for blob in blobs:
+            try:
+                blob.delete()
+            except FileNotFoundError:
+                if on_error:
+                    on_error(blob)
+
+class LocalStorageClient(LocalBackend):
+    """Cloud Storage sobre el sistema de archivos (local_gcs/<bucket>/<blob>)"""
+    def __init__(self, root=LOCAL_STORAGE_DIR, **kwargs):
+        super().__init__(**kwargs)
+        self.root = root
+
+    def bucket(self, bucket_name):
+        return LocalBucket(self, bucket_name)
+
+def google_backend_factories():
+    """Constructores de los clientes reales de Google Cloud"""
+    return {
+        'storage': lambda: storage.Client(),
+        'tts': lambda: texttospeech.TextToSpeechClient(),
+        'speech': lambda: speech.SpeechClient(),
+        'translate': lambda: translate.Client(),
+        'tts_long': lambda: texttospeech_v1beta1.TextToSpeechLongAudioSynthesizeClient()
+    }
+
+def local_backend_factories():
+    """Constructores de los sustitutos locales con la latencia y tasa de error configuradas"""
+    options = {
+        'latency_ms': CONFIG.get('local_backend_latency_ms', 0),
+        'error_rate': CONFIG.get('local_backend_error_rate', 0.0)
+    }
+    return {
+        'speech': lambda: LocalSpeechClient(**options),
+        'translate': lambda: LocalTranslateClient(**options),
+        'storage': lambda: LocalStorageClient(**options),
+        'tts': lambda: LocalTTSClient(**options),
+        'tts_long': lambda: None
+    }
+
+def create_backend(name):
+    """Crear un backend según CONFIG['backend_mode']; None si no está disponible"""
+    mode = CONFIG.get('backend_mode', 'google')
+    factories = local_backend_factories() if mode == 'local' else google_backend_factories()
+    started = time.perf_counter()
+    try:
+        client = factories[name]()
+    except Exception as e:
+        logger.warning(f"⚠️ Cliente {name} no disponible: {e}")
+        return None
+    if client is not None:
+        BACKEND_INIT_TIMINGS[name] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"✅ Backend {name} ({mode}) creado en {BACKEND_INIT_TIMINGS[name]} ms")
+    return client
+
+def warm_grpc_channel(client):
+    """Esperar a que el canal gRPC del cliente esté conectado"""
+    channel = getattr(getattr(client, 'transport', None), 'grpc_channel', None)
+    if channel is not None:
+        import grpc
+        grpc.channel_ready_future(channel).result(timeout=CONFIG.get('backend_warmup_timeout_seconds', 10))
+
+# Llamadas baratas que abren conexión y obtienen token antes de que llegue la primera petición real
+BACKEND_WARMUPS = {
+    'storage': lambda client: client.bucket(BUCKET_NAME).blob('.warmup').exists() if BUCKET_NAME else None,
+    'tts': lambda client: client.list_voices(language_code='es-ES'),
+    'speech': warm_grpc_channel,
+    'translate': lambda client: client.get_languages(),
+    'tts_long': warm_grpc_channel
+}
+
+def warm_backend(name, client):
+    """Calentar un cliente; un fallo aquí solo se registra (el cliente sigue siendo válido)"""
+    if CONFIG.get('backend_mode', 'google') == 'local':
+        return
+    started = time.perf_counter()
+    try:
+        BACKEND_WARMUPS[name](client)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo calentar el cliente {name}: {e}")
+        return
+    BACKEND_STATUS['warmup_ms'][name] = round((time.perf_counter() - started) * 1000, 1)
+
+def build_backends(names=BACKEND_NAMES):
+    """Crear y calentar en paralelo los backends indicados"""
+    def build(name):
+        client = create_backend(name)
+        if client is not None:
+            warm_backend(name, client)
+        return client
+    with ThreadPoolExecutor(max_workers=max(1, len(names)), thread_name_prefix='backend') as pool:
+        return dict(zip(names, pool.map(build, names)))
+
+def configured_backend_names():
+    """Backends que tiene sentido calentar al arrancar: sin credenciales no se crea ninguno y
+    Cloud Storage solo con bucket; el resto se sigue creando bajo demanda"""
+    if CONFIG.get('backend_mode', 'google') == 'local':
+        return BACKEND_NAMES
+    creds_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+    if not creds_path or not os.path.exists(creds_path):
+        return ()
+    return tuple(name for name in BACKEND_NAMES if name != 'storage' or BUCKET_NAME)
+
+def swap_backends(clients):
+    """Activar un juego de backends de golpe; quien ya tenga una referencia termina con el anterior"""
+    global BACKENDS
+    with BACKENDS_LOCK:
+        BACKENDS = dict(clients)
+        BACKEND_STATUS['generation'] += 1
+
+def reload_backends(wait=False, timeout=None, names=BACKEND_NAMES):
+    """Construir backends nuevos en segundo plano y activarlos al terminar.
+    
+    Retorna (clientes, error): con wait, los clientes si terminó a tiempo o el error si falló;
+    ({}, None) significa que la recarga sigue en curso.
+    """
+    done = threading.Event()
+    built = {}
+    outcome = {'error': None}
+    
+    def run():
+        with BACKEND_RELOAD_LOCK:
+            BACKEND_STATUS.update(state='building', started_at=time.time(), error=None, warmup_ms={})
+            try:
+                clients = build_backends(names)
+                swap_backends(clients)
+                built.update(clients)
+                BACKEND_STATUS.update(
+                    state='ready', finished_at=time.time(),
+                    available={name: client is not None for name, client in clients.items()}
+                )
+                available = [name for name, client in clients.items() if client is not None]
+                logger.info(f"✅ Backends ({CONFIG.get('backend_mode', 'google')}) listos: {', '.join(available) or 'ninguno'}")
+            except Exception as e:
+                logger.error(f"❌ Error recargando backends: {e}")
+                BACKEND_STATUS.update(state='failed', finished_at=time.time(), error=str(e))
+                outcome['error'] = str(e)
+            finally:
+                done.set()
+    
+    threading.Thread(target=run, name='backend-reload', daemon=True).start()
+    if wait:
+        done.wait(timeout)
+    return dict(built), outcome['error']
+
+def get_backend(name):
+    """Cliente activo para 'speech', 'translate', 'storage', 'tts' o 'tts_long' (creado bajo demanda)"""
+    backends = BACKENDS
+    if name in backends:
+        return backends[name]
+    with BACKENDS_LOCK:
+        if name not in BACKENDS:
+            BACKENDS[name] = create_backend(name)
+        return BACKENDS[name]
+
+mark_startup_phase('backends')
 
 # Configuración de Google Cloud Storage
-BUCKET_NAME = os.getenv('GOOGLE_STORAGE_BUCKET')
+BUCKET_NAME = os.getenv('GOOGLE_STORAGE_BUCKET') or ('local-bucket' if CONFIG.get('backend_mode') == 'local' else None)
 if not BUCKET_NAME:
     logger.warning("⚠️ GOOGLE_STORAGE_BUCKET no está configurado; se usará almacenamiento local hasta configurar .env")
 
+# Proceso padre del recargador de Flask: no arranca hilos de fondo (lo hace el proceso hijo)
+IS_RELOADER_PARENT = __name__ == '__main__' and CONFIG.get('debug', True) and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+
+# Opcional: crear y calentar en segundo plano los clientes configurados sin retrasar el arranque
+# (por defecto se crean bajo demanda y las librerías de Google no se importan hasta entonces)
+if CONFIG.get('backend_warmup', False) and not IS_RELOADER_PARENT and configured_backend_names():
+    reload_backends(names=configured_backend_names())
+
+# Motor de trabajos en segundo plano (procesos largos fuera del hilo de la petición)
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, CONFIG.get('job_workers', 2)), thread_name_prefix='job')
+JOBS = {}
+JOBS_LOCK = threading.Lock()
+
+def _public_job(job):
+    """Vista del trabajo sin el resultado completo"""
+    return {k: v for k, v in job.items() if k != 'result'}
+
+def prune_jobs():
+    """Eliminar trabajos terminados más antiguos que la retención configurada"""
+    retention = CONFIG.get('job_retention_seconds', 21600)
+    now = time.time()
+    with JOBS_LOCK:
+        expired = [job_id for job_id, job in JOBS.items()
+                   if job['status'] in ('completed', 'failed') and now - job['updated_at'] > retention]
+        for job_id in expired:
+            del JOBS[job_id]
+
+def update_job(job_id, **fields):
+    """Actualizar estado/etapa/progreso de un trabajo"""
+    with JOBS_LOCK:
+        job = JOBS.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        job['updated_at'] = time.time()
+
+def get_job(job_id):
+    with JOBS_LOCK:
+        job = JOBS.get(job_id)
+        return dict(job) if job else None
+
+def _run_job(job_id, func, args, kwargs):
+    update_job(job_id, status='running', started_at=time.time())
+    try:
+        result = func(job_id, *args, **kwargs)
+        update_job(job_id, status='completed', stage='completed', progress=100, result=result)
+        logger.info(f'✅ Trabajo {job_id} completado')
+    except Exception as e:
+        logger.error(f"❌ Error en trabajo {job_id}: {e}")
+        update_job(job_id, status='failed', error=str(e))
+
+def submit_job(kind, func, *args, **kwargs):
+    """Encolar un trabajo en el executor acotado; retorna el ID o None si la cola está llena"""
+    prune_jobs()
+    with JOBS_LOCK:
+        pending = sum(1 for job in JOBS.values() if job['status'] in ('queued', 'running'))
+        if pending >= CONFIG.get('job_max_pending', 20):
+            return None
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        JOBS[job_id] = {
+            'id': job_id,
+            'kind': kind,
+            'status': 'queued',
+            'stage': 'queued',
+            'progress': 0,
+            'error': None,
+            'created_at': now,
+            'updated_at': now,
+            'result': None
+        }
+    JOB_EXECUTOR.submit(_run_job, job_id, func, args, kwargs)
+    logger.info(f'📥 Trabajo {kind} encolado: {job_id}')
+    return job_id
+
+def job_accepted_response(job_id):
+    """Respuesta estándar para un trabajo encolado"""
+    if job_id is None:
+        return jsonify({'error': 'Demasiados trabajos en cola, inténtalo más tarde'}), 503
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'result_url': f'/api/jobs/{job_id}/result'
+    }), 202
+
 def get_language_model(source_lang):
     """Determinar el modelo de idioma basado en el idioma de origen"""
     # Idiomas asiáticos que requieren latest_short
@@ -242,14 +963,279 @@ def get_language_model(source_lang):
     
     return model
 
-def upload_audio_to_gcs(audio_path, blob_name):
+def get_audio_channel_count():
+    """Número de canales de audio según CONFIG['audio_channels']"""
+    return 2 if str(CONFIG.get('audio_channels', 'mono')).lower() == 'stereo' else 1
+
+# Formatos de audio para Speech-to-Text: extensión, códec de ffmpeg, content type y encoding de la API
+SPEECH_AUDIO_FORMATS = {
+    'linear16': {'extension': 'wav', 'codec': ['-c:a', 'pcm_s16le'], 'content_type': 'audio/wav', 'encoding': 'LINEAR16'},
+    'flac': {'extension': 'flac', 'codec': ['-c:a', 'flac', '-sample_fmt', 's16'], 'content_type': 'audio/flac', 'encoding': 'FLAC'},
+    'ogg_opus': {'extension': 'ogg', 'codec': ['-c:a', 'libopus', '-b:a', '32k', '-application', 'voip'], 'content_type': 'audio/ogg', 'encoding': 'OGG_OPUS'}
+}
+# Frecuencias admitidas por Opus
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+def get_speech_audio_format(name=None):
+    """Formato de extracción configurado (CONFIG['speech_audio_encoding'])"""
+    key = (name or CONFIG.get('speech_audio_encoding', 'flac')).lower()
+    return key if key in SPEECH_AUDIO_FORMATS else 'linear16'
+
+def extract_audio_ffmpeg(video_path, output_path, audio_format='linear16'):
+    """Extraer la pista de audio con un único proceso ffmpeg a la frecuencia y formato configurados"""
+    fmt = SPEECH_AUDIO_FORMATS[audio_format]
+    sample_rate = int(CONFIG.get('audio_sample_rate', 16000))
+    if audio_format == 'ogg_opus' and sample_rate not in OPUS_SAMPLE_RATES:
+        sample_rate = min(OPUS_SAMPLE_RATES, key=lambda rate: abs(rate - sample_rate))
+    channels = get_audio_channel_count()
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', video_path,
+        '-vn', '-sn', '-dn',
+        '-ac', str(channels),
+        '-ar', str(sample_rate)
+    ] + fmt['codec']
+    # Filtro de voz: recortar graves que no aportan a la inteligibilidad del diálogo
+    if str(CONFIG.get('audio_optimization', 'dialogue')).lower() == 'dialogue':
+        cmd += ['-af', 'highpass=f=80']
+    # Salida reproducible byte a byte (número de serie Ogg fijo, sin etiqueta de versión del encoder):
+    # la caché de transcripciones usa el hash de este archivo como clave
+    cmd += ['-fflags', '+bitexact', '-flags:a', '+bitexact', output_path]
+    
+    started = time.time()
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        stderr = (result.stderr or '').strip()
+        if 'does not contain any stream' in stderr or 'matches no streams' in stderr:
+            raise ValueError('El video no contiene pista de audio')
+        raise RuntimeError(f'ffmpeg no pudo extraer el audio: {stderr[-500:]}')
+    
+    logger.info(f'🎵 Audio extraído con ffmpeg ({audio_format}, {sample_rate} Hz, {channels} canal/es, '
+                f'{format_file_size(os.path.getsize(output_path))}) en {time.time() - started:.1f}s')
+    return {
+        'sample_rate': sample_rate,
+        'channels': channels,
+        'format': audio_format,
+        'encoding': fmt['encoding'],
+        'extension': fmt['extension'],
+        'content_type': fmt['content_type']
+    }
+
+# Caché persistente en disco (un archivo por entrada, expulsión LRU por tamaño)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+CACHE_LOCK = threading.Lock()
+
+def hash_file(path, block_size=1024 * 1024):
+    """SHA-256 del contenido de un archivo leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_entry_path(namespace, key, ext):
+    return os.path.join(CACHE_DIR, namespace, key[:2], f"{key}.{ext}")
+
+def cache_read(namespace, key, ext='json'):
+    """Leer una entrada de la caché y marcarla como usada recientemente"""
+    path = cache_entry_path(namespace, key, ext)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path, None)
+        return data
+    except (FileNotFoundError, OSError):
+        return None
+
+def cache_write(namespace, key, data, ext='json', max_bytes=None, evict=True):
+    """Escribir una entrada de forma atómica y expulsar las más antiguas si se supera max_bytes"""
+    path = cache_entry_path(namespace, key, ext)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudo escribir en caché {namespace}: {e}")
+        return
+    if evict and max_bytes:
+        cache_evict(namespace, max_bytes)
+
+def cache_evict(namespace, max_bytes):
+    """Eliminar las entradas usadas hace más tiempo hasta quedar por debajo de max_bytes"""
+    base_dir = os.path.join(CACHE_DIR, namespace)
+    with CACHE_LOCK:
+        entries = []
+        total = 0
+        for root, _, files in os.walk(base_dir):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= max_bytes:
+            return
+        entries.sort()
+        removed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        logger.info(f"🧹 Caché {namespace}: {removed} entradas expulsadas ({format_file_size(total)} en uso)")
+
+def transcript_cache_key(audio_path, source_lang, model, mode):
+    """Clave de la transcripción: hash del audio extraído + idioma + modelo + modo (segmented/long_running)"""
+    return hashlib.sha256(f"{hash_file(audio_path)}|{source_lang}|{model}|{mode}".encode('utf-8')).hexdigest()
+
+def get_cached_transcript(key):
+    if not CONFIG.get('transcript_cache_enabled', True):
+        return None
+    data = cache_read('transcripts', key)
+    if data is None:
+        return None
+    try:
+        return json.loads(data.decode('utf-8'))
+    except ValueError:
+        return None
+
+def store_cached_transcript(key, full_text, words):
+    if not CONFIG.get('transcript_cache_enabled', True):
+        return
+    payload = json.dumps({'full_text': full_text, 'words': words}, ensure_ascii=False).encode('utf-8')
+    cache_write('transcripts', key, payload, max_bytes=CONFIG.get('transcript_cache_max_mb', 200) * 1024 * 1024)
+
+# Subida de archivos a GCS: sesiones reanudables por chunks y subidas compuestas en paralelo
+UPLOAD_STATS = deque(maxlen=50)
+GCS_CHUNK_GRANULARITY = 256 * 1024  # chunk_size debe ser múltiplo de 256 KB
+
+def get_upload_chunk_size():
+    chunk_bytes = int(CONFIG.get('gcs_upload_chunk_mb', 16) * 1024 * 1024)
+    return max(GCS_CHUNK_GRANULARITY, chunk_bytes // GCS_CHUNK_GRANULARITY * GCS_CHUNK_GRANULARITY)
+
+def get_upload_retry():
+    """Reintento por chunk; DEFAULT_RETRY explícito porque el de la librería solo reintenta con precondiciones"""
+    from google.cloud.storage.retry import DEFAULT_RETRY
+    return DEFAULT_RETRY.with_deadline(CONFIG.get('gcs_upload_retry_deadline', 600))
+
+class RangeReader(io.RawIOBase):
+    """Vista de solo lectura de un rango de un archivo; tell() y seek() empiezan en 0"""
+    def __init__(self, file_obj, offset, length):
+        self._file = file_obj
+        self._offset = offset
+        self._length = length
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self._length
+        if pos < 0:
+            raise ValueError(f'Posición negativa: {pos}')
+        self._pos = min(pos, self._length)
+        return self._pos
+
+    def read(self, size=-1):
+        remaining = self._length - self._pos
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return b''
+        self._file.seek(self._offset + self._pos)
+        data = self._file.read(size)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+def upload_range_resumable(bucket, blob_name, path, content_type, offset=0, length=None):
+    """Subir un rango del archivo con una sesión reanudable por chunks"""
+    blob = bucket.blob(blob_name)
+    blob.chunk_size = get_upload_chunk_size()
+    with open(path, 'rb') as f:
+        if length is None:
+            length = os.fstat(f.fileno()).st_size - offset
+        # La librería exige que el stream empiece en la posición 0: cada parte lee su propia vista
+        blob.upload_from_file(RangeReader(f, offset, length), size=length, content_type=content_type, retry=get_upload_retry())
+    return blob
+
+def upload_composite(bucket, blob_name, path, content_type, size):
+    """Subir partes en paralelo como objetos temporales y componerlas en el objeto final"""
+    parts = max(2, min(32, CONFIG.get('gcs_composite_parts', 8)))
+    part_size = -(-size // parts)
+    part_size = -(-part_size // GCS_CHUNK_GRANULARITY) * GCS_CHUNK_GRANULARITY
+    ranges = [(offset, min(part_size, size - offset)) for offset in range(0, size, part_size)]
+    prefix = f"{blob_name}.parts-{uuid.uuid4().hex[:8]}"
+    part_names = [f"{prefix}/{i:02d}" for i in range(len(ranges))]
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix='gcs-part') as pool:
+            futures = [
+                pool.submit(upload_range_resumable, bucket, name, path, content_type, offset, length)
+                for name, (offset, length) in zip(part_names, ranges)
+            ]
+            part_blobs = [future.result() for future in futures]
+        final_blob = bucket.blob(blob_name)
+        final_blob.content_type = content_type
+        final_blob.compose(part_blobs, retry=get_upload_retry())
+    finally:
+        bucket.delete_blobs([bucket.blob(name) for name in part_names], on_error=lambda blob: None)
+    return final_blob, len(ranges)
+
+def upload_file_to_gcs(storage_client, path, blob_name, content_type):
+    """Subir un archivo eligiendo sesión reanudable o subida compuesta en paralelo; registra el throughput"""
+    bucket = storage_client.bucket(BUCKET_NAME)
+    size = os.path.getsize(path)
+    threshold = CONFIG.get('gcs_composite_threshold_mb', 256) * 1024 * 1024
+    started = time.time()
+    if size >= threshold:
+        blob, parts = upload_composite(bucket, blob_name, path, content_type, size)
+        method = 'composite'
+    else:
+        blob = upload_range_resumable(bucket, blob_name, path, content_type)
+        parts = 1
+        method = 'resumable'
+    elapsed = max(time.time() - started, 1e-6)
+    stats = {
+        'blob': blob_name,
+        'bytes': size,
+        'seconds': round(elapsed, 3),
+        'mbps': round(size * 8 / elapsed / 1_000_000, 2),
+        'method': method,
+        'parts': parts,
+        'finished_at': time.time()
+    }
+    UPLOAD_STATS.append(stats)
+    logger.info(f"📤 Subida {method} de {format_file_size(size)} en {elapsed:.1f}s ({stats['mbps']} Mbps, {parts} parte/s)")
+    return blob
+
+def upload_audio_to_gcs(audio_path, blob_name, content_type='audio/wav'):
     """Subir archivo de audio a Google Cloud Storage y retornar URI de GCS"""
+    storage_client = get_backend('storage')
     try:
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blob = bucket.blob(blob_name)
-        
-        with open(audio_path, 'rb') as audio_file:
-            blob.upload_from_file(audio_file, content_type='audio/wav')
+        upload_file_to_gcs(storage_client, audio_path, blob_name, content_type)
         
         # Retornar URI de GCS para Speech-to-Text
         gcs_uri = f"gs://{BUCKET_NAME}/{blob_name}"
@@ -262,11 +1248,8 @@ def upload_audio_to_gcs(audio_path, blob_name):
 
 def upload_audio_to_gcs_public(audio_path, blob_name):
     """Subir archivo de audio a Google Cloud Storage y retornar URL firmada"""
+    storage_client = get_backend('storage')
     try:
-        if storage_client and BUCKET_NAME:
-            bucket = storage_client.bucket(BUCKET_NAME)
-            blob = bucket.blob(blob_name)
-        
         # Determinar content type basado en la extensión
         if blob_name.endswith('.mp3'):
             content_type = 'audio/mpeg'
@@ -274,14 +1257,16 @@ def upload_audio_to_gcs_public(audio_path, blob_name):
             content_type = 'audio/wav'
         elif blob_name.endswith('.flac'):
             content_type = 'audio/flac'
+        elif blob_name.endswith('.ogg'):
+            content_type = 'audio/ogg'
+        elif blob_name.endswith('.zip'):
+            content_type = 'application/zip'
         else:
             content_type = 'audio/mpeg'
         
         if storage_client and BUCKET_NAME:
-            with open(audio_path, 'rb') as audio_file:
-                blob.upload_from_file(audio_file, content_type=content_type)
+            blob = upload_file_to_gcs(storage_client, audio_path, blob_name, content_type)
             # Generar URL firmada válida por 1 hora
-            from datetime import datetime, timedelta, timezone
             expiration = datetime.now(timezone.utc) + timedelta(hours=1)
             audio_url = blob.generate_signed_url(version="v4", expiration=expiration, method="GET")
             logger.info(f"☁️ Audio subido a GCS con URL firmada: {audio_url}")
@@ -304,12 +1289,10 @@ def upload_audio_to_gcs_public(audio_path, blob_name):
 
 def upload_video_to_gcs(video_path, blob_name):
     """Subir archivo de video a Google Cloud Storage"""
+    storage_client = get_backend('storage')
     try:
         if storage_client and BUCKET_NAME:
-            bucket = storage_client.bucket(BUCKET_NAME)
-            blob = bucket.blob(blob_name)
-            with open(video_path, 'rb') as video_file:
-                blob.upload_from_file(video_file, content_type='video/mp4')
+            upload_file_to_gcs(storage_client, video_path, blob_name, 'video/mp4')
             video_url = f"https://storage.googleapis.com/{BUCKET_NAME}/{blob_name}"
             logger.info(f"☁️ Video subido a GCS: {video_url}")
             return video_url
@@ -415,43 +1398,26 @@ def set_env_keys(kv):
     with open(env_path, 'w', encoding='utf-8') as f:
         f.write('\n'.join(lines) + '\n')
 
-storage_client = None
-tts_client = None
-speech_client = None
-translate_client = None
-
 def reinitialize_google_clients():
-    global storage_client, tts_client, speech_client, translate_client
+    global BUCKET_NAME
     creds_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
     bucket_name = os.getenv('GOOGLE_STORAGE_BUCKET')
-    result = {'credentials_path': creds_path, 'bucket': bucket_name, 'storage': False, 'tts': False, 'speech': False, 'translate': False}
+    mode = CONFIG.get('backend_mode', 'google')
+    result = {'credentials_path': creds_path, 'bucket': bucket_name, 'mode': mode, 'storage': False, 'tts': False, 'speech': False, 'translate': False}
     try:
-        if creds_path and os.path.exists(creds_path):
-            os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = creds_path
-            try:
-                from google.cloud import storage as gcs_storage
-                storage_client = gcs_storage.Client()
-                result['storage'] = True
-            except Exception:
-                storage_client = None
-            try:
-                from google.cloud import texttospeech as g_tts
-                tts_client = g_tts.TextToSpeechClient()
-                result['tts'] = True
-            except Exception:
-                tts_client = None
-            try:
-                from google.cloud import speech as g_speech
-                speech_client = g_speech.SpeechClient()
-                result['speech'] = True
-            except Exception:
-                speech_client = None
-            try:
-                from google.cloud import translate_v2 as g_translate
-                translate_client = g_translate.Client()
-                result['translate'] = True
-            except Exception:
-                translate_client = None
+        if mode == 'local' or (creds_path and os.path.exists(creds_path)):
+            if creds_path and os.path.exists(creds_path):
+                os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = creds_path
+            if bucket_name:
+                BUCKET_NAME = bucket_name
+            # Los clientes nuevos se crean y calientan aparte; las peticiones en curso siguen con los actuales
+            clients, error = reload_backends(wait=True, timeout=CONFIG.get('backend_reload_timeout_seconds', 60))
+            if error:
+                result['error'] = error
+            elif not clients:
+                result['pending'] = True
+            for name in ('storage', 'tts', 'speech', 'translate'):
+                result[name] = clients.get(name) is not None
         return result
     except Exception as e:
         return {**result, 'error': str(e)}
@@ -462,9 +1428,29 @@ def api_google_reload():
     ok = (status.get('storage') or status.get('tts') or status.get('speech') or status.get('translate'))
     return jsonify({'success': bool(ok), 'status': status})
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    """Consultar etapa y progreso de un trabajo"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Trabajo no encontrado'}), 404
+    return jsonify({'success': True, 'job': _public_job(job)})
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def api_job_result(job_id):
+    """Obtener el resultado final de un trabajo"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Trabajo no encontrado'}), 404
+    if job['status'] == 'failed':
+        return jsonify({'success': False, 'status': job['status'], 'error': job['error']}), 500
+    if job['status'] != 'completed':
+        return jsonify({'success': False, 'status': job['status'], 'stage': job['stage'], 'progress': job['progress']}), 202
+    return jsonify(job['result'])
+
 @app.route('/api/process', methods=['POST'])
 def process_video():
-    """Procesar video y generar subtítulos"""
+    """Encolar el procesamiento de video y retornar el ID del trabajo"""
     try:
         logger.info('🎬 Iniciando procesamiento de video...')
         
@@ -480,212 +1466,403 @@ def process_video():
         source_lang = request.form.get('source_lang', CONFIG.get('default_source_lang', 'en-US'))
         target_lang = request.form.get('target_lang', CONFIG.get('default_target_lang', 'es'))
         subtitle_format = request.form.get('subtitle_format', 'srt')
+        segmented = request.form.get('segmented', str(CONFIG.get('speech_segmented', False))).lower() == 'true'
         
         logger.info(f'📹 Video: {video_file.filename}')
         logger.info(f'🌍 Idioma origen: {source_lang}')
         logger.info(f'🌍 Idioma destino: {target_lang}')
         logger.info(f'📝 Formato: {subtitle_format}')
         
-        # Crear archivo temporal para el video
+        # Guardar video en un archivo temporal que pertenece al trabajo
         temp_fd, temp_video_path = tempfile.mkstemp(suffix='.mp4')
         os.close(temp_fd)
+        video_file.save(temp_video_path)
+        logger.info('📁 Video guardado temporalmente')
         
-        try:
-            # Guardar video
-            video_file.save(temp_video_path)
-            logger.info('📁 Video guardado temporalmente')
-            
-            # Extraer audio del video
-            logger.info('🎵 Extrayendo audio del video...')
-            video_clip = mp.VideoFileClip(temp_video_path)
-            audio_clip = video_clip.audio
-            
-            # Crear archivo temporal para el audio
-            temp_audio_fd, temp_audio_path = tempfile.mkstemp(suffix='.wav')
-            os.close(temp_audio_fd)
-            
-            try:
-                # Guardar audio
-                audio_clip.write_audiofile(temp_audio_path, verbose=False, logger=None)
-                logger.info('🎵 Audio extraído exitosamente')
-                
-                # Cerrar clips
-                audio_clip.close()
-                video_clip.close()
-                
-                # Subir audio a GCS
-                timestamp = int(time.time())
-                blob_name = f"audio/{timestamp}_{video_file.filename}.wav"
-                gcs_uri = upload_audio_to_gcs(temp_audio_path, blob_name)
-                
-                # Procesar con Speech-to-Text
-                logger.info('🎤 Procesando con Speech-to-Text...')
-                model = get_language_model(source_lang)
-                
-                config = speech.RecognitionConfig(
-                    encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-                    sample_rate_hertz=16000,
-                    language_code=source_lang,
-                    model=model,
-                    enable_automatic_punctuation=True,
-                    enable_word_time_offsets=True
-                )
-                
-                audio = speech.RecognitionAudio(uri=gcs_uri)
-                
-                # Usar long_running_recognize para archivos largos
-                operation = speech_client.long_running_recognize(config=config, audio=audio)
-                
-                # Polling manual para evitar timeouts
-                logger.info('⏳ Esperando resultados de Speech-to-Text...')
-                while not operation.done():
-                    time.sleep(10)
-                    logger.info('⏳ Procesando...')
-                
-                result = operation.result()
-                
-                if not result.results:
-                    return jsonify({'error': 'No se detectó habla en el audio'}), 400
-                
-                # Procesar resultados
-                full_text = ""
-                words = []
-                
-                for result in result.results:
-                    alternative = result.alternatives[0]
-                    full_text += alternative.transcript + " "
-                    
-                    for word_info in alternative.words:
-                        words.append({
-                            'word': word_info.word,
-                            'start_time': word_info.start_time.total_seconds(),
-                            'end_time': word_info.end_time.total_seconds()
-                        })
-                
-                logger.info(f'📝 Texto transcrito: {len(full_text)} caracteres')
-                
-                # Traducir texto
-                logger.info('🌍 Traduciendo texto...')
-                translate_source_lang = source_lang.split('-')[0] if '-' in source_lang else source_lang
-                translation = translate_client.translate(
-                    full_text,
-                    source_language=translate_source_lang,
-                    target_language=target_lang
-                )
-                
-                translated_text = translation['translatedText']
-                logger.info(f'🌍 Texto traducido: {len(translated_text)} caracteres')
-                
-                # Generar subtítulos
-                logger.info('📝 Generando subtítulos...')
-                if subtitle_format == 'srt':
-                    subtitles = generate_srt_subtitles(words, translated_text)
-                else:
-                    subtitles = generate_vtt_subtitles(words, translated_text)
-                
-                # Limpiar archivos temporales
-                os.unlink(temp_video_path)
-                os.unlink(temp_audio_path)
-                
-                logger.info('✅ Procesamiento completado exitosamente')
-                
-                return jsonify({
-                    'success': True,
-                    'subtitles': subtitles,
-                    'original_text': full_text.strip(),
-                    'translated_text': translated_text,
-                    'format': subtitle_format,
-                    'source_lang': source_lang,
-                    'target_lang': target_lang,
-                    'model_used': model
-                })
-                
-            finally:
-                # Limpiar archivo de audio temporal
-                try:
-                    os.unlink(temp_audio_path)
-                except:
-                    pass
-                    
-        finally:
-            # Limpiar archivo de video temporal
+        job_id = submit_job(
+            'subtitles', run_subtitle_job, temp_video_path, video_file.filename,
+            source_lang, target_lang, subtitle_format, segmented
+        )
+        if job_id is None:
             try:
                 os.unlink(temp_video_path)
             except:
                 pass
-                
+        return job_accepted_response(job_id)
+        
     except Exception as e:
         logger.error(f"❌ Error procesando video: {e}")
         return jsonify({'error': str(e)}), 500
 
-def generate_srt_subtitles(words, translated_text):
-    """Generar subtítulos en formato SRT"""
-    subtitles = []
-    subtitle_index = 1
-    words_per_subtitle = 8
-    current_time = 0
+def transcribe_audio_long_running(job_id, audio_path, filename, source_lang, model, audio_info):
+    """Subir el audio a GCS y transcribirlo con long_running_recognize; retorna (full_text, words)"""
+    speech_client = get_backend('speech')
+    # Subir audio a GCS
+    update_job(job_id, stage='uploading_audio', progress=15)
+    timestamp = int(time.time())
+    blob_name = f"audio/{timestamp}_{filename}.{audio_info['extension']}"
+    gcs_uri = upload_audio_to_gcs(audio_path, blob_name, audio_info['content_type'])
     
-    # Dividir texto traducido en palabras
-    translated_words = translated_text.split()
+    # Procesar con Speech-to-Text
+    update_job(job_id, stage='transcribing', progress=25)
+    logger.info('🎤 Procesando con Speech-to-Text...')
     
-    for i in range(0, len(translated_words), words_per_subtitle):
-        # Obtener palabras para este subtítulo
-        subtitle_words = translated_words[i:i + words_per_subtitle]
-        subtitle_text = ' '.join(subtitle_words)
-        
-        # Calcular tiempos basados en las palabras originales
-        start_word_index = i
-        end_word_index = min(i + words_per_subtitle - 1, len(words) - 1)
+    config = speech.RecognitionConfig(
+        encoding=getattr(speech.RecognitionConfig.AudioEncoding, audio_info['encoding']),
+        sample_rate_hertz=audio_info['sample_rate'],
+        audio_channel_count=audio_info['channels'],
+        language_code=source_lang,
+        model=model,
+        enable_automatic_punctuation=True,
+        enable_word_time_offsets=True
+    )
+    
+    audio = speech.RecognitionAudio(uri=gcs_uri)
+    
+    # Usar long_running_recognize para archivos largos
+    operation = speech_client.long_running_recognize(config=config, audio=audio)
+    
+    # Polling en el hilo del trabajo, reportando el progreso de la operación
+    logger.info('⏳ Esperando resultados de Speech-to-Text...')
+    while not operation.done():
+        time.sleep(10)
+        try:
+            percent = operation.metadata.progress_percent if operation.metadata else 0
+        except Exception:
+            percent = 0
+        update_job(job_id, progress=25 + int(percent * 0.5))
+        logger.info('⏳ Procesando...')
+    
+    response = operation.result()
+    
+    # Procesar resultados
+    full_text = ""
+    words = []
+    
+    for result in response.results:
+        alternative = result.alternatives[0]
+        full_text += alternative.transcript + " "
         
-        if start_word_index < len(words) and end_word_index < len(words):
-            start_time = words[start_word_index]['start_time']
-            end_time = words[end_word_index]['end_time']
-            
-            # Formatear tiempos
-            start_srt = format_srt_time(start_time)
-            end_srt = format_srt_time(end_time)
-            
-            # Crear subtítulo
-            subtitle = f"{subtitle_index}\n{start_srt} --> {end_srt}\n{subtitle_text}\n"
-            subtitles.append(subtitle)
-            subtitle_index += 1
+        for word_info in alternative.words:
+            words.append({
+                'word': word_info.word,
+                'start_time': word_info.start_time.total_seconds(),
+                'end_time': word_info.end_time.total_seconds()
+            })
     
-    return '\n'.join(subtitles)
+    return full_text, words
 
-def generate_vtt_subtitles(words, translated_text):
-    """Generar subtítulos en formato VTT"""
-    subtitles = ["WEBVTT\n"]
-    words_per_subtitle = 8
+def detect_silences(audio_path):
+    """Detectar silencios con el filtro silencedetect de ffmpeg; retorna [(inicio, fin)]"""
+    noise_db = CONFIG.get('speech_silence_db', -35)
+    min_silence = CONFIG.get('speech_silence_min_seconds', 0.3)
+    cmd = [
+        'ffmpeg', '-hide_banner', '-nostats', '-i', audio_path,
+        '-af', f'silencedetect=noise={noise_db}dB:d={min_silence}',
+        '-f', 'null', '-'
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    silences = []
+    start = None
+    for line in (result.stderr or '').splitlines():
+        m = re.search(r'silence_start: (-?[\d.]+)', line)
+        if m:
+            start = max(0.0, float(m.group(1)))
+            continue
+        m = re.search(r'silence_end: ([\d.]+)', line)
+        if m and start is not None:
+            silences.append((start, float(m.group(1))))
+            start = None
+    return silences
+
+# Límite de audio en línea de recognize síncrono
+SPEECH_INLINE_MAX_BYTES = 10 * 1024 * 1024
+
+def plan_audio_segments(duration, silences, max_seconds):
+    """Dividir la duración en segmentos < max_seconds cortando en el centro de silencios"""
+    segments = []
+    cursor = 0.0
+    min_seconds = max_seconds * 0.3
+    while duration - cursor > max_seconds:
+        limit = cursor + max_seconds
+        cut = None
+        for start, end in silences:
+            middle = (start + end) / 2
+            if cursor + min_seconds <= middle <= limit:
+                cut = middle
+            elif middle > limit:
+                break
+        if cut is None:
+            cut = limit
+        segments.append((cursor, cut))
+        cursor = cut
+    if duration - cursor > 0.01:
+        segments.append((cursor, duration))
+    return segments
+
+def read_wav_segment(audio_path, start, end):
+    """Extraer un tramo de un WAV PCM como bytes WAV en memoria"""
+    with wave.open(audio_path, 'rb') as src:
+        rate = src.getframerate()
+        src.setpos(int(start * rate))
+        frames = src.readframes(int((end - start) * rate))
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as dst:
+            dst.setnchannels(src.getnchannels())
+            dst.setsampwidth(src.getsampwidth())
+            dst.setframerate(rate)
+            dst.writeframes(frames)
+    return buffer.getvalue()
+
+def recognize_segment(audio_path, offset, end, config):
+    """Transcribir un segmento con recognize síncrono y desplazar sus tiempos al timeline global"""
+    speech_client = get_backend('speech')
+    content = read_wav_segment(audio_path, offset, end)
+    response = speech_client.recognize(config=config, audio=speech.RecognitionAudio(content=content))
+    transcript = []
+    words = []
+    for result in response.results:
+        alternative = result.alternatives[0]
+        transcript.append(alternative.transcript)
+        for word_info in alternative.words:
+            words.append({
+                'word': word_info.word,
+                'start_time': offset + word_info.start_time.total_seconds(),
+                'end_time': offset + word_info.end_time.total_seconds()
+            })
+    return ' '.join(t.strip() for t in transcript if t.strip()), words
+
+def transcribe_audio_segmented(job_id, audio_path, source_lang, model, audio_info):
+    """Transcribir en paralelo segmentos cortos cortados en silencios; retorna (full_text, words)"""
+    update_job(job_id, stage='segmenting_audio', progress=15)
+    with wave.open(audio_path, 'rb') as src:
+        duration = src.getnframes() / float(src.getframerate())
+        bytes_per_second = src.getframerate() * src.getnchannels() * src.getsampwidth()
+    # recognize síncrono: menos de 60 s y contenido en línea de hasta 10 MB (con margen para la cabecera WAV)
+    max_seconds = min(float(CONFIG.get('speech_segment_max_seconds', 55)), 59.0,
+                      SPEECH_INLINE_MAX_BYTES * 0.9 / bytes_per_second)
+    segments = plan_audio_segments(duration, detect_silences(audio_path), max_seconds)
+    workers = max(1, CONFIG.get('speech_segment_workers', 4))
+    logger.info(f'✂️ Audio de {duration:.1f}s dividido en {len(segments)} segmentos ({workers} en paralelo)')
     
-    # Dividir texto traducido en palabras
-    translated_words = translated_text.split()
+    config = speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+        sample_rate_hertz=audio_info['sample_rate'],
+        audio_channel_count=audio_info['channels'],
+        language_code=source_lang,
+        model=model,
+        enable_automatic_punctuation=True,
+        enable_word_time_offsets=True
+    )
+    
+    update_job(job_id, stage='transcribing', progress=25)
+    results = [None] * len(segments)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stt') as pool:
+        futures = {
+            pool.submit(recognize_segment, audio_path, start, end, config): i
+            for i, (start, end) in enumerate(segments)
+        }
+        done = 0
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            done += 1
+            update_job(job_id, progress=25 + int(50 * done / len(segments)))
     
-    for i in range(0, len(translated_words), words_per_subtitle):
-        # Obtener palabras para este subtítulo
-        subtitle_words = translated_words[i:i + words_per_subtitle]
-        subtitle_text = ' '.join(subtitle_words)
+    full_text = ' '.join(text for text, _ in results if text)
+    words = [word for _, segment_words in results for word in segment_words]
+    return full_text, words
+
+def run_subtitle_job(job_id, temp_video_path, filename, source_lang, target_lang, subtitle_format, segmented=False):
+    """Transcribir, traducir y generar subtítulos (se ejecuta en segundo plano)"""
+    try:
+        # Extraer audio del video
+        update_job(job_id, stage='extracting_audio', progress=5)
+        logger.info('🎵 Extrayendo audio del video...')
         
-        # Calcular tiempos basados en las palabras originales
-        start_word_index = i
-        end_word_index = min(i + words_per_subtitle - 1, len(words) - 1)
+        # El modo segmentado corta el WAV en memoria; el modo largo sube audio comprimido
+        audio_format = 'linear16' if segmented else get_speech_audio_format()
         
-        if start_word_index < len(words) and end_word_index < len(words):
-            start_time = words[start_word_index]['start_time']
-            end_time = words[end_word_index]['end_time']
+        # Crear archivo temporal para el audio
+        temp_audio_fd, temp_audio_path = tempfile.mkstemp(suffix=f".{SPEECH_AUDIO_FORMATS[audio_format]['extension']}")
+        os.close(temp_audio_fd)
+        
+        try:
+            audio_info = extract_audio_ffmpeg(temp_video_path, temp_audio_path, audio_format)
+            model = get_language_model(source_lang)
             
-            # Formatear tiempos
-            start_vtt = format_vtt_time(start_time)
-            end_vtt = format_vtt_time(end_time)
+            # Reutilizar la transcripción si este mismo audio ya se procesó
+            cache_key = transcript_cache_key(temp_audio_path, source_lang, model,
+                                             'segmented' if segmented else 'long_running')
+            cached = get_cached_transcript(cache_key)
+            transcript_cached = cached is not None
+            if transcript_cached:
+                logger.info('⚡ Transcripción encontrada en caché')
+                full_text, words = cached['full_text'], cached['words']
+            else:
+                if segmented:
+                    full_text, words = transcribe_audio_segmented(
+                        job_id, temp_audio_path, source_lang, model, audio_info
+                    )
+                else:
+                    full_text, words = transcribe_audio_long_running(
+                        job_id, temp_audio_path, filename, source_lang, model, audio_info
+                    )
+                if not words and not full_text.strip():
+                    raise ValueError('No se detectó habla en el audio')
+                store_cached_transcript(cache_key, full_text, words)
             
-            # Crear subtítulo
-            subtitle = f"{start_vtt} --> {end_vtt}\n{subtitle_text}\n"
-            subtitles.append(subtitle)
-    
-    return '\n'.join(subtitles)
-
-def format_srt_time(seconds):
-    """Formatear tiempo para SRT"""
-    hours = int(seconds // 3600)
+            logger.info(f'📝 Texto transcrito: {len(full_text)} caracteres')
+            
+            # Traducir cue por cue para conservar exactamente los tiempos de cada palabra
+            update_job(job_id, stage='translating', progress=80)
+            logger.info('🌍 Traduciendo texto...')
+            translate_source_lang = source_lang.split('-')[0] if '-' in source_lang else source_lang
+            cues = build_subtitle_cues(words)
+            translated_cues, translation_stats = translate_texts(
+                [cue['text'] for cue in cues], translate_source_lang, target_lang
+            )
+            for cue, translated in zip(cues, translated_cues):
+                cue['text'] = translated
+            
+            translated_text = ' '.join(translated_cues)
+            logger.info(f'🌍 Texto traducido: {len(translated_text)} caracteres')
+            
+            # Generar subtítulos
+            update_job(job_id, stage='generating_subtitles', progress=90)
+            logger.info('📝 Generando subtítulos...')
+            if subtitle_format == 'srt':
+                subtitles = generate_srt_subtitles(cues)
+            else:
+                subtitles = generate_vtt_subtitles(cues)
+            
+            logger.info('✅ Procesamiento completado exitosamente')
+            
+            return {
+                'success': True,
+                'subtitles': subtitles,
+                'original_text': full_text.strip(),
+                'translated_text': translated_text,
+                'format': subtitle_format,
+                'source_lang': source_lang,
+                'target_lang': target_lang,
+                'model_used': model,
+                'transcript_cached': transcript_cached,
+                'segmented': segmented,
+                'translation': translation_stats
+            }
+            
+        finally:
+            # Limpiar archivo de audio temporal
+            try:
+                os.unlink(temp_audio_path)
+            except:
+                pass
+                
+    finally:
+        # Limpiar archivo de video temporal
+        try:
+            os.unlink(temp_video_path)
+        except:
+            pass
+
+def build_subtitle_cues(words, words_per_subtitle=8):
+    """Agrupar las palabras transcritas en cues con sus tiempos originales"""
+    cues = []
+    for i in range(0, len(words), words_per_subtitle):
+        cue_words = words[i:i + words_per_subtitle]
+        cues.append({
+            'start_time': cue_words[0]['start_time'],
+            'end_time': cue_words[-1]['end_time'],
+            'text': ' '.join(w['word'] for w in cue_words)
+        })
+    return cues
+
+def translation_cache_key(text, source_lang, target_lang):
+    return hashlib.sha256(f"{source_lang}|{target_lang}|{text}".encode('utf-8')).hexdigest()
+
+def translate_texts(texts, source_lang, target_lang):
+    """Traducir una lista de textos en llamadas por lotes, con caché persistente delante de la API"""
+    translate_client = get_backend('translate')
+    use_cache = CONFIG.get('translation_cache_enabled', True)
+    translations = {}
+    pending = []
+    seen = set()
+    for text in texts:
+        if text in seen:
+            continue
+        seen.add(text)
+        cached = cache_read('translations', translation_cache_key(text, source_lang, target_lang), 'txt') if use_cache else None
+        if cached is not None:
+            translations[text] = cached.decode('utf-8')
+        else:
+            pending.append(text)
+    hits = len(translations)
+    
+    # Agrupar en lotes acotados por número de segmentos y caracteres por petición
+    batch_size = max(1, CONFIG.get('translation_batch_size', 100))
+    max_chars = CONFIG.get('translation_batch_max_chars', 25000)
+    batches = []
+    current = []
+    current_chars = 0
+    for text in pending:
+        if current and (len(current) >= batch_size or current_chars + len(text) > max_chars):
+            batches.append(current)
+            current = []
+            current_chars = 0
+        current.append(text)
+        current_chars += len(text)
+    if current:
+        batches.append(current)
+    
+    for batch in batches:
+        results = translate_client.translate(
+            batch,
+            source_language=source_lang,
+            target_language=target_lang,
+            format_='text'
+        )
+        for text, result in zip(batch, results):
+            translations[text] = result['translatedText']
+            if use_cache:
+                cache_write('translations', translation_cache_key(text, source_lang, target_lang),
+                            result['translatedText'].encode('utf-8'), ext='txt', evict=False)
+    if use_cache and batches:
+        cache_evict('translations', CONFIG.get('translation_cache_max_mb', 50) * 1024 * 1024)
+    
+    logger.info(f'🌍 Traducción: {len(pending)} textos en {len(batches)} llamadas, {hits} desde caché')
+    return [translations[text] for text in texts], {'api_calls': len(batches), 'cache_hits': hits, 'translated': len(pending)}
+
+def generate_srt_subtitles(cues):
+    """Generar subtítulos en formato SRT"""
+    subtitles = []
+    for subtitle_index, cue in enumerate(cues, start=1):
+        # Formatear tiempos
+        start_srt = format_srt_time(cue['start_time'])
+        end_srt = format_srt_time(cue['end_time'])
+        
+        # Crear subtítulo
+        subtitle = f"{subtitle_index}\n{start_srt} --> {end_srt}\n{cue['text']}\n"
+        subtitles.append(subtitle)
+    
+    return '\n'.join(subtitles)
+
+def generate_vtt_subtitles(cues):
+    """Generar subtítulos en formato VTT"""
+    subtitles = ["WEBVTT\n"]
+    for cue in cues:
+        # Formatear tiempos
+        start_vtt = format_vtt_time(cue['start_time'])
+        end_vtt = format_vtt_time(cue['end_time'])
+        
+        # Crear subtítulo
+        subtitle = f"{start_vtt} --> {end_vtt}\n{cue['text']}\n"
+        subtitles.append(subtitle)
+    
+    return '\n'.join(subtitles)
+
+def format_srt_time(seconds):
+    """Formatear tiempo para SRT"""
+    hours = int(seconds // 3600)
     minutes = int((seconds % 3600) // 60)
     secs = int(seconds % 60)
     millisecs = int((seconds % 1) * 1000)
@@ -713,9 +1890,9 @@ def text_to_audio():
         if text_file.filename == '':
             return jsonify({'error': 'No se seleccionó archivo'}), 400
         
-        text_content = text_file.read().decode('utf-8')
-        text_size = len(text_content.encode('utf-8'))
-        text_length = len(text_content)
+        # Tamaño por seek: el archivo solo se carga entero si es pequeño o va a la Long Audio API
+        text_upload = TextUpload(text_file.stream)
+        text_size = text_upload.size
         
         logger.info(f'📄 Archivo: {text_file.filename} ({text_size} bytes)')
         
@@ -726,6 +1903,7 @@ def text_to_audio():
         voice_name = (voice_name or '').strip()
         if not voice_name:
             voice_name = get_default_voice_name(voice_language)
+        voice_name = resolve_voice_name(voice_language, voice_name)
         voice_style = request.form.get('voice_style', 'none')
         effects_profile_id = request.form.get('effects_profile_id', '')
         audio_format = request.form.get('audio_format', CONFIG.get('default_audio_format', 'mp3'))
@@ -736,6 +1914,27 @@ def text_to_audio():
         logger.info(f'🎤 Voz: {voice_name} ({voice_language})')
         logger.info(f'⚙️ Configuración: {audio_format}, rate={speaking_rate}, pitch={pitch}')
         
+        streaming = request.form.get('stream', 'false').lower() == 'true'
+        chunked = streaming or (text_size > 5000 and (
+            (voice_style or '').lower() != 'none' or text_size > CONFIG.get('tts_max_in_memory_text_bytes', 1048576)
+        ))
+        if chunked:
+            # Por chunks se lee por bloques; la longitud en bytes aproxima la de caracteres para las pausas
+            text_content = text_upload
+            text_length = text_size
+        else:
+            text_content = text_upload.read_text()
+            text_length = len(text_content)
+        
+        # Modo progresivo: enviar cada chunk en cuanto esté listo
+        if streaming:
+            logger.info('📡 Usando procesamiento por chunks en streaming')
+            return stream_chunked_audio(
+                text_content, voice_language, voice_name, audio_format,
+                speaking_rate, pitch, volume_gain_db, text_file.filename,
+                voice_style, effects_profile_id, text_length
+            )
+        
         # Determinar método de procesamiento
         if text_size <= 5000:
             logger.info('📝 Usando API estándar (texto pequeño)')
@@ -745,8 +1944,8 @@ def text_to_audio():
                 voice_style, effects_profile_id, text_length
             )
         else:
-            if (voice_style or '').lower() != 'none':
-                logger.info('📝 Texto grande con estilo: usando procesamiento por chunks')
+            if chunked:
+                logger.info('📝 Texto grande con estilo o muy extenso: usando procesamiento por chunks')
                 result = process_chunked_audio(
                     text_content, voice_language, voice_name, audio_format,
                     speaking_rate, pitch, volume_gain_db, text_file.filename,
@@ -770,6 +1969,7 @@ def process_standard_audio(text_content, voice_language, voice_name, audio_forma
                           speaking_rate, pitch, volume_gain_db, filename,
                           voice_style, effects_profile_id, total_length):
     """Procesar audio usando la API estándar de Text-to-Speech"""
+    tts_client = get_backend('tts')
     try:
         # Configurar síntesis
         ssml_text = apply_voice_style(text_content, voice_style, total_length)
@@ -789,20 +1989,12 @@ def process_standard_audio(text_content, voice_language, voice_name, audio_forma
         )
         
         try:
-            response = tts_client.synthesize_speech(
-                input=synthesis_input,
-                voice=voice,
-                audio_config=audio_config
-            )
+            response = tts_synthesize(tts_client, synthesis_input, voice, audio_config)
         except Exception as e:
             if 'does not exist' in str(e) or 'not found' in str(e):
                 fallback_name = get_default_voice_name(voice_language)
                 voice = texttospeech.VoiceSelectionParams(language_code=voice_language, name=fallback_name)
-                response = tts_client.synthesize_speech(
-                    input=synthesis_input,
-                    voice=voice,
-                    audio_config=audio_config
-                )
+                response = tts_synthesize(tts_client, synthesis_input, voice, audio_config)
             else:
                 raise
         
@@ -843,7 +2035,8 @@ def process_standard_audio(text_content, voice_language, voice_name, audio_forma
 def process_long_audio(text_content, voice_language, voice_name, audio_format,
                       speaking_rate, pitch, volume_gain_db, filename,
                       voice_style, effects_profile_id, total_length):
-    """Procesar audio usando la Long Audio API de Text-to-Speech"""
+    """Iniciar la Long Audio API y registrar la operación; el seguimiento lo hace el poller en segundo plano"""
+    tts_long_client = get_backend('tts_long')
     try:
         # Subir texto a GCS
         timestamp = int(time.time())
@@ -851,7 +2044,8 @@ def process_long_audio(text_content, voice_language, voice_name, audio_format,
         text_gcs_uri = upload_text_to_gcs(text_content, text_blob_name)
         
         # Configurar salida
-        output_gcs_uri = f"gs://{BUCKET_NAME}/audio/synthesized/{timestamp}_long_audio.wav"
+        output_blob_name = f"audio/synthesized/{timestamp}_long_audio.wav"
+        output_gcs_uri = f"gs://{BUCKET_NAME}/{output_blob_name}"
         
         # Configurar síntesis con el modelo más grande
         ssml_text = apply_voice_style(text_content, voice_style, total_length)
@@ -889,35 +2083,36 @@ def process_long_audio(text_content, voice_language, voice_name, audio_format,
         logger.info('🎤 Iniciando síntesis con Long Audio API...')
         operation = tts_long_client.synthesize_long_audio(request=request)
         
-        # Polling manual
-        logger.info('⏳ Esperando síntesis...')
-        while not operation.done():
-            time.sleep(10)
-            logger.info('⏳ Procesando síntesis...')
-        
-        result = operation.result()
-        
-        if result.error:
-            logger.error(f"❌ Error en Long Audio API: {result.error}")
-            # Fallback a procesamiento por chunks
-            return process_chunked_audio(
-                text_content, voice_language, voice_name, audio_format,
-                speaking_rate, pitch, volume_gain_db, filename,
-                voice_style, effects_profile_id, total_length
-            )
-        
-        # Obtener URL del audio generado
-        audio_url = f"https://storage.googleapis.com/{BUCKET_NAME}/audio/synthesized/{timestamp}_long_audio.wav"
-        
-        logger.info(f'✅ Audio generado con Long Audio API: {audio_url}')
+        # Registrar la operación y responder sin esperar a que termine
+        op = register_long_audio_operation(
+            operation.operation.name,
+            output_gcs_uri,
+            f"https://storage.googleapis.com/{BUCKET_NAME}/{output_blob_name}",
+            f"long_audio_{timestamp}.wav",
+            text_content,
+            {
+                'voice_language': voice_language,
+                'voice_name': voice_name,
+                'audio_format': audio_format,
+                'speaking_rate': speaking_rate,
+                'pitch': pitch,
+                'volume_gain_db': volume_gain_db,
+                'filename': filename,
+                'voice_style': voice_style,
+                'effects_profile_id': effects_profile_id,
+                'total_length': total_length
+            }
+        )
         
         return jsonify({
             'success': True,
-            'audio_url': audio_url,
             'method': 'long_audio',
-            'text_preview': text_content[:200] + '...' if len(text_content) > 200 else text_content,
-            'filename': f"long_audio_{timestamp}.wav"
-        })
+            'status': op['status'],
+            'operation_id': op['id'],
+            'status_url': f"/api/long-audio/{op['id']}",
+            'text_preview': op['text_preview'],
+            'filename': op['filename']
+        }), 202
         
     except Exception as e:
         logger.error(f"❌ Error en Long Audio API: {e}")
@@ -928,153 +2123,613 @@ def process_long_audio(text_content, voice_language, voice_name, audio_format,
             voice_style, effects_profile_id, total_length
         )
 
-def process_chunked_audio(text_content, voice_language, voice_name, audio_format,
-                         speaking_rate, pitch, volume_gain_db, filename,
-                         voice_style, effects_profile_id, total_length):
-    """Procesar audio dividiendo el texto en chunks"""
+# Operaciones de Long Audio persistidas en disco: sobreviven a reinicios y las sigue un único poller
+LONG_AUDIO_DIR = os.path.join(CACHE_DIR, 'long_audio')
+LONG_AUDIO_STORE = os.path.join(LONG_AUDIO_DIR, 'operations.json')
+LONG_AUDIO_OPS = {}
+LONG_AUDIO_LOCK = threading.Lock()
+LONG_AUDIO_WAKE = threading.Event()
+LONG_AUDIO_POLLER = None
+LONG_AUDIO_PRIVATE_FIELDS = ('params', 'text_path', 'poll_interval', 'next_poll_at')
+
+def _public_long_audio(op):
+    """Vista de la operación sin parámetros internos"""
+    return {k: v for k, v in op.items() if k not in LONG_AUDIO_PRIVATE_FIELDS}
+
+def save_long_audio_store():
+    """Guardar las operaciones de forma atómica (llamar con LONG_AUDIO_LOCK tomado)"""
     try:
-        logger.info('📝 Procesando texto por chunks...')
-        
-        # Dividir texto en chunks de máximo 4000 caracteres
-        base_chunk = 4000
-        if voice_style and voice_style.lower() != 'none':
-            base_chunk = 3500
-        if total_length >= 15000:
-            base_chunk = 3200
-        chunk_size = base_chunk
-        chunks = [text_content[i:i+chunk_size] for i in range(0, len(text_content), chunk_size)]
-        
-        logger.info(f'📝 Texto dividido en {len(chunks)} chunks')
-        
-        audio_segments = []
-        
-        for i, chunk in enumerate(chunks):
-            logger.info(f'🎤 Procesando chunk {i+1}/{len(chunks)}...')
-            
-            # Configurar síntesis para este chunk
-            ssml_chunk = apply_voice_style(chunk, voice_style, total_length)
-            # Asegurar límite de tamaño de request cuando se usa SSML
-            if ssml_chunk and len(ssml_chunk) > 4500:
-                max_len = len(chunk)
-                while ssml_chunk and len(ssml_chunk) > 4500 and max_len > 500:
-                    max_len = int(max_len * 0.9)
-                    ssml_chunk = apply_voice_style(chunk[:max_len], voice_style, total_length)
-                # Si aún excede, usar SSML mínimo para este fragmento
-                if ssml_chunk and len(ssml_chunk) > 4500:
-                    ssml_chunk = apply_minimal_voice_style(chunk[:max_len], voice_style, total_length)
-            synthesis_input = texttospeech.SynthesisInput(ssml=ssml_chunk) if ssml_chunk else texttospeech.SynthesisInput(text=chunk)
-            
-            voice = texttospeech.VoiceSelectionParams(
-                language_code=voice_language,
-                name=voice_name
-            )
-            
-            audio_config = texttospeech.AudioConfig(
-                audio_encoding=get_audio_encoding(audio_format),
-                speaking_rate=speaking_rate,
-                pitch=pitch,
-                volume_gain_db=volume_gain_db,
-                effects_profile_id=[effects_profile_id] if effects_profile_id else None
-            )
-            
-            # Sintetizar chunk
+        os.makedirs(LONG_AUDIO_DIR, exist_ok=True)
+        tmp_path = f"{LONG_AUDIO_STORE}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'operations': LONG_AUDIO_OPS}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, LONG_AUDIO_STORE)
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudo guardar el registro de Long Audio: {e}")
+
+def load_long_audio_store():
+    try:
+        with open(LONG_AUDIO_STORE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('operations', {})
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ No se pudo leer el registro de Long Audio: {e}")
+        return {}
+
+def prune_long_audio_operations():
+    """Eliminar operaciones terminadas más antiguas que la retención de trabajos (con LONG_AUDIO_LOCK tomado)"""
+    retention = CONFIG.get('job_retention_seconds', 21600)
+    now = time.time()
+    expired = [op_id for op_id, op in LONG_AUDIO_OPS.items()
+               if op['status'] in ('completed', 'failed') and now - op['updated_at'] > retention]
+    for op_id in expired:
+        del LONG_AUDIO_OPS[op_id]
+
+def register_long_audio_operation(operation_name, output_uri, audio_url, filename, text_content, params):
+    """Persistir una operación recién iniciada (con el texto para el fallback) y despertar al poller"""
+    op_id = uuid.uuid4().hex
+    os.makedirs(LONG_AUDIO_DIR, exist_ok=True)
+    text_path = os.path.join(LONG_AUDIO_DIR, f"{op_id}.txt")
+    with open(text_path, 'w', encoding='utf-8') as f:
+        f.write(text_content)
+    now = time.time()
+    interval = CONFIG.get('long_audio_poll_initial_seconds', 5)
+    op = {
+        'id': op_id,
+        'status': 'running',
+        'stage': 'synthesizing',
+        'progress': 0,
+        'operation_name': operation_name,
+        'output_uri': output_uri,
+        'audio_url': audio_url,
+        'filename': filename,
+        'text_preview': text_content[:200] + '...' if len(text_content) > 200 else text_content,
+        'error': None,
+        'fallback_job_id': None,
+        'result': None,
+        'created_at': now,
+        'updated_at': now,
+        'params': params,
+        'text_path': text_path,
+        'poll_interval': interval,
+        'next_poll_at': now + interval
+    }
+    with LONG_AUDIO_LOCK:
+        prune_long_audio_operations()
+        LONG_AUDIO_OPS[op_id] = op
+        save_long_audio_store()
+    logger.info(f'📥 Operación Long Audio registrada: {op_id} ({operation_name})')
+    ensure_long_audio_poller()
+    LONG_AUDIO_WAKE.set()
+    return dict(op)
+
+def update_long_audio_operation(op_id, **fields):
+    with LONG_AUDIO_LOCK:
+        op = LONG_AUDIO_OPS.get(op_id)
+        if op is None:
+            return
+        op.update(fields)
+        op['updated_at'] = time.time()
+        save_long_audio_store()
+
+def get_long_audio_operation(op_id):
+    with LONG_AUDIO_LOCK:
+        op = LONG_AUDIO_OPS.get(op_id)
+        return dict(op) if op else None
+
+def finish_long_audio_operation(op_id, result):
+    """Marcar la operación como completada y borrar el texto guardado para el fallback"""
+    op = get_long_audio_operation(op_id)
+    update_long_audio_operation(op_id, status='completed', stage='completed', progress=100,
+                                audio_url=result['audio_url'], filename=result['filename'], result=result)
+    if op:
+        try:
+            os.unlink(op['text_path'])
+        except OSError:
+            pass
+
+def long_audio_progress(operation):
+    """Porcentaje de avance desde los metadatos de la operación (0 si no se pueden leer)"""
+    try:
+        metadata = texttospeech_v1beta1.SynthesizeLongAudioMetadata.deserialize(operation.metadata.value)
+        return round(metadata.progress_percentage, 1)
+    except Exception:
+        return 0
+
+def poll_long_audio_operation(op_id):
+    """Consultar una operación una vez y reprogramar la siguiente consulta con backoff exponencial"""
+    op = get_long_audio_operation(op_id)
+    if op is None:
+        return
+    now = time.time()
+    interval = min(op['poll_interval'] * 2, CONFIG.get('long_audio_poll_max_seconds', 60))
+    
+    if now - op['created_at'] > CONFIG.get('long_audio_max_age_seconds', 86400):
+        start_long_audio_fallback(op_id, 'la operación superó el tiempo máximo de espera')
+        return
+    
+    try:
+        tts_long_client = get_backend('tts_long')
+        if tts_long_client is None:
+            raise RuntimeError('Cliente Long Audio no disponible')
+        operation = tts_long_client.transport.operations_client.get_operation(op['operation_name'])
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo consultar la operación {op_id}: {e}")
+        update_long_audio_operation(op_id, poll_interval=interval, next_poll_at=now + interval)
+        return
+    
+    if not operation.done:
+        logger.info(f'⏳ Long Audio {op_id}: procesando síntesis...')
+        update_long_audio_operation(op_id, progress=long_audio_progress(operation),
+                                    poll_interval=interval, next_poll_at=now + interval)
+        return
+    
+    if operation.HasField('error') and operation.error.code:
+        start_long_audio_fallback(op_id, operation.error.message or f'código {operation.error.code}')
+        return
+    
+    logger.info(f"✅ Audio generado con Long Audio API: {op['audio_url']}")
+    finish_long_audio_operation(op_id, {
+        'success': True,
+        'audio_url': op['audio_url'],
+        'method': 'long_audio',
+        'text_preview': op['text_preview'],
+        'filename': op['filename']
+    })
+
+def start_long_audio_fallback(op_id, reason):
+    """Encolar el procesamiento por chunks como fallback de una operación fallida"""
+    logger.error(f"❌ Error en Long Audio API ({op_id}): {reason}")
+    job_id = submit_job('long_audio_fallback', run_long_audio_fallback, op_id)
+    if job_id is None:
+        update_long_audio_operation(op_id, status='failed', stage='failed', error=reason)
+        return
+    update_long_audio_operation(op_id, stage='fallback', progress=0, error=reason, fallback_job_id=job_id)
+
+def run_long_audio_fallback(job_id, op_id):
+    """Trabajo de fallback: sintetizar por chunks el texto guardado y completar la operación"""
+    op = get_long_audio_operation(op_id)
+    try:
+        result = None
+        with open(op['text_path'], 'rb') as f:
+            for event, data in iter_chunked_audio(TextUpload(f), **op['params']):
+                if event == 'chunk':
+                    progress = int((data['index'] + 1) / data['total'] * 90)
+                    update_job(job_id, stage='synthesizing', progress=progress)
+                    update_long_audio_operation(op_id, progress=progress)
+                elif event == 'done':
+                    result = data
+        finish_long_audio_operation(op_id, result)
+        return result
+    except Exception as e:
+        update_long_audio_operation(op_id, status='failed', stage='failed', error=str(e))
+        raise
+
+def long_audio_poller_loop():
+    """Hilo único que consulta las operaciones pendientes cuando les toca"""
+    while True:
+        now = time.time()
+        with LONG_AUDIO_LOCK:
+            pending = [op for op in LONG_AUDIO_OPS.values()
+                       if op['status'] == 'running' and op['stage'] == 'synthesizing']
+        due = [op['id'] for op in pending if op['next_poll_at'] <= now]
+        for op_id in due:
             try:
-                response = tts_client.synthesize_speech(
-                    input=synthesis_input,
-                    voice=voice,
-                    audio_config=audio_config
-                )
+                poll_long_audio_operation(op_id)
             except Exception as e:
-                if 'does not exist' in str(e) or 'not found' in str(e):
-                    fallback_name = get_default_voice_name(voice_language)
-                    voice = texttospeech.VoiceSelectionParams(language_code=voice_language, name=fallback_name)
-                    response = tts_client.synthesize_speech(
-                        input=synthesis_input,
-                        voice=voice,
-                        audio_config=audio_config
-                    )
-                elif ssml_chunk is not None and 'Invalid SSML' in str(e):
-                    minimal_ssml = apply_minimal_voice_style(chunk, voice_style, total_length)
-                    try:
-                        synthesis_input = texttospeech.SynthesisInput(ssml=minimal_ssml) if minimal_ssml else texttospeech.SynthesisInput(text=chunk)
-                        response = tts_client.synthesize_speech(
-                            input=synthesis_input,
-                            voice=voice,
-                            audio_config=audio_config
-                        )
-                    except Exception:
-                        synthesis_input = texttospeech.SynthesisInput(text=chunk)
-                        response = tts_client.synthesize_speech(
-                            input=synthesis_input,
-                            voice=voice,
-                            audio_config=audio_config
-                        )
-                else:
-                    raise
-            
-            # Guardar chunk temporal
-            chunk_filename = f"chunk_{i}_{int(time.time())}.{audio_format}"
-            chunk_path = os.path.join(tempfile.gettempdir(), chunk_filename)
-            
-            with open(chunk_path, 'wb') as out:
-                out.write(response.audio_content)
-            
-            audio_segments.append(chunk_path)
-        
-        # Combinar todos los chunks
-        logger.info('🔗 Combinando chunks de audio...')
-        combined_audio = AudioSegment.empty()
+                logger.error(f"❌ Error consultando Long Audio {op_id}: {e}")
+                update_long_audio_operation(op_id, next_poll_at=time.time() + CONFIG.get('long_audio_poll_max_seconds', 60))
+        if due:
+            continue
         
-        for segment_path in audio_segments:
+        # Dormir hasta la próxima consulta programada o hasta que se registre una operación nueva
+        timeout = min(op['next_poll_at'] for op in pending) - now if pending else CONFIG.get('long_audio_poll_max_seconds', 60)
+        LONG_AUDIO_WAKE.wait(max(1.0, timeout))
+        LONG_AUDIO_WAKE.clear()
+
+def ensure_long_audio_poller():
+    global LONG_AUDIO_POLLER
+    with LONG_AUDIO_LOCK:
+        if LONG_AUDIO_POLLER is not None and LONG_AUDIO_POLLER.is_alive():
+            return
+        LONG_AUDIO_POLLER = threading.Thread(target=long_audio_poller_loop, name='long-audio-poller', daemon=True)
+        LONG_AUDIO_POLLER.start()
+
+def resume_long_audio_operations():
+    """Cargar las operaciones persistidas tras un reinicio y retomar su seguimiento"""
+    operations = load_long_audio_store()
+    if not operations:
+        return
+    now = time.time()
+    with LONG_AUDIO_LOCK:
+        LONG_AUDIO_OPS.update(operations)
+        prune_long_audio_operations()
+        running = [op for op in LONG_AUDIO_OPS.values() if op['status'] == 'running']
+        for op in running:
+            op['next_poll_at'] = now
+        save_long_audio_store()
+    # Los fallbacks en curso se perdieron con el proceso: volver a encolarlos
+    for op in running:
+        if op['stage'] == 'fallback':
+            start_long_audio_fallback(op['id'], op.get('error') or 'reanudado tras reinicio')
+    if running:
+        logger.info(f'🔁 Reanudando {len(running)} operaciones de Long Audio')
+        ensure_long_audio_poller()
+
+@app.route('/api/long-audio/<op_id>', methods=['GET'])
+def long_audio_status(op_id):
+    """Estado de una operación de Long Audio"""
+    op = get_long_audio_operation(op_id)
+    if op is None:
+        return jsonify({'success': False, 'error': 'Operación no encontrada'}), 404
+    return jsonify({'success': True, 'operation': _public_long_audio(op)})
+
+class RateLimiter:
+    """Espaciar llamadas para no superar N peticiones por minuto (0 = sin límite)"""
+    def __init__(self, per_minute=0):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# Cuota de Text-to-Speech compartida por todas las peticiones del proceso
+TTS_SEMAPHORE = threading.BoundedSemaphore(max(1, CONFIG.get('tts_max_concurrency', 4)))
+TTS_RATE_LIMITER = RateLimiter(CONFIG.get('tts_requests_per_minute', 0))
+
+def tts_synthesize(tts_client, synthesis_input, voice, audio_config):
+    """synthesize_speech respetando la concurrencia y el ritmo máximos configurados"""
+    with TTS_SEMAPHORE:
+        TTS_RATE_LIMITER.wait()
+        return tts_client.synthesize_speech(
+            input=synthesis_input,
+            voice=voice,
+            audio_config=audio_config
+        )
+
+def iter_ordered_results(items, fn, workers, window=None):
+    """Ejecutar fn sobre items en un pool acotado y devolver los resultados en orden.
+    
+    Como mucho `window` tareas en vuelo, así items puede ser un generador sin materializarse entero.
+    """
+    window = window or workers * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tts') as pool:
+        try:
+            for index, item in enumerate(items):
+                pending.append(pool.submit(fn, index, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+def tts_cache_key(source, voice_language, voice_name, audio_config):
+    """Clave del audio sintetizado: SSML/texto, voz, idioma, configuración de audio y perfil de efectos"""
+    parts = {
+        'source': source,
+        'voice_name': voice_name,
+        'language': voice_language,
+        'encoding': int(audio_config.audio_encoding),
+        'speaking_rate': round(audio_config.speaking_rate or 0, 3),
+        'pitch': round(audio_config.pitch or 0, 3),
+        'volume_gain_db': round(audio_config.volume_gain_db or 0, 3),
+        'sample_rate_hertz': audio_config.sample_rate_hertz or 0,
+        'effects_profile_id': list(audio_config.effects_profile_id or [])
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def synthesize_tts_chunk(tts_client, chunk, ssml_chunk, voice_language, voice_name,
+                         audio_config, voice_style, total_length):
+    """Sintetizar un chunk (o leerlo de la caché); retorna (audio, desde_caché)"""
+    use_cache = CONFIG.get('tts_cache_enabled', True)
+    cache_key = tts_cache_key(ssml_chunk or chunk, voice_language, voice_name, audio_config)
+    if use_cache:
+        cached = cache_read('tts', cache_key, 'bin')
+        if cached is not None:
+            return cached, True
+    
+    audio_content = synthesize_tts_chunk_uncached(
+        tts_client, chunk, ssml_chunk, voice_language, voice_name,
+        audio_config, voice_style, total_length
+    )
+    if use_cache:
+        cache_write('tts', cache_key, audio_content, ext='bin',
+                    max_bytes=CONFIG.get('tts_cache_max_mb', 500) * 1024 * 1024)
+    return audio_content, False
+
+def synthesize_tts_chunk_uncached(tts_client, chunk, ssml_chunk, voice_language, voice_name,
+                                  audio_config, voice_style, total_length):
+    """Sintetizar un chunk con fallback de voz y escalera SSML → SSML mínimo → texto plano"""
+    synthesis_input = texttospeech.SynthesisInput(ssml=ssml_chunk) if ssml_chunk else texttospeech.SynthesisInput(text=chunk)
+    
+    voice = texttospeech.VoiceSelectionParams(
+        language_code=voice_language,
+        name=voice_name
+    )
+    
+    try:
+        response = tts_synthesize(tts_client, synthesis_input, voice, audio_config)
+    except Exception as e:
+        if 'does not exist' in str(e) or 'not found' in str(e):
+            fallback_name = get_default_voice_name(voice_language)
+            voice = texttospeech.VoiceSelectionParams(language_code=voice_language, name=fallback_name)
+            response = tts_synthesize(tts_client, synthesis_input, voice, audio_config)
+        elif ssml_chunk is not None and 'Invalid SSML' in str(e):
+            minimal_ssml = apply_minimal_voice_style(chunk, voice_style, total_length)
             try:
-                segment = AudioSegment.from_file(segment_path, format=audio_format)
+                synthesis_input = texttospeech.SynthesisInput(ssml=minimal_ssml) if minimal_ssml else texttospeech.SynthesisInput(text=chunk)
+                response = tts_synthesize(tts_client, synthesis_input, voice, audio_config)
             except Exception:
-                # Fallback básico
-                if audio_format == 'mp3':
-                    segment = AudioSegment.from_mp3(segment_path)
-                else:
-                    segment = AudioSegment.from_wav(segment_path)
-            combined_audio += segment
+                synthesis_input = texttospeech.SynthesisInput(text=chunk)
+                response = tts_synthesize(tts_client, synthesis_input, voice, audio_config)
+        else:
+            raise
+    return response.audio_content
+
+# Códecs de ffmpeg para codificar el audio final una sola vez
+AUDIO_OUTPUT_CODECS = {
+    'mp3': ['-c:a', 'libmp3lame', '-q:a', '2'],
+    'ogg': ['-c:a', 'libopus', '-b:a', '96k'],
+    'flac': ['-c:a', 'flac'],
+    'wav': ['-c:a', 'pcm_s16le']
+}
+
+def run_ffmpeg(args, description):
+    """Ejecutar ffmpeg y lanzar un error legible si falla"""
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y'] + args
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg falló ({description}): {(result.stderr or '').strip()[-500:]}")
+    return result
+
+def append_pcm_chunk(writer, chunk_path, params):
+    """Añadir los frames de un WAV al escritor abierto; retorna los parámetros de formato"""
+    with wave.open(chunk_path, 'rb') as src:
+        chunk_params = (src.getnchannels(), src.getsampwidth(), src.getframerate())
+        if params is None:
+            writer.setnchannels(chunk_params[0])
+            writer.setsampwidth(chunk_params[1])
+            writer.setframerate(chunk_params[2])
+        elif chunk_params != params:
+            raise ValueError(f'Formato PCM distinto entre chunks: {chunk_params} != {params}')
+        while True:
+            frames = src.readframes(65536)
+            if not frames:
+                break
+            writer.writeframesraw(frames)
+    return chunk_params
+
+def assemble_pcm_chunks(chunk_paths, output_path):
+    """Unir chunks WAV (LINEAR16) volcando su PCM en un único archivo, en tiempo y memoria lineales"""
+    params = None
+    with wave.open(output_path, 'wb') as writer:
+        for chunk_path in chunk_paths:
+            params = append_pcm_chunk(writer, chunk_path, params)
+    return output_path
+
+def encode_audio_file(input_path, output_path, audio_format):
+    """Codificar el audio ensamblado al formato final en un solo paso de ffmpeg"""
+    run_ffmpeg(['-i', input_path] + AUDIO_OUTPUT_CODECS.get(audio_format, AUDIO_OUTPUT_CODECS['mp3']) + [output_path],
+               f'codificar {audio_format}')
+    return output_path
+
+def concat_audio_files(chunk_paths, output_path):
+    """Unir chunks ya comprimidos (MP3/OGG) con el demuxer concat de ffmpeg sin recodificar"""
+    list_fd, list_path = tempfile.mkstemp(suffix='.txt')
+    try:
+        with os.fdopen(list_fd, 'w', encoding='utf-8') as f:
+            for chunk_path in chunk_paths:
+                escaped = chunk_path.replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        run_ffmpeg(['-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', output_path], 'concat de audio')
+    finally:
+        try:
+            os.unlink(list_path)
+        except OSError:
+            pass
+    return output_path
+
+def get_chunk_audio_format(audio_format, streaming=False):
+    """Formato en que se piden los chunks: LINEAR16 para ensamblar PCM, o el nativo en modo concat/streaming"""
+    if (streaming or CONFIG.get('tts_assembly_mode', 'pcm') == 'concat') and audio_format in ('mp3', 'ogg'):
+        return audio_format
+    return 'wav'
+
+def assemble_audio_chunks(chunk_paths, chunk_format, audio_format, final_path):
+    """Ensamblar los chunks en el archivo final según el formato en que se sintetizaron"""
+    if chunk_format != 'wav':
+        return concat_audio_files(chunk_paths, final_path)
+    if audio_format == 'wav':
+        return assemble_pcm_chunks(chunk_paths, final_path)
+    fd, pcm_path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        assemble_pcm_chunks(chunk_paths, pcm_path)
+        return encode_audio_file(pcm_path, final_path, audio_format)
+    finally:
+        try:
+            os.unlink(pcm_path)
+        except OSError:
+            pass
+
+def iter_chunked_audio(text_content, voice_language, voice_name, audio_format,
+                       speaking_rate, pitch, volume_gain_db, filename,
+                       voice_style, effects_profile_id, total_length, streaming=False):
+    """Pipeline por chunks como generador: ('start', info), ('chunk', info) en orden y ('done', resultado)"""
+    tts_client = get_backend('tts')
+    logger.info('📝 Procesando texto por chunks...')
+    
+    # Texto ya en memoria o un archivo subido que se lee por bloques en cada pasada
+    def iter_chunks():
+        blocks = text_content.blocks() if isinstance(text_content, TextUpload) else text_content
+        # Empaquetar oraciones/párrafos hasta el límite exacto de bytes por petición
+        return pack_tts_chunks(split_text_pieces(blocks), voice_style, total_length)
+    
+    # Primera pasada solo para contar: los chunks no se guardan en memoria
+    total_chunks = sum(1 for _ in iter_chunks())
+    
+    logger.info(f'📝 Texto dividido en {total_chunks} chunks')
+    
+    # Chunks en LINEAR16 para ensamblar PCM y codificar una sola vez (o nativos en modo concat)
+    chunk_format = get_chunk_audio_format(audio_format, streaming)
+    audio_config = texttospeech.AudioConfig(
+        audio_encoding=get_audio_encoding(chunk_format),
+        speaking_rate=speaking_rate,
+        pitch=pitch,
+        volume_gain_db=volume_gain_db,
+        effects_profile_id=[effects_profile_id] if effects_profile_id else None
+    )
+    run_id = uuid.uuid4().hex[:8]
+    # Todos los chunks escritos por los workers (incluidos los que nadie llegó a consumir)
+    written_paths = []
+    written_lock = threading.Lock()
+    cancelled = threading.Event()
+    
+    def synthesize(i, packed):
+        if cancelled.is_set():
+            return None, False
+        logger.info(f'🎤 Procesando chunk {i+1}/{total_chunks}...')
+        audio_content, cached = synthesize_tts_chunk(
+            tts_client, packed['text'], packed['ssml'], voice_language, voice_name,
+            audio_config, voice_style, total_length
+        )
+        if cancelled.is_set():
+            return None, cached
+        # Guardar chunk temporal
+        chunk_path = os.path.join(tempfile.gettempdir(), f"chunk_{run_id}_{i}.{chunk_format}")
+        with written_lock:
+            written_paths.append(chunk_path)
+        with open(chunk_path, 'wb') as out:
+            out.write(audio_content)
+        return chunk_path, cached
+    
+    yield 'start', {'chunks': total_chunks, 'chunk_format': chunk_format}
+    
+    audio_segments = []
+    final_path = None
+    # Sintetizar en paralelo (acotado por la cuota) y entregar cada chunk en orden en cuanto está listo;
+    # solo los chunks que cambiaron llegan a la API
+    workers = max(1, CONFIG.get('tts_max_concurrency', 4))
+    results = iter_ordered_results(iter_chunks(), synthesize, workers)
+    try:
+        cache_hits = 0
+        for index, (chunk_path, cached) in enumerate(results):
+            audio_segments.append(chunk_path)
+            cache_hits += 1 if cached else 0
+            yield 'chunk', {'index': index, 'total': total_chunks, 'path': chunk_path,
+                            'format': chunk_format, 'cached': cached}
+        logger.info(f'⚡ Caché TTS: {cache_hits} aciertos, {total_chunks - cache_hits} sintetizados')
         
-        # Guardar audio combinado
+        # Combinar todos los chunks en un solo paso lineal
+        logger.info('🔗 Combinando chunks de audio...')
         timestamp = int(time.time())
         final_filename = f"chunked_audio_{timestamp}.{audio_format}"
-        final_path = os.path.join(tempfile.gettempdir(), final_filename)
-        
-        combined_audio.export(final_path, format=audio_format)
+        final_path = os.path.join(tempfile.gettempdir(), f"{run_id}_{final_filename}")
+        assemble_audio_chunks(audio_segments, chunk_format, audio_format, final_path)
         
         # Subir a GCS
         blob_name = f"audio/synthesized/{timestamp}_{final_filename}"
         audio_url = upload_audio_to_gcs_public(final_path, blob_name)
         
-        # Limpiar archivos temporales
-        for segment_path in audio_segments:
-            try:
-                os.unlink(segment_path)
-            except:
-                pass
-        try:
-            os.unlink(final_path)
-        except:
-            pass
-        
         logger.info(f'✅ Audio combinado generado: {audio_url}')
         
-        return jsonify({
+        if isinstance(text_content, TextUpload):
+            text_preview, text_bytes, text_chars = text_content.preview, text_content.bytes_read, text_content.chars
+        else:
+            text_preview = text_content[:200] + '...' if len(text_content) > 200 else text_content
+            text_bytes, text_chars = len(text_content.encode('utf-8')), len(text_content)
+        
+        yield 'done', {
             'success': True,
             'audio_url': audio_url,
             'method': 'chunked',
-            'text_preview': text_content[:200] + '...' if len(text_content) > 200 else text_content,
+            'text_preview': text_preview,
+            'text_bytes': text_bytes,
+            'text_chars': text_chars,
             'filename': final_filename,
-            'chunks_processed': len(chunks)
-        })
+            'chunks_processed': total_chunks,
+            'tts_cache': {'hits': cache_hits, 'misses': total_chunks - cache_hits}
+        }
+    finally:
+        # Cliente desconectado o chunk fallido: cancelar lo pendiente y esperar a los workers en curso
+        # antes de borrar, para que ninguno escriba su chunk después de la limpieza
+        cancelled.set()
+        results.close()
+        with written_lock:
+            leftover = list(written_paths)
+        for segment_path in leftover + ([final_path] if final_path else []):
+            try:
+                os.unlink(segment_path)
+            except:
+                pass
+
+def process_chunked_audio(text_content, voice_language, voice_name, audio_format,
+                         speaking_rate, pitch, volume_gain_db, filename,
+                         voice_style, effects_profile_id, total_length):
+    """Procesar audio dividiendo el texto en chunks"""
+    try:
+        result = None
+        for event, data in iter_chunked_audio(
+            text_content, voice_language, voice_name, audio_format,
+            speaking_rate, pitch, volume_gain_db, filename,
+            voice_style, effects_profile_id, total_length
+        ):
+            if event == 'done':
+                result = data
+        return jsonify(result)
         
     except Exception as e:
         logger.error(f"❌ Error procesando chunks: {e}")
         return jsonify({'error': str(e)}), 500
 
+AUDIO_MIME_TYPES = {'wav': 'audio/wav', 'mp3': 'audio/mpeg', 'ogg': 'audio/ogg', 'flac': 'audio/flac'}
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def stream_chunked_audio(*args):
+    """Respuesta SSE que envía cada chunk de audio en orden en cuanto se sintetiza"""
+    def generate():
+        try:
+            for event, data in iter_chunked_audio(*args, streaming=True):
+                if event == 'chunk':
+                    with open(data['path'], 'rb') as f:
+                        audio_b64 = base64.b64encode(f.read()).decode('ascii')
+                    payload = {
+                        'index': data['index'],
+                        'total': data['total'],
+                        'cached': data['cached'],
+                        'mime_type': AUDIO_MIME_TYPES.get(data['format'], 'audio/mpeg'),
+                        'audio': audio_b64
+                    }
+                else:
+                    payload = data
+                yield sse_event(event, payload)
+        except Exception as e:
+            logger.error(f"❌ Error en streaming de audio: {e}")
+            yield sse_event('error', {'error': str(e)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 def upload_text_to_gcs(text_content, blob_name):
     """Subir texto a Google Cloud Storage"""
+    storage_client = get_backend('storage')
     try:
         bucket = storage_client.bucket(BUCKET_NAME)
         blob = bucket.blob(blob_name)
@@ -1099,10 +2754,21 @@ def get_audio_encoding(format_name):
     }
     return encodings.get(format_name, texttospeech.AudioEncoding.MP3)
 
-def apply_voice_style(text, style, total_length):
+# Envoltorios SSML por estilo de voz (apertura, cierre)
+VOICE_STYLE_WRAPPERS = {
+    'conversational': ("<speak><prosody rate=\"medium\"><emphasis level=\"moderate\">", "</emphasis></prosody></speak>"),
+    'narrative': ("<speak><prosody rate=\"slow\"><emphasis level=\"moderate\">", "</emphasis></prosody></speak>"),
+    'news': ("<speak><prosody rate=\"fast\"><emphasis level=\"reduced\">", "</emphasis></prosody></speak>"),
+    'presenter': ("<speak><prosody rate=\"medium\"><emphasis level=\"strong\">", "</emphasis></prosody></speak>"),
+    'storytelling': ("<speak><prosody rate=\"slow\"><emphasis level=\"strong\">", "</emphasis></prosody></speak>"),
+    'enthusiastic': ("<speak><prosody rate=\"fast\"><emphasis level=\"strong\">", "</emphasis></prosody></speak>"),
+    'calm': ("<speak><prosody rate=\"medium\"><emphasis level=\"reduced\">", "</emphasis></prosody></speak>"),
+    'advertising': ("<speak><prosody rate=\"medium\"><emphasis level=\"strong\">", "</emphasis></prosody></speak>")
+}
+
+def get_style_break_ms(style, total_length):
+    """Pausa tras signos de puntuación según estilo y longitud total del texto"""
     s = (style or '').lower()
-    if s in ('', 'none'):
-        return None
     break_ms = 350
     if total_length and total_length >= 15000:
         if s in ('news', 'presenter'):
@@ -1111,54 +2777,163 @@ def apply_voice_style(text, style, total_length):
             break_ms = 500
         else:
             break_ms = 350
-    # Escapar caracteres especiales para SSML
-    def esc(x):
-        return x.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-    safe = esc(text)
-    # Insertar pausas en signos de puntuación
-    t = re.sub(r"([\.\!\?])\s+", rf"\1 <break time=\"{break_ms}ms\"/> ", safe)
-    if s == 'conversational':
-        return f"<speak><prosody rate=\"medium\"><emphasis level=\"moderate\">{t}</emphasis></prosody></speak>"
-    if s == 'narrative':
-        return f"<speak><prosody rate=\"slow\"><emphasis level=\"moderate\">{t}</emphasis></prosody></speak>"
-    if s == 'news':
-        return f"<speak><prosody rate=\"fast\"><emphasis level=\"reduced\">{t}</emphasis></prosody></speak>"
-    if s == 'presenter':
-        return f"<speak><prosody rate=\"medium\"><emphasis level=\"strong\">{t}</emphasis></prosody></speak>"
-    if s == 'storytelling':
-        return f"<speak><prosody rate=\"slow\"><emphasis level=\"strong\">{t}</emphasis></prosody></speak>"
-    if s == 'enthusiastic':
-        return f"<speak><prosody rate=\"fast\"><emphasis level=\"strong\">{t}</emphasis></prosody></speak>"
-    if s == 'calm':
-        return f"<speak><prosody rate=\"medium\"><emphasis level=\"reduced\">{t}</emphasis></prosody></speak>"
-    if s == 'advertising':
-        return f"<speak><prosody rate=\"medium\"><emphasis level=\"strong\">{t}</emphasis></prosody></speak>"
-    return None
+    return break_ms
 
-def apply_minimal_voice_style(text, style, total_length):
+def ssml_body(text, break_ms):
+    """Escapar el texto para SSML e insertar pausas en signos de puntuación"""
+    safe = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return re.sub(r"([\.\!\?])\s+", rf"\1 <break time=\"{break_ms}ms\"/> ", safe)
+
+def get_voice_style_wrapper(style):
+    return VOICE_STYLE_WRAPPERS.get((style or '').lower())
+
+def get_minimal_voice_style_wrapper(style):
     s = (style or '').lower()
     if s in ('', 'none'):
         return None
-    break_ms = 350
-    if total_length and total_length >= 15000:
-        if s in ('news', 'presenter'):
-            break_ms = 250
-        elif s in ('narrative', 'storytelling'):
-            break_ms = 500
-        else:
-            break_ms = 350
-    def esc(x):
-        return x.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-    safe = esc(text)
-    t = re.sub(r"([\.!\?])\s+", rf"\1 <break time=\"{break_ms}ms\"/> ", safe)
     rate = 'medium'
     if s in ('news', 'enthusiastic'):
         rate = 'fast'
     elif s in ('narrative', 'storytelling'):
         rate = 'slow'
-    else:
-        rate = 'medium'
-    return f"<speak><prosody rate=\"{rate}\">{t}</prosody></speak>"
+    return (f"<speak><prosody rate=\"{rate}\">", "</prosody></speak>")
+
+def apply_voice_style(text, style, total_length):
+    wrapper = get_voice_style_wrapper(style)
+    if wrapper is None:
+        return None
+    return wrapper[0] + ssml_body(text, get_style_break_ms(style, total_length)) + wrapper[1]
+
+def apply_minimal_voice_style(text, style, total_length):
+    wrapper = get_minimal_voice_style_wrapper(style)
+    if wrapper is None:
+        return None
+    return wrapper[0] + ssml_body(text, get_style_break_ms(style, total_length)) + wrapper[1]
+
+# Cortes tras fin de oración (con todo su espacio) o entre párrafos
+TEXT_PIECE_BOUNDARY = re.compile(r"[\.\!\?]\s+|\n[ \t]*\n\s*")
+
+def split_text_pieces(text, max_pending_chars=64 * 1024):
+    """Dividir el texto (str o iterable de bloques) en oraciones/párrafos conservando todos los caracteres"""
+    blocks = [text] if isinstance(text, str) else text
+    buffer = ''
+    for block in blocks:
+        buffer += block
+        start = 0
+        for m in TEXT_PIECE_BOUNDARY.finditer(buffer):
+            if m.end() == len(buffer):
+                break  # el separador puede continuar en el siguiente bloque
+            yield buffer[start:m.end()]
+            start = m.end()
+        buffer = buffer[start:]
+        # Texto sin puntuación: no acumular sin límite, cortar en el último espacio
+        if len(buffer) > max_pending_chars:
+            cut = max(buffer.rfind(' '), buffer.rfind('\n')) + 1 or len(buffer)
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    start = 0
+    for m in TEXT_PIECE_BOUNDARY.finditer(buffer):
+        yield buffer[start:m.end()]
+        start = m.end()
+    if start < len(buffer):
+        yield buffer[start:]
+
+class TextUpload:
+    """Archivo de texto subido, decodificado en UTF-8 por bloques sin cargarlo entero en memoria.
+    
+    Cada pasada por blocks() vuelve al inicio y cuenta bytes y caracteres sobre la marcha.
+    """
+    def __init__(self, stream, block_size=64 * 1024, preview_chars=200):
+        self.stream = stream
+        self.block_size = block_size
+        self.preview_chars = preview_chars
+        self.stream.seek(0, os.SEEK_END)
+        self.size = self.stream.tell()
+        self.stream.seek(0)
+        self.bytes_read = 0
+        self.chars = 0
+        self._preview = ''
+
+    def blocks(self):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        self.stream.seek(0)
+        self.bytes_read = 0
+        self.chars = 0
+        while True:
+            data = self.stream.read(self.block_size)
+            text = decoder.decode(data, final=not data)
+            self.bytes_read += len(data)
+            self.chars += len(text)
+            if len(self._preview) < self.preview_chars:
+                self._preview += text[:self.preview_chars - len(self._preview)]
+            if text:
+                yield text
+            if not data:
+                break
+
+    def read_text(self):
+        return ''.join(self.blocks())
+
+    @property
+    def preview(self):
+        return self._preview + '...' if self.chars > self.preview_chars else self._preview
+
+def pack_tts_chunks(pieces, voice_style, total_length, max_bytes=None):
+    """Empaquetar oraciones de forma voraz hasta el límite de bytes por petición.
+    
+    El coste de cada pieza es el tamaño exacto de su cuerpo SSML escapado (pausas incluidas);
+    como los cortes caen justo después del espacio que sigue a la puntuación, el SSML del chunk
+    es la concatenación de los cuerpos y no hay que volver a renderizar ni se pierde texto.
+    """
+    max_bytes = max_bytes or CONFIG.get('tts_max_input_bytes', 5000)
+    wrapper = get_voice_style_wrapper(voice_style)
+    break_ms = get_style_break_ms(voice_style, total_length)
+    overhead = len((wrapper[0] + wrapper[1]).encode('utf-8')) if wrapper else 0
+    budget = max_bytes - overhead
+    
+    def render(piece):
+        return ssml_body(piece, break_ms) if wrapper else piece
+    
+    def cost(piece):
+        return len(render(piece).encode('utf-8'))
+    
+    def fit(piece):
+        """Partir una pieza que excede el presupuesto por palabras y, si hace falta, por caracteres"""
+        if cost(piece) <= budget:
+            yield piece
+            return
+        for m in re.finditer(r"\S+\s*|\s+", piece):
+            word = m.group(0)
+            if cost(word) <= budget:
+                yield word
+                continue
+            part = ''
+            for ch in word:
+                if part and cost(part + ch) > budget:
+                    yield part
+                    part = ''
+                part += ch
+            if part:
+                yield part
+    
+    def make_chunk(parts):
+        text = ''.join(parts)
+        ssml = wrapper[0] + ''.join(render(p) for p in parts) + wrapper[1] if wrapper else None
+        return {'text': text, 'ssml': ssml}
+    
+    current = []
+    current_cost = 0
+    for piece in pieces:
+        for part in fit(piece):
+            part_cost = cost(part)
+            if current and current_cost + part_cost > budget:
+                yield make_chunk(current)
+                current = []
+                current_cost = 0
+            current.append(part)
+            current_cost += part_cost
+    if current and ''.join(current).strip():
+        yield make_chunk(current)
 
 def get_default_voice_name(language_code):
     """Obtener una voz por defecto válida para el idioma indicado"""
@@ -1177,30 +2952,130 @@ def get_default_voice_name(language_code):
     }
     return defaults.get(language_code, CONFIG.get('default_voice_name', 'es-ES-Standard-A'))
 
-@app.route('/api/voices', methods=['GET'])
-def list_voices():
-    try:
-        language = request.args.get('language')
-        if tts_client is None:
-            raise RuntimeError('Cliente de Text-to-Speech no inicializado')
+# Códigos de idioma de la UI que la API de voces publica con otro código
+VOICE_LANGUAGE_ALIASES = {'zh-CN': 'cmn-CN'}
+
+def normalize_voice_gender(ssml_gender):
+    """'female' / 'male' / 'neutral' a partir del enum o texto de la API"""
+    value = getattr(ssml_gender, 'name', None) or str(ssml_gender or '')
+    return value.split('.')[-1].lower()
+
+class VoiceCatalog:
+    """Catálogo de voces en memoria, refrescado por TTL e indexado por nombre, idioma y género"""
+    def __init__(self, ttl_seconds=3600):
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._client = None
+        self._loaded_at = 0.0
+        self._by_name = {}
+        self._by_language = {}
+
+    def _refresh(self, tts_client):
         result = tts_client.list_voices()
-        voices = []
+        by_name = {}
+        by_language = {}
         for v in result.voices:
+            natural_rate = getattr(v, 'natural_sample_rate_hertz', None)
             item = {
                 'name': getattr(v, 'name', None),
                 'language_codes': list(getattr(v, 'language_codes', [])),
                 'ssml_gender': str(getattr(v, 'ssml_gender', '')),
-                'natural_sample_rate_hertz': int(getattr(v, 'natural_sample_rate_hertz', 0)) if getattr(v, 'natural_sample_rate_hertz', None) is not None else None
+                'gender': normalize_voice_gender(getattr(v, 'ssml_gender', '')),
+                'natural_sample_rate_hertz': int(natural_rate) if natural_rate is not None else None
             }
-            if not language or (language in item['language_codes']):
-                voices.append(item)
-        return jsonify({'success': True, 'voices': voices})
-    except Exception as e:
+            by_name[item['name']] = item
+            for lang in item['language_codes']:
+                by_language.setdefault(lang, {}).setdefault(item['gender'], []).append(item)
+        self._by_name = by_name
+        self._by_language = by_language
+        self._client = tts_client
+        self._loaded_at = time.time()
+        logger.info(f'🗂️ Catálogo de voces actualizado: {len(by_name)} voces en {len(by_language)} idiomas')
+
+    def ensure_loaded(self, tts_client):
+        """Refrescar si caducó o cambió el cliente; si falla, seguir con el catálogo anterior"""
+        with self._lock:
+            fresh = self._client is tts_client and time.time() - self._loaded_at < self.ttl
+            if fresh or tts_client is None:
+                return bool(self._by_name)
+            try:
+                self._refresh(tts_client)
+            except Exception as e:
+                if not self._by_name:
+                    raise
+                logger.warning(f"⚠️ No se pudo refrescar el catálogo de voces, se usa el anterior: {e}")
+            return True
+
+    def voices(self, language=None, gender=None):
+        with self._lock:
+            if language:
+                by_gender = self._by_language.get(VOICE_LANGUAGE_ALIASES.get(language, language), {})
+            else:
+                by_gender = {}
+                for lang_index in self._by_language.values():
+                    for g, items in lang_index.items():
+                        by_gender.setdefault(g, []).extend(items)
+            if gender:
+                selected = list(by_gender.get(gender.lower(), []))
+            else:
+                selected = [item for items in by_gender.values() for item in items]
+        if not language:
+            # Una voz puede estar en varios idiomas: quitar duplicados conservando el orden
+            selected = list({item['name']: item for item in selected}.values())
+        return sorted(selected, key=lambda item: item['name'])
+
+    def resolve(self, voice_language, voice_name):
+        """Nombre de voz válido para el idioma: el pedido si existe, si no la voz por defecto u otra del idioma"""
+        language = VOICE_LANGUAGE_ALIASES.get(voice_language, voice_language)
+        
+        def speaks_language(name):
+            # Una voz de otro idioma existe en el catálogo pero falla al sintetizar
+            item = self._by_name.get(name)
+            return item is not None and language in item['language_codes']
+        
+        with self._lock:
+            if not self._by_name or speaks_language(voice_name):
+                return voice_name
+            default_name = get_default_voice_name(voice_language)
+            if speaks_language(default_name):
+                resolved = default_name
+            else:
+                by_gender = self._by_language.get(language, {})
+                candidates = sorted(item['name'] for items in by_gender.values() for item in items)
+                resolved = candidates[0] if candidates else default_name
+        logger.warning(f"⚠️ Voz '{voice_name}' no disponible para {voice_language}; usando '{resolved}'")
+        return resolved
+
+VOICE_CATALOG = VoiceCatalog(CONFIG.get('voice_catalog_ttl_seconds', 3600))
+
+def resolve_voice_name(voice_language, voice_name):
+    """Validar la voz contra el catálogo antes de sintetizar (sin catálogo se deja tal cual)"""
+    try:
+        VOICE_CATALOG.ensure_loaded(get_backend('tts'))
+    except Exception as e:
+        logger.warning(f"⚠️ Catálogo de voces no disponible: {e}")
+        return voice_name
+    return VOICE_CATALOG.resolve(voice_language, voice_name)
+
+@app.route('/api/voices', methods=['GET'])
+def list_voices():
+    tts_client = get_backend('tts')
+    try:
+        language = request.args.get('language')
+        gender = request.args.get('gender')
+        if tts_client is None:
+            raise RuntimeError('Cliente de Text-to-Speech no inicializado')
+        VOICE_CATALOG.ensure_loaded(tts_client)
+        response = jsonify({'success': True, 'voices': VOICE_CATALOG.voices(language, gender)})
+        response.headers['Cache-Control'] = 'private, max-age=300'
+        return response
+    except Exception as e:
         logger.error(f"❌ Error listando voces: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/clear-gcs', methods=['POST'])
 def clear_gcs():
+    storage_client = get_backend('storage')
     try:
         if storage_client is None:
             raise RuntimeError('Cliente de Storage no inicializado')
@@ -1233,6 +3108,7 @@ def clear_gcs():
 
 @app.route('/api/gcs-usage', methods=['GET'])
 def gcs_usage():
+    storage_client = get_backend('storage')
     try:
         if storage_client is None:
             raise RuntimeError('Cliente de Storage no inicializado')
@@ -1257,6 +3133,7 @@ def gcs_usage():
 
 @app.route('/api/gcs-list', methods=['GET'])
 def gcs_list():
+    storage_client = get_backend('storage')
     try:
         if storage_client is None:
             raise RuntimeError('Cliente de Storage no inicializado')
@@ -1278,6 +3155,833 @@ def gcs_list():
         logger.error(f"❌ Error listando contenido del bucket: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/upload-stats', methods=['GET'])
+def upload_stats():
+    """Throughput de las últimas subidas a Cloud Storage"""
+    return jsonify({'success': True, 'uploads': list(UPLOAD_STATS)})
+
+@app.route('/api/startup-stats', methods=['GET'])
+def startup_stats():
+    """Desglose del arranque e importaciones/inicializaciones diferidas hechas desde entonces"""
+    return jsonify({
+        'success': True,
+        'startup': {
+            'phases': STARTUP_TIMINGS,
+            'total_ms': round(sum(p['ms'] for p in STARTUP_TIMINGS), 1)
+        },
+        'lazy_imports_ms': LAZY_IMPORT_TIMINGS,
+        'backends_ms': BACKEND_INIT_TIMINGS,
+        'backends': BACKEND_STATUS,
+        'gpu_probe': dict(GPU_PROBE) or None
+    })
+
+@app.route('/api/local-storage/<bucket_name>/<path:blob_name>', methods=['GET'])
+def local_storage_object(bucket_name, blob_name):
+    """Servir objetos del almacenamiento local (backend_mode='local')"""
+    if CONFIG.get('backend_mode') != 'local':
+        return jsonify({'error': 'Almacenamiento local deshabilitado'}), 404
+    try:
+        path = local_storage_path(LOCAL_STORAGE_DIR, bucket_name, blob_name)
+    except ValueError:
+        return jsonify({'error': 'Objeto no encontrado'}), 404
+    if not os.path.isfile(path):
+        return jsonify({'error': 'Objeto no encontrado'}), 404
+    return send_file(path)
+
+# Calidades de salida de video (altura y bitrate)
+VIDEO_QUALITY_SETTINGS = {
+    '4k': {'height': 2160, 'bitrate': '15000k'},
+    '1440p': {'height': 1440, 'bitrate': '8000k'},
+    'high': {'height': 1080, 'bitrate': '5000k'},
+    'medium': {'height': 720, 'bitrate': '2500k'},
+    'low': {'height': 480, 'bitrate': '1000k'}
+}
+
+# Códecs que cada contenedor de salida admite copiando los streams sin recodificar
+VIDEO_COPY_CODECS = {
+    'mp4': {'video': {'h264', 'hevc', 'mpeg4', 'av1'}, 'audio': {'aac', 'mp3'}},
+    'mov': {'video': {'h264', 'hevc', 'mpeg4', 'prores'}, 'audio': {'aac', 'mp3', 'pcm_s16le'}},
+    'avi': {'video': {'h264', 'mpeg4', 'mjpeg'}, 'audio': {'mp3', 'ac3', 'pcm_s16le'}}
+}
+
+def parse_frame_rate(value):
+    """'30000/1001' → 29.97 (0 si no se puede interpretar)"""
+    try:
+        num, _, den = str(value).partition('/')
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+def probe_media(path, h264_headers=False):
+    """Duración y parámetros del primer stream de video y de audio con ffprobe.
+    
+    Con h264_headers se añaden además los campos del SPS/PPS de un video H.264 (para unir por copia).
+    """
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_format', '-show_streams', '-show_data_hash', 'sha256',
+         '-of', 'json', path],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe falló: {(result.stderr or '').strip()[-300:]}")
+    data = json.loads(result.stdout or '{}')
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'
+                  and not s.get('disposition', {}).get('attached_pic')), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    
+    info = {
+        'duration': float(data.get('format', {}).get('duration') or (video or {}).get('duration') or 0),
+        'format_name': data.get('format', {}).get('format_name'),
+        'video': None,
+        'audio': None
+    }
+    if video:
+        width, height = int(video.get('width') or 0), int(video.get('height') or 0)
+        # Videos de móvil: la rotación intercambia ancho y alto al mostrarse
+        rotation = int(float((video.get('tags') or {}).get('rotate') or 0))
+        for side_data in video.get('side_data_list') or []:
+            rotation = int(float(side_data.get('rotation', rotation) or 0))
+        if abs(rotation) % 180 == 90:
+            width, height = height, width
+        info['video'] = {
+            'codec': video.get('codec_name'),
+            'width': width,
+            'height': height,
+            'fps': round(parse_frame_rate(video.get('avg_frame_rate') or video.get('r_frame_rate')), 3),
+            # Racional exacto ('30000/1001') para cortar segmentos en límites de fotograma
+            'frame_rate': next((rate for rate in (video.get('avg_frame_rate'), video.get('r_frame_rate'))
+                                if parse_frame_rate(rate) > 0), None),
+            'pix_fmt': video.get('pix_fmt'),
+            'profile': video.get('profile'),
+            'level': video.get('level'),
+            'time_base': video.get('time_base'),
+            # SPS/PPS del códec: el muxer MP4 solo conserva los del primer archivo concatenado
+            'extradata_hash': video.get('extradata_hash'),
+            'rotation': rotation
+        }
+        if h264_headers and info['video']['codec'] == 'h264':
+            info['video']['h264_headers'] = probe_h264_headers(path)
+    if audio:
+        info['audio'] = {
+            'codec': audio.get('codec_name'),
+            'sample_rate': int(audio.get('sample_rate') or 0),
+            'channels': int(audio.get('channels') or 0)
+        }
+    return info
+
+# Campos del SPS/PPS de los que dependen el análisis de los slices y el orden de salida: al concatenar
+# por copia el MP4 solo conserva los del primer archivo, así que deben coincidir en todas las partes
+# (VUI de temporización, nivel o flags de restricción pueden variar sin romper la decodificación)
+H264_CONCAT_FIELDS = (
+    'seq_parameter_set_id', 'chroma_format_idc', 'bit_depth_luma_minus8', 'bit_depth_chroma_minus8',
+    'qpprime_y_zero_transform_bypass_flag', 'seq_scaling_matrix_present_flag',
+    'log2_max_frame_num_minus4', 'pic_order_cnt_type', 'log2_max_pic_order_cnt_lsb_minus4',
+    'delta_pic_order_always_zero_flag', 'max_num_ref_frames', 'gaps_in_frame_num_allowed_flag',
+    'pic_width_in_mbs_minus1', 'pic_height_in_map_units_minus1', 'frame_mbs_only_flag',
+    'mb_adaptive_frame_field_flag', 'direct_8x8_inference_flag', 'frame_cropping_flag',
+    'frame_crop_left_offset', 'frame_crop_right_offset', 'frame_crop_top_offset', 'frame_crop_bottom_offset',
+    'max_num_reorder_frames', 'max_dec_frame_buffering',
+    'pic_parameter_set_id', 'entropy_coding_mode_flag', 'bottom_field_pic_order_in_frame_present_flag',
+    'num_slice_groups_minus1', 'num_ref_idx_l0_default_active_minus1', 'num_ref_idx_l1_default_active_minus1',
+    'weighted_pred_flag', 'weighted_bipred_idc', 'pic_init_qp_minus26', 'pic_init_qs_minus26',
+    'chroma_qp_index_offset', 'deblocking_filter_control_present_flag', 'constrained_intra_pred_flag',
+    'redundant_pic_cnt_present_flag', 'transform_8x8_mode_flag', 'pic_scaling_matrix_present_flag',
+    'second_chroma_qp_index_offset'
+)
+TRACE_HEADERS_FIELD = re.compile(r'^\d+\s+(\w+)\s+[01]+ = (-?\d+)$')
+
+def probe_h264_headers(path):
+    """Campos H264_CONCAT_FIELDS del primer SPS y PPS del video (bsf trace_headers); None si no se pueden leer"""
+    result = subprocess.run(
+        ['ffmpeg', '-hide_banner', '-v', 'verbose', '-i', path, '-map', '0:v:0', '-c', 'copy',
+         '-bsf:v', 'trace_headers', '-frames:v', '1', '-f', 'null', '-'],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None
+    fields, section = {}, None
+    for line in (result.stderr or '').splitlines():
+        if '[trace_headers' not in line:
+            continue
+        body = line.split('] ', 1)[-1].strip()
+        match = TRACE_HEADERS_FIELD.match(body)
+        if not match:
+            section = body if body in ('Sequence Parameter Set', 'Picture Parameter Set') else None
+        elif section and match.group(1) in H264_CONCAT_FIELDS:
+            # Solo el primer SPS/PPS: es el que el MP4 conserva al concatenar
+            fields.setdefault(match.group(1), int(match.group(2)))
+    if 'entropy_coding_mode_flag' not in fields or 'pic_order_cnt_type' not in fields:
+        return None
+    return tuple((name, fields.get(name)) for name in H264_CONCAT_FIELDS)
+
+def format_mmss(seconds):
+    return f"{int(seconds // 60)}:{int(seconds % 60):02d}"
+
+def publish_local_video(temp_output_path, subdir, filename):
+    """Mover el video generado a static/videos/<subdir> (con reintentos si el archivo sigue bloqueado)"""
+    videos_dir = os.path.join('static', 'videos', subdir)
+    os.makedirs(videos_dir, exist_ok=True)
+    final_video_path = os.path.join(videos_dir, filename)
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            shutil.move(temp_output_path, final_video_path)
+            break
+        except (OSError, PermissionError) as e:
+            if attempt < max_retries - 1:
+                logger.warning(f'⚠️ Intento {attempt + 1} fallido, reintentando en 2 segundos...')
+                time.sleep(2)
+            else:
+                # Como último recurso, copiar en lugar de mover
+                shutil.copy2(temp_output_path, final_video_path)
+                os.unlink(temp_output_path)
+                logger.info('📁 Archivo copiado en lugar de movido')
+    video_url = f"/static/videos/{subdir}/{filename}"
+    logger.info(f'📁 Video guardado localmente: {video_url}')
+    return video_url
+
+def use_gpu_encoder(processing_mode):
+    """¿Codificar con h264_nvenc según el modo pedido ('auto', 'gpu' o 'cpu')?"""
+    return processing_mode in ('auto', 'gpu') and gpu_available()
+
+def can_stream_copy_loop(media, quality, loop_format, loop_transition):
+    """El loop puede hacerse por copia si no hay transición y el video ya tiene la altura y códecs de salida"""
+    allowed = VIDEO_COPY_CODECS.get(loop_format)
+    video, audio = media.get('video'), media.get('audio')
+    return (
+        loop_transition == 'none' and allowed is not None and video is not None
+        and media['duration'] > 0
+        and video['height'] == quality['height'] and video['rotation'] == 0
+        and video['codec'] in allowed['video']
+        and (audio is None or audio['codec'] in allowed['audio'])
+    )
+
+def loop_video_stream_copy(source_path, media, target_duration, loop_format, output_path):
+    """Repetir el video con -stream_loop copiando los streams y cortar en la duración objetivo.
+    
+    Cada repetición empieza en el primer fotograma del original, que es un keyframe, así que
+    las uniones se decodifican bien; el corte final solo descarta paquetes después del límite.
+    """
+    loops_needed = max(1, math.ceil(target_duration / media['duration']))
+    args = ['-stream_loop', str(loops_needed - 1), '-i', source_path,
+            '-map', '0:v:0', '-map', '0:a:0?', '-t', f'{target_duration:.3f}',
+            '-c', 'copy', '-avoid_negative_ts', 'make_zero']
+    if loop_format in ('mp4', 'mov'):
+        args += ['-movflags', '+faststart']
+    logger.info(f'⚡ Loop por copia de streams: {loops_needed} repeticiones sin recodificar')
+    run_ffmpeg(args + [output_path], 'loop por copia de streams')
+    output = probe_media(output_path)
+    return {
+        'loops_created': loops_needed,
+        'original_duration': media['duration'],
+        'final_duration': output['duration'],
+        'resolution': f"{output['video']['width']}x{output['video']['height']}"
+    }
+
+# Fundido de entrada (desde negro) de cada repetición según la transición del loop
+LOOP_TRANSITION_FADES = {
+    'none': 0,
+    'fade': 0.5
+}
+
+# Duración máxima de un crossfade real (xfade/acrossfade) entre dos tramos
+VIDEO_CROSSFADE_SECONDS = 0.5
+
+# Los segmentos paralelos miden un número entero de GOPs de esta duración
+VIDEO_GOP_SECONDS = 2
+
+# Audio de los segmentos intermedios (PCM: sin retardo de encoder en las uniones)
+SEGMENT_AUDIO_FILTER = 'aformat=sample_fmts=fltp:sample_rates=48000:channel_layouts=stereo'
+
+def video_encoder_args(quality, processing_mode):
+    """Argumentos de ffmpeg para el encoder de video (mismos parámetros que la salida de MoviePy)"""
+    if use_gpu_encoder(processing_mode):
+        return ['-c:v', 'h264_nvenc', '-preset', 'fast', '-b:v', quality['bitrate'], '-pix_fmt', 'yuv420p']
+    return ['-c:v', 'libx264', '-b:v', quality['bitrate'], '-pix_fmt', 'yuv420p']
+
+def write_concat_list(paths, list_path):
+    """Escribir una lista para el demuxer concat de ffmpeg"""
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write('ffconcat version 1.0\n')
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+class EncodeBudget:
+    """Núcleos de CPU repartidos entre todas las codificaciones paralelas del proceso.
+    
+    Cada proceso de ffmpeg reserva tantas unidades como hilos usa, así que varios trabajos de
+    unión/loop a la vez no lanzan más hilos de encoder que núcleos hay.
+    """
+    def __init__(self, cores):
+        self.cores = max(1, cores)
+        self.available = self.cores
+        self._condition = threading.Condition()
+    
+    def acquire(self, units):
+        units = min(max(1, units), self.cores)
+        with self._condition:
+            while self.available < units:
+                self._condition.wait()
+            self.available -= units
+        return units
+    
+    def release(self, units):
+        with self._condition:
+            self.available += units
+            self._condition.notify_all()
+    
+    def run(self, threads, fn, /, *args, **kwargs):
+        # Solo posicionales: fn puede recibir su propio `threads` por nombre
+        units = self.acquire(threads)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.release(units)
+
+VIDEO_ENCODE_BUDGET = EncodeBudget(os.cpu_count() or 1)
+
+def encode_threads(workers):
+    """Hilos de encoder por proceso cuando un trabajo lanza `workers` procesos a la vez"""
+    return max(1, VIDEO_ENCODE_BUDGET.cores // max(1, workers))
+
+def parallel_encoding_settings(processing_mode):
+    """(workers, segundos por segmento) de la codificación por segmentos; 1 worker = desactivada.
+    
+    Solo aplica a encoders de CPU: h264_nvenc ya es un único bloque de hardware con pocas sesiones.
+    """
+    if not CONFIG.get('video_parallel_encoding', True) or use_gpu_encoder(processing_mode):
+        return 1, 0
+    workers = int(CONFIG.get('video_parallel_workers', 0) or 0) or VIDEO_ENCODE_BUDGET.cores
+    return max(1, min(workers, VIDEO_ENCODE_BUDGET.cores)), float(CONFIG.get('video_segment_seconds', 10))
+
+def frame_rate_fraction(rate):
+    """'30000/1001', '25' o 29.97 → Fraction exacta (30 si no se puede interpretar)"""
+    try:
+        value = Fraction(str(rate))
+    except (ValueError, ZeroDivisionError):
+        return Fraction(30)
+    return value if value > 0 else Fraction(30)
+
+def snap_to_frames(seconds, rate):
+    """Redondear una duración o instante a un número entero de fotogramas"""
+    fps = frame_rate_fraction(rate)
+    return Fraction(round(Fraction(seconds) * fps)) / fps
+
+def ffmpeg_seconds(value):
+    """Segundos para ffmpeg truncados al microsegundo: nunca caen después del fotograma buscado"""
+    return f'{math.floor(Fraction(value) * 1000000) / 1000000:.6f}'
+
+def segment_encoder_args(quality, processing_mode, rate, workers):
+    """Encoder de los segmentos: GOP fijo y cerrado, hilos repartidos entre los workers"""
+    gop = max(1, round(frame_rate_fraction(rate) * VIDEO_GOP_SECONDS))
+    args = video_encoder_args(quality, processing_mode) + ['-g', str(gop), '-flags', '+cgop']
+    if workers > 1:
+        args += ['-threads', str(encode_threads(workers))]
+    return args
+
+def video_piece(path, start, duration, has_audio, fade_in=0):
+    """Tramo de la línea de tiempo tomado de una sola fuente"""
+    return {'sources': [(path, start, duration, has_audio)], 'duration': duration,
+            'fade_in': fade_in, 'crossfade': 0}
+
+def crossfade_piece(outgoing, incoming, crossfade):
+    """Tramo que funde el final de una fuente con el inicio de otra; cada una es (path, inicio, audio)"""
+    return {'sources': [(outgoing[0], outgoing[1], crossfade, outgoing[2]),
+                        (incoming[0], incoming[1], crossfade, incoming[2])],
+            'duration': crossfade, 'fade_in': 0, 'crossfade': crossfade}
+
+def split_video_piece(piece, segment_seconds, rate):
+    """Cortar un tramo de una sola fuente en segmentos de GOPs completos (el último absorbe el resto)"""
+    if segment_seconds <= 0 or len(piece['sources']) != 1:
+        return [piece]
+    fps = frame_rate_fraction(rate)
+    gop = max(1, round(fps * VIDEO_GOP_SECONDS))
+    chunk = Fraction(max(gop, round(Fraction(segment_seconds) * fps / gop) * gop)) / fps
+    path, start, duration, has_audio = piece['sources'][0]
+    if duration < chunk * 1.5:
+        return [piece]
+    pieces, offset = [], 0
+    while duration - offset >= chunk * 1.5:
+        pieces.append(video_piece(path, start + offset, chunk, has_audio, piece['fade_in'] if offset == 0 else 0))
+        offset += chunk
+    pieces.append(video_piece(path, start + offset, duration - offset, has_audio))
+    return pieces
+
+def encode_video_piece(piece, video_filters, with_audio, encoder_args, output_path):
+    """Codificar un tramo: busca en la(s) fuente(s), normaliza y aplica su fundido o crossfade"""
+    args, graph = [], []
+    for i, (path, start, duration, has_audio) in enumerate(piece['sources']):
+        args += ['-ss', ffmpeg_seconds(start), '-t', ffmpeg_seconds(duration), '-i', path]
+        graph.append(f'[{i}:v:0]{video_filters(duration)}[v{i}]')
+        if not with_audio:
+            continue
+        if has_audio:
+            graph.append(f'[{i}:a:0]{SEGMENT_AUDIO_FILTER},apad,atrim=duration={ffmpeg_seconds(duration)},'
+                         f'asetpts=PTS-STARTPTS[a{i}]')
+        else:
+            graph.append(f'anullsrc=r=48000:cl=stereo,atrim=duration={ffmpeg_seconds(duration)}[a{i}]')
+    if piece['crossfade']:
+        crossfade = ffmpeg_seconds(piece['crossfade'])
+        graph.append(f"[v0][v1]xfade=transition=fade:duration={crossfade}:offset=0[v]")
+        if with_audio:
+            graph.append(f"[a0][a1]acrossfade=d={crossfade}[a]")
+    else:
+        fade = f"fade=t=in:st=0:d={piece['fade_in']}" if piece['fade_in'] else 'null'
+        graph.append(f'[v0]{fade}[v]')
+        if with_audio:
+            graph.append('[a0]anull[a]')
+    args += ['-filter_complex', ';'.join(graph), '-map', '[v]']
+    if with_audio:
+        args += ['-map', '[a]', '-c:a', 'pcm_s16le']
+    args += encoder_args + ['-t', ffmpeg_seconds(piece['duration']), output_path]
+    run_ffmpeg(args, 'codificación de segmento')
+
+def encode_video_pieces(pieces, video_filters, with_audio, encoder_args, work_dir, workers, prefix):
+    """Codificar los tramos en paralelo (un proceso de ffmpeg por tramo); retorna las rutas en orden"""
+    paths = [os.path.join(work_dir, f'{prefix}_{i:05d}.mkv') for i in range(len(pieces))]
+    if workers <= 1 or len(pieces) == 1:
+        for piece, path in zip(pieces, paths):
+            encode_video_piece(piece, video_filters, with_audio, encoder_args, path)
+        return paths
+    # Cada proceso reserva sus hilos en el presupuesto global antes de arrancar
+    threads = encode_threads(workers)
+    with ThreadPoolExecutor(max_workers=min(workers, len(pieces))) as executor:
+        futures = [executor.submit(VIDEO_ENCODE_BUDGET.run, threads, encode_video_piece, piece,
+                                   video_filters, with_audio, encoder_args, path)
+                   for piece, path in zip(pieces, paths)]
+        for future in futures:
+            future.result()
+    return paths
+
+def concat_video_segments(segment_paths, with_audio, output_format, work_dir, output_path, description):
+    """Unir segmentos por copia de video; el audio PCM se codifica a AAC una sola vez"""
+    list_path = os.path.join(work_dir, 'concat.txt')
+    write_concat_list(segment_paths, list_path)
+    args = ['-f', 'concat', '-safe', '0', '-i', list_path, '-map', '0:v:0', '-c:v', 'copy']
+    if with_audio:
+        args += ['-map', '0:a:0', '-c:a', 'aac', '-b:a', '192k']
+    if output_format in ('mp4', 'mov'):
+        args += ['-movflags', '+faststart']
+    run_ffmpeg(args + [output_path], description)
+
+def loop_unit_pieces(source_path, media, period, first, duration, fade_in, crossfade):
+    """Tramos de un periodo del loop de la duración dada (el primero nunca lleva transición)"""
+    has_audio = bool(media.get('audio'))
+    if first or not crossfade:
+        return [video_piece(source_path, 0, duration, has_audio, 0 if first else fade_in)]
+    # Crossfade real: la cola del original se funde con su cabeza y después sigue la cabeza
+    pieces = [crossfade_piece((source_path, period - crossfade, has_audio),
+                              (source_path, 0, has_audio), crossfade)]
+    pieces[0]['duration'] = min(crossfade, duration)
+    if duration > crossfade:
+        pieces.append(video_piece(source_path, crossfade, duration - crossfade, has_audio))
+    return pieces
+
+def loop_video_encode_once(source_path, media, target_duration, quality, loop_transition,
+                           loop_format, processing_mode, output_path):
+    """Loop con recodificación proporcional a la duración del original, no a la del objetivo.
+    
+    Todas las repeticiones son idénticas: se codifica una vez el primer periodo (sin transición),
+    una vez el periodo que se repite y el periodo parcial final; después se concatenan copiando
+    los streams y solo el audio se codifica a AAC sobre el resultado. Con crossfade los periodos
+    se solapan, así que cada uno avanza `duración - crossfade` en la línea de tiempo. Los
+    periodos largos se cortan en segmentos que se codifican en paralelo.
+    """
+    # Todos los instantes en fotogramas enteros: cada unión por copia cae en un límite de fotograma
+    rate = media['video'].get('frame_rate') or media['video']['fps']
+    period = snap_to_frames(media['duration'], rate)
+    fade_in = LOOP_TRANSITION_FADES.get(loop_transition, 0)
+    crossfade = snap_to_frames(min(VIDEO_CROSSFADE_SECONDS, period / 4), rate) if loop_transition == 'crossfade' else 0
+    step = period - crossfade
+    repeats_differ = bool(fade_in or crossfade)
+    full_periods = int(target_duration // step)
+    remainder = snap_to_frames(target_duration - full_periods * step, rate)
+    if remainder < 0.05:
+        remainder = 0
+    
+    units = []
+    for i in range(full_periods):
+        first = i == 0 or not repeats_differ
+        units.append(('first' if first else 'period', first, step))
+    if remainder:
+        first = full_periods == 0 or not repeats_differ
+        units.append(('partial_first' if first else 'partial', first, remainder))
+    
+    workers, segment_seconds = parallel_encoding_settings(processing_mode)
+    video_filters = lambda duration: (
+        f"scale=-2:{quality['height']},setsar=1,fps={rate},format=yuv420p,"
+        f"tpad=stop_mode=clone:stop_duration=1,trim=duration={ffmpeg_seconds(duration)},setpts=PTS-STARTPTS"
+    )
+    with_audio = bool(media.get('audio'))
+    
+    work_dir = tempfile.mkdtemp(prefix='video_loop_')
+    try:
+        # Cada periodo distinto se parte en tramos; todos los tramos van al mismo pool
+        unit_pieces = {}
+        for key, first, duration in units:
+            if key not in unit_pieces:
+                unit_pieces[key] = [chunk for piece in loop_unit_pieces(source_path, media, period, first,
+                                                                        duration, fade_in, crossfade)
+                                    for chunk in split_video_piece(piece, segment_seconds, rate)]
+        pieces = [piece for key in unit_pieces for piece in unit_pieces[key]]
+        logger.info(f'⚡ Loop codificado una vez: {len(unit_pieces)} periodos únicos '
+                    f'({len(pieces)} segmentos, {workers} workers) para {len(units)} periodos')
+        paths = iter(encode_video_pieces(pieces, video_filters, with_audio,
+                                         segment_encoder_args(quality, processing_mode, rate, workers),
+                                         work_dir, workers, 'loop'))
+        unit_paths = {key: [next(paths) for _ in unit_pieces[key]] for key in unit_pieces}
+        
+        timeline = [path for key, _, _ in units for path in unit_paths[key]]
+        concat_video_segments(timeline, with_audio, loop_format, work_dir, output_path, 'concatenación del loop')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    output = probe_media(output_path)
+    return {
+        'loops_created': len(units),
+        'original_duration': float(period),
+        'final_duration': output['duration'],
+        'resolution': f"{output['video']['width']}x{output['video']['height']}"
+    }
+
+# Perfiles H.264 de ffprobe → nombre que aceptan libx264/h264_nvenc
+H264_PROFILES = {
+    'Constrained Baseline': 'baseline',
+    'Baseline': 'baseline',
+    'Main': 'main',
+    'High': 'high'
+}
+
+def media_signature(media):
+    """Parámetros que deben coincidir para concatenar por copia sin recodificar"""
+    video, audio = media['video'], media.get('audio')
+    return (
+        video['codec'], video['width'], video['height'], round(video['fps'], 2),
+        video['pix_fmt'], video['profile'], video['time_base'], video['rotation'],
+        # H.264: campos del SPS/PPS que importan al concatenar; otros códecs, los bytes del extradata
+        video.get('h264_headers') or video.get('extradata_hash'),
+        audio and (audio['codec'], audio['sample_rate'], audio['channels'])
+    )
+
+def plan_video_merge(medias, quality, output_format, transition_type):
+    """Elegir el plan más barato para unir videos ya analizados con ffprobe.
+    
+    - remux: todos comparten códecs, resolución (la de la calidad pedida), fps y audio → concat por copia
+    - partial: solo se recodifican las entradas que no coinciden con la de referencia
+    - transcode: transiciones, entradas sin analizar o sin referencia válida → recodificar todo
+    """
+    def transcode(reason):
+        return {'strategy': 'transcode', 'reencode': list(range(len(medias))), 'reference': None, 'reason': reason}
+    
+    if transition_type != 'none':
+        return transcode('las transiciones requieren recodificar')
+    if any(m is None or not m.get('video') or m['duration'] <= 0 for m in medias):
+        return transcode('no se pudieron analizar todas las entradas')
+    
+    allowed = VIDEO_COPY_CODECS.get(output_format)
+    signatures = [media_signature(m) for m in medias]
+    
+    def is_candidate(media):
+        video, audio = media['video'], media.get('audio')
+        return (
+            allowed is not None and video['height'] == quality['height'] and video['rotation'] == 0
+            and video['codec'] in allowed['video'] and (audio is None or audio['codec'] in allowed['audio'])
+        )
+    
+    if len(set(signatures)) == 1 and is_candidate(medias[0]):
+        return {'strategy': 'remux', 'reencode': [], 'reference': 0, 'reason': 'entradas homogéneas'}
+    
+    # Referencia: la firma más repetida entre las entradas que podemos reproducir con libx264 + AAC
+    candidates = [
+        i for i, m in enumerate(medias)
+        if is_candidate(m) and m['video']['codec'] == 'h264' and m['video']['profile'] in H264_PROFILES
+        and m['video'].get('h264_headers') and m['video']['pix_fmt'] == 'yuv420p'
+        and (m.get('audio') is None or m['audio']['codec'] == 'aac')
+    ]
+    # Sin audio en la referencia habría que descartar el audio de otras entradas
+    if any(m.get('audio') for m in medias):
+        candidates = [i for i in candidates if medias[i].get('audio')]
+    if not candidates:
+        return transcode('ninguna entrada coincide con el formato de salida')
+    reference = max(candidates, key=lambda i: (signatures.count(signatures[i]), -i))
+    reencode = [i for i, sig in enumerate(signatures) if sig != signatures[reference]]
+    return {
+        'strategy': 'partial',
+        'reencode': reencode,
+        'reference': reference,
+        'reason': f'{len(reencode)} de {len(medias)} entradas no coinciden con la referencia'
+    }
+
+def x264_conform_args(headers, quality):
+    """Argumentos de libx264 que reproducen el SPS/PPS de la referencia (campos de probe_h264_headers)"""
+    fields = dict(headers)
+    b_frames = fields['pic_order_cnt_type'] != 2
+    x264_params = {
+        'ref': fields['num_ref_idx_l0_default_active_minus1'] + 1,
+        'bframes': 3 if b_frames else 0,
+        'b-pyramid': 'normal' if (fields.get('max_num_reorder_frames') or 0) >= 2 else 'none',
+        'cabac': fields['entropy_coding_mode_flag'],
+        '8x8dct': fields.get('transform_8x8_mode_flag') or 0,
+        'weightp': 2 if fields['weighted_pred_flag'] else 0,
+        'weightb': 1 if fields['weighted_bipred_idc'] else 0,
+        # Sin psy el desplazamiento de QP de croma es exactamente el pedido
+        'psy': 0,
+        'chroma-qp-offset': fields['chroma_qp_index_offset']
+    }
+    args = ['-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+            '-x264-params', ':'.join(f'{key}={value}' for key, value in x264_params.items())]
+    # x264 escribe pic_init_qp=26 con bitrate medio y el CRF redondeado con CRF: los slices
+    # codifican su QP relativo a este valor, así que debe coincidir con el de la referencia
+    init_qp = 26 + fields['pic_init_qp_minus26']
+    if init_qp == 26:
+        return args + ['-b:v', quality['bitrate']]
+    bitrate_k = int(str(quality['bitrate']).rstrip('k'))
+    return args + ['-crf', str(init_qp), '-maxrate', quality['bitrate'], '-bufsize', f'{bitrate_k * 2}k']
+
+def conform_video_segment(source_path, media, reference, quality, output_path, sample_only=False, threads=None):
+    """Recodificar una entrada con libx264 para que pueda concatenarse por copia con la de referencia.
+    
+    Con sample_only se codifica solo el primer fotograma: basta para conocer el SPS/PPS que
+    generará el encoder y compararlo con el de la referencia antes de recodificar nada entero.
+    """
+    ref_video, ref_audio = reference['video'], reference.get('audio')
+    width, height = ref_video['width'], ref_video['height']
+    vf = (f'scale={width}:{height}:force_original_aspect_ratio=decrease,'
+          f'pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={ref_video["fps"]}')
+    args = ['-i', source_path]
+    if ref_audio and not media.get('audio'):
+        # Entrada muda: pista de silencio para que todas las partes tengan audio
+        args += ['-f', 'lavfi', '-i',
+                 f"anullsrc=r={ref_audio['sample_rate']}:cl={'mono' if ref_audio['channels'] == 1 else 'stereo'}",
+                 '-map', '0:v:0', '-map', '1:a:0', '-shortest']
+    else:
+        args += ['-map', '0:v:0'] + (['-map', '0:a:0'] if ref_audio else [])
+    args += ['-vf', vf, *x264_conform_args(ref_video['h264_headers'], quality),
+             '-profile:v', H264_PROFILES[ref_video['profile']]]
+    if ref_video.get('level'):
+        args += ['-level', f"{ref_video['level'] / 10:.1f}"]
+    denominator = str(ref_video.get('time_base') or '').partition('/')[2]
+    if denominator:
+        args += ['-video_track_timescale', denominator]
+    if ref_audio:
+        args += ['-c:a', 'aac', '-ar', str(ref_audio['sample_rate']), '-ac', str(ref_audio['channels'])]
+    if threads:
+        args += ['-threads', str(threads)]
+    if sample_only:
+        args += ['-frames:v', '1', '-t', '1']
+    run_ffmpeg(args + [output_path], 'normalización de entrada para unir')
+
+def verify_video_decodes(path):
+    """Decodificar el archivo completo; un concat por copia con parámetros distintos no da error al unir"""
+    result = run_ffmpeg(['-i', path, '-f', 'null', '-'], 'verificación de decodificación')
+    errors = (result.stderr or '').strip()
+    if errors:
+        raise RuntimeError(f'El video unido no se decodifica limpio: {errors[-300:]}')
+
+def merge_videos_by_plan(paths, medias, plan, quality, processing_mode, output_format, output_path):
+    """Ejecutar un plan remux/partial: recodificar solo lo necesario y concatenar por copia"""
+    work_dir = tempfile.mkdtemp(prefix='video_merge_')
+    try:
+        parts = list(paths)
+        reference = medias[plan['reference']]
+        for i in plan['reencode']:
+            parts[i] = os.path.join(work_dir, f'part_{i}.mp4')
+        if plan['reencode']:
+            # libx264 recibe los parámetros del SPS/PPS de la referencia; algunos (p. ej. log2_max_frame_num
+            # de encoders por hardware) no se pueden forzar: comprobarlo con un fotograma antes de
+            # recodificar nada entero y, si algún campo difiere, recodificar todo
+            sample_path = os.path.join(work_dir, 'sample.mp4')
+            first = plan['reencode'][0]
+            conform_video_segment(paths[first], medias[first], reference, quality, sample_path, sample_only=True)
+            sample_headers = probe_h264_headers(sample_path)
+            reference_headers = reference['video']['h264_headers']
+            if sample_headers != reference_headers:
+                differing = [name for (name, value), (_, expected) in zip(sample_headers or (), reference_headers)
+                             if value != expected] or ['SPS/PPS ilegible']
+                raise RuntimeError(f"el SPS/PPS recodificado no coincide con la referencia: {', '.join(differing)}")
+        logger.info(f"🔧 Normalizando videos {[i + 1 for i in plan['reencode']]} al formato de la referencia...")
+        # Las entradas a normalizar son independientes: una codificación por worker (siempre libx264)
+        workers, _ = parallel_encoding_settings(processing_mode)
+        workers = max(1, min(workers, len(plan['reencode']) or 1))
+        threads = encode_threads(workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(VIDEO_ENCODE_BUDGET.run, threads, conform_video_segment,
+                                       paths[i], medias[i], reference, quality, parts[i],
+                                       threads=threads) for i in plan['reencode']]
+            for future in futures:
+                future.result()
+        
+        list_path = os.path.join(work_dir, 'concat.txt')
+        write_concat_list(parts, list_path)
+        args = ['-f', 'concat', '-safe', '0', '-i', list_path, '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy']
+        if output_format in ('mp4', 'mov'):
+            args += ['-movflags', '+faststart']
+        run_ffmpeg(args + [output_path], 'concatenación por copia')
+        verify_video_decodes(output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    output = probe_media(output_path)
+    return {
+        'duration': output['duration'],
+        'resolution': f"{output['video']['width']}x{output['video']['height']}"
+    }
+
+def merge_output_rate(medias):
+    """fps de salida de la unión (racional exacto del primer video)"""
+    first = medias[0]['video']
+    return first.get('frame_rate') or first['fps'] or 30
+
+def merge_output_geometry(medias, quality):
+    """Tamaño y fps de salida: el primer video escalado a la altura de la calidad"""
+    height = quality['height']
+    first = medias[0]['video']
+    width = max(2, round(first['width'] * height / first['height'] / 2) * 2)
+    return width, height, merge_output_rate(medias)
+
+def merge_video_filters(width, height, rate, duration):
+    """Normalizar una entrada al tamaño/fps de salida con duración exacta (para que los offsets cuadren)"""
+    return (
+        f'scale={width}:{height}:force_original_aspect_ratio=decrease,'
+        f'pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={rate},format=yuv420p,'
+        f'tpad=stop_mode=clone:stop_duration=1,trim=duration={ffmpeg_seconds(duration)},setpts=PTS-STARTPTS'
+    )
+
+def merge_crossfade_seconds(medias, transition_type):
+    if transition_type != 'crossfade' or len(medias) < 2:
+        return 0
+    return min(VIDEO_CROSSFADE_SECONDS, min(m['duration'] for m in medias) / 4)
+
+def build_merge_filtergraph(medias, quality, transition_type):
+    """Filtergraph de ffmpeg que normaliza y une las entradas (scale/pad, fade, xfade/acrossfade, concat).
+    
+    Todas las entradas se llevan al tamaño del primer video escalado a la altura de la calidad,
+    a sus fps y a audio estéreo 48 kHz; las que no tienen audio reciben silencio.
+    Retorna (grafo, etiqueta de audio o None, duración esperada).
+    """
+    width, height, fps = merge_output_geometry(medias, quality)
+    durations = [m['duration'] for m in medias]
+    has_audio = any(m.get('audio') for m in medias)
+    
+    graph = []
+    for i, media in enumerate(medias):
+        duration = durations[i]
+        video_filters = merge_video_filters(width, height, fps, duration)
+        if transition_type == 'fade' and i > 0:
+            video_filters += ',fade=t=in:st=0:d=0.5'
+        graph.append(f'[{i}:v:0]{video_filters}[v{i}]')
+        if not has_audio:
+            continue
+        if media.get('audio'):
+            graph.append(f'[{i}:a:0]{SEGMENT_AUDIO_FILTER},'
+                         f'apad,atrim=duration={duration:.3f},asetpts=PTS-STARTPTS[a{i}]')
+        else:
+            graph.append(f'anullsrc=r=48000:cl=stereo,atrim=duration={duration:.3f}[a{i}]')
+    
+    count = len(medias)
+    crossfade = merge_crossfade_seconds(medias, transition_type)
+    if crossfade:
+        video_label, audio_label, offset = 'v0', 'a0', 0
+        for i in range(1, count):
+            offset += durations[i - 1] - crossfade
+            graph.append(f'[{video_label}][v{i}]xfade=transition=fade:duration={crossfade}:'
+                         f'offset={offset:.3f}[vx{i}]')
+            video_label = f'vx{i}'
+            if has_audio:
+                graph.append(f'[{audio_label}][a{i}]acrossfade=d={crossfade}[ax{i}]')
+                audio_label = f'ax{i}'
+        graph.append(f'[{video_label}]null[vout]')
+        if has_audio:
+            graph.append(f'[{audio_label}]anull[aout]')
+        total = sum(durations) - (count - 1) * crossfade
+    else:
+        pads = ''.join(f'[v{i}][a{i}]' if has_audio else f'[v{i}]' for i in range(count))
+        graph.append(f"{pads}concat=n={count}:v=1:a={1 if has_audio else 0}"
+                     f"{'[vout][aout]' if has_audio else '[vout]'}")
+        total = sum(durations)
+    return ';'.join(graph), '[aout]' if has_audio else None, total
+
+def merge_timeline_pieces(paths, medias, transition_type):
+    """Línea de tiempo de la unión como tramos: cuerpo de cada entrada y, con crossfade, el solape entre ellas.
+    
+    Inicios y duraciones van en fotogramas enteros de la salida para que las uniones por copia cuadren.
+    """
+    rate = merge_output_rate(medias)
+    crossfade = snap_to_frames(merge_crossfade_seconds(medias, transition_type), rate)
+    count = len(medias)
+    pieces = []
+    for i, (path, media) in enumerate(zip(paths, medias)):
+        has_audio = bool(media.get('audio'))
+        start = crossfade if i > 0 else 0
+        end = snap_to_frames(media['duration'], rate) - (crossfade if i < count - 1 else 0)
+        fade_in = 0.5 if transition_type == 'fade' and i > 0 else 0
+        pieces.append(video_piece(path, start, end - start, has_audio, fade_in))
+        if crossfade and i < count - 1:
+            pieces.append(crossfade_piece((path, end, has_audio),
+                                          (paths[i + 1], 0, bool(medias[i + 1].get('audio'))), crossfade))
+    return pieces
+
+def merge_videos_segmented(paths, medias, quality, transition_type, processing_mode, output_format,
+                           output_path, workers, segment_seconds):
+    """Unión con la línea de tiempo cortada en segmentos de GOPs completos codificados en paralelo"""
+    width, height, rate = merge_output_geometry(medias, quality)
+    with_audio = any(m.get('audio') for m in medias)
+    pieces = [chunk for piece in merge_timeline_pieces(paths, medias, transition_type)
+              for chunk in split_video_piece(piece, segment_seconds, rate)]
+    logger.info(f'🧩 Unión por segmentos: {len(pieces)} segmentos con {workers} workers')
+    
+    work_dir = tempfile.mkdtemp(prefix='video_merge_')
+    try:
+        segment_paths = encode_video_pieces(
+            pieces, lambda duration: merge_video_filters(width, height, rate, duration), with_audio,
+            segment_encoder_args(quality, processing_mode, rate, workers), work_dir, workers, 'merge')
+        concat_video_segments(segment_paths, with_audio, output_format, work_dir, output_path,
+                              'concatenación de segmentos')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    output = probe_media(output_path)
+    return {
+        'duration': output['duration'],
+        'resolution': f"{output['video']['width']}x{output['video']['height']}"
+    }
+
+def merge_videos_filtergraph(paths, medias, quality, transition_type, processing_mode, output_format, output_path):
+    """Unir recodificando con ffmpeg (un solo proceso o por segmentos): los fotogramas nunca pasan por Python"""
+    workers, segment_seconds = parallel_encoding_settings(processing_mode)
+    if workers > 1 and sum(m['duration'] for m in medias) >= 2 * segment_seconds:
+        return merge_videos_segmented(paths, medias, quality, transition_type, processing_mode,
+                                      output_format, output_path, workers, segment_seconds)
+    graph, audio_label, expected = build_merge_filtergraph(medias, quality, transition_type)
+    logger.info(f'🎛️ Filtergraph de unión: {len(paths)} entradas, ~{expected:.1f}s')
+    inputs = []
+    for path in paths:
+        inputs += ['-i', path]
+    
+    def encode(encoder_args):
+        args = inputs + ['-filter_complex', graph, '-map', '[vout]', *encoder_args]
+        if audio_label:
+            args += ['-map', audio_label, '-c:a', 'aac', '-b:a', '192k']
+        if output_format in ('mp4', 'mov'):
+            args += ['-movflags', '+faststart']
+        run_ffmpeg(args + [output_path], 'filtergraph de unión')
+    
+    try:
+        encode(video_encoder_args(quality, processing_mode))
+    except RuntimeError as gpu_error:
+        if not use_gpu_encoder(processing_mode):
+            raise
+        logger.warning(f"⚠️ Error con GPU, cambiando a CPU: {gpu_error}")
+        encode(video_encoder_args(quality, 'cpu'))
+    
+    output = probe_media(output_path)
+    return {
+        'duration': output['duration'],
+        'resolution': f"{output['video']['width']}x{output['video']['height']}"
+    }
+
 @app.route('/api/merge-videos', methods=['POST'])
 def merge_videos():
     """Unir múltiples videos MP4 en uno solo"""
@@ -1356,14 +4060,108 @@ def loop_video():
         logger.error(f"❌ Error creando loop de video: {e}")
         return jsonify({'error': str(e)}), 500
 
-def process_video_merge(videos, output_quality, output_format, transition_type, processing_mode='auto'):
-    """Procesar unión de videos usando moviepy"""
+def merge_videos_moviepy(temp_video_paths, quality, transition_type, processing_mode, output_path):
+    """Unir recodificando todo con moviepy (transiciones o entradas heterogéneas)"""
+    from moviepy.editor import VideoFileClip, concatenate_videoclips
+    configure_moviepy()
+    
+    # Cargar videos con moviepy
+    video_clips = []
+    for i, temp_path in enumerate(temp_video_paths):
+        clip = VideoFileClip(temp_path)
+        logger.info(f'✅ Video {i+1} cargado: {clip.duration:.2f}s, {clip.size}')
+        video_clips.append(clip)
+    
+    # Redimensionar videos
+    logger.info(f'🔧 Ajustando resolución a {quality["height"]}p...')
+    resized_clips = []
+    for i, clip in enumerate(video_clips):
+        resized_clip = clip.resize(height=quality['height'])
+        logger.info(f'📐 Video {i+1} redimensionado: {resized_clip.size}')
+        resized_clips.append(resized_clip)
+    
+    # Aplicar transiciones si es necesario
+    if transition_type == 'fade':
+        logger.info('🎭 Aplicando transiciones fade...')
+        for i in range(1, len(resized_clips)):
+            resized_clips[i] = resized_clips[i].fadein(0.5)
+    elif transition_type == 'crossfade':
+        logger.info('🎭 Aplicando transiciones crossfade...')
+        for i in range(len(resized_clips) - 1):
+            resized_clips[i] = resized_clips[i].fadeout(0.5)
+        for i in range(1, len(resized_clips)):
+            resized_clips[i] = resized_clips[i].fadein(0.5)
+    
+    # Concatenar videos
+    logger.info('🔗 Uniendo videos...')
+    final_video = concatenate_videoclips(resized_clips)
+    
+    # Configurar parámetros de escritura según modo de procesamiento
+    use_gpu = use_gpu_encoder(processing_mode)
+    
+    if use_gpu:
+        # Usar H.264 para mejor compatibilidad con navegadores
+        codec = 'h264_nvenc'
+        # Parámetros más conservadores para evitar errores de nivel
+        write_params = {
+            'codec': codec,  # Usar encoder NVIDIA H.264
+            'audio_codec': 'aac',
+            'bitrate': quality['bitrate'],
+            'preset': 'fast'  # Preset rápido para GPU
+        }
+        logger.info(f"🚀 Usando GPU (RTX 3060/4070) con {codec.upper()}")
+    else:
+        write_params = {
+            'codec': 'libx264',
+            'audio_codec': 'aac',
+            'bitrate': quality['bitrate']
+        }
+        logger.info("💻 Usando CPU para procesar videos")
+    
     try:
-        from moviepy.editor import VideoFileClip, concatenate_videoclips
-        import tempfile
-        import os
-        import time
+        try:
+            final_video.write_videofile(
+                output_path,
+                **write_params,
+                verbose=False,
+                logger=None
+            )
+        except Exception as gpu_error:
+            if use_gpu:
+                logger.warning(f"⚠️ Error con GPU, cambiando a CPU: {gpu_error}")
+                # Fallback a CPU si GPU falla
+                write_params = {
+                    'codec': 'libx264',
+                    'audio_codec': 'aac',
+                    'bitrate': quality['bitrate']
+                }
+                logger.info("💻 Usando CPU como fallback")
+                final_video.write_videofile(
+                    output_path,
+                    **write_params,
+                    verbose=False,
+                    logger=None
+                )
+            else:
+                raise gpu_error
         
+        # Obtener información del video final
+        final_duration = final_video.duration
+        final_size = final_video.size
+    finally:
+        # Cerrar clips para liberar memoria
+        for clip in video_clips + resized_clips:
+            clip.close()
+        final_video.close()
+    
+    return {
+        'duration': final_duration,
+        'resolution': f"{final_size[0]}x{final_size[1]}"
+    }
+
+def process_video_merge(videos, output_quality, output_format, transition_type, processing_mode='auto'):
+    """Procesar unión de videos: planificar con ffprobe, recodificar solo lo necesario y con ffmpeg nativo"""
+    try:
         logger.info('🎬 Iniciando procesamiento de videos...')
         
         # Crear archivos temporales para los videos
@@ -1378,135 +4176,57 @@ def process_video_merge(videos, output_quality, output_format, transition_type,
                 temp_video_paths.append(temp_video_path)
                 logger.info(f'📁 Guardando video {i+1}: {video_file.filename}')
             
-            # Cargar videos con moviepy
-            video_clips = []
-            for i, temp_path in enumerate(temp_video_paths):
-                clip = VideoFileClip(temp_path)
-                logger.info(f'✅ Video {i+1} cargado: {clip.duration:.2f}s, {clip.size}')
-                video_clips.append(clip)
-            
             # Configurar calidad de salida
-            quality_settings = {
-                '4k': {'height': 2160, 'bitrate': '15000k'},
-                '1440p': {'height': 1440, 'bitrate': '8000k'},
-                'high': {'height': 1080, 'bitrate': '5000k'},
-                'medium': {'height': 720, 'bitrate': '2500k'},
-                'low': {'height': 480, 'bitrate': '1000k'}
-            }
-            
-            quality = quality_settings.get(output_quality, quality_settings['medium'])
+            quality = VIDEO_QUALITY_SETTINGS.get(output_quality, VIDEO_QUALITY_SETTINGS['medium'])
             
-            # Redimensionar videos
-            logger.info(f'🔧 Ajustando resolución a {quality["height"]}p...')
-            resized_clips = []
-            for i, clip in enumerate(video_clips):
-                resized_clip = clip.resize(height=quality['height'])
-                logger.info(f'📐 Video {i+1} redimensionado: {resized_clip.size}')
-                resized_clips.append(resized_clip)
-            
-            # Aplicar transiciones si es necesario
-            if transition_type == 'fade':
-                logger.info('🎭 Aplicando transiciones fade...')
-                for i in range(1, len(resized_clips)):
-                    resized_clips[i] = resized_clips[i].fadein(0.5)
-            elif transition_type == 'crossfade':
-                logger.info('🎭 Aplicando transiciones crossfade...')
-                for i in range(len(resized_clips) - 1):
-                    resized_clips[i] = resized_clips[i].fadeout(0.5)
-                for i in range(1, len(resized_clips)):
-                    resized_clips[i] = resized_clips[i].fadein(0.5)
-            
-            # Concatenar videos
-            logger.info('🔗 Uniendo videos...')
-            final_video = concatenate_videoclips(resized_clips)
+            # Analizar entradas y elegir el plan más barato
+            medias = []
+            for i, temp_path in enumerate(temp_video_paths):
+                try:
+                    medias.append(probe_media(temp_path, h264_headers=True))
+                except Exception as e:
+                    logger.warning(f"⚠️ No se pudo analizar el video {i+1} con ffprobe: {e}")
+                    medias.append(None)
+            plan = plan_video_merge(medias, quality, output_format, transition_type)
+            logger.info(f"🧭 Plan de unión: {plan['strategy']} ({plan['reason']})")
             
             # Crear archivo de salida temporal
             timestamp = int(time.time())
             output_filename = f"video_unido_{timestamp}.{output_format}"
             temp_output_path = os.path.join(tempfile.gettempdir(), output_filename)
             
-            # Configurar parámetros de escritura según modo de procesamiento
-            use_gpu = False
-            if processing_mode == 'gpu' and GPU_AVAILABLE:
-                use_gpu = True
-            elif processing_mode == 'cpu':
-                use_gpu = False
-            elif processing_mode == 'auto' and GPU_AVAILABLE:
-                use_gpu = True
-            
-            if use_gpu:
-                # Usar H.264 para mejor compatibilidad con navegadores
-                codec = 'h264_nvenc'
-                # Parámetros más conservadores para evitar errores de nivel
-                write_params = {
-                    'codec': codec,  # Usar encoder NVIDIA H.264
-                    'audio_codec': 'aac',
-                    'bitrate': quality['bitrate'],
-                    'preset': 'fast'  # Preset rápido para GPU
-                }
-                logger.info(f"🚀 Usando GPU (RTX 3060/4070) con {codec.upper()}")
-            else:
-                write_params = {
-                    'codec': 'libx264',
-                    'audio_codec': 'aac',
-                    'bitrate': quality['bitrate']
-                }
-                logger.info("💻 Usando CPU para procesar videos")
-            
             logger.info(f'💾 Guardando video final: {output_filename}')
-            try:
-                final_video.write_videofile(
-                    temp_output_path,
-                    **write_params,
-                    verbose=False,
-                    logger=None
-                )
-            except Exception as gpu_error:
-                if use_gpu:
-                    logger.warning(f"⚠️ Error con GPU, cambiando a CPU: {gpu_error}")
-                    # Fallback a CPU si GPU falla
-                    write_params = {
-                        'codec': 'libx264',
-                        'audio_codec': 'aac',
-                        'bitrate': quality['bitrate']
-                    }
-                    logger.info("💻 Usando CPU como fallback")
-                    final_video.write_videofile(
-                        temp_output_path,
-                        **write_params,
-                        verbose=False,
-                        logger=None
-                    )
-                else:
-                    raise gpu_error
+            details = None
+            if plan['strategy'] != 'transcode':
+                try:
+                    details = merge_videos_by_plan(temp_video_paths, medias, plan, quality,
+                                                   processing_mode, output_format, temp_output_path)
+                    engine = 'ffmpeg'
+                except Exception as e:
+                    logger.warning(f"⚠️ Plan {plan['strategy']} falló, recodificando todo: {e}")
+                    plan = {'strategy': 'transcode', 'reencode': list(range(len(videos))),
+                            'reference': None, 'reason': f"fallo del plan {plan['strategy']}: {e}"}
+            if details is None and all(m and m.get('video') and m['duration'] > 0 for m in medias):
+                try:
+                    details = merge_videos_filtergraph(temp_video_paths, medias, quality, transition_type,
+                                                       processing_mode, output_format, temp_output_path)
+                    engine = 'ffmpeg'
+                except Exception as e:
+                    logger.warning(f"⚠️ Filtergraph de ffmpeg falló, usando MoviePy: {e}")
+            if details is None:
+                details = merge_videos_moviepy(temp_video_paths, quality, transition_type,
+                                               processing_mode, temp_output_path)
+                engine = 'moviepy'
             
-            # Obtener información del video final
-            final_duration = final_video.duration
-            final_size = final_video.size
             file_size = os.path.getsize(temp_output_path)
             
-            # Crear directorio de videos si no existe
-            videos_dir = os.path.join('static', 'videos', 'merged')
-            os.makedirs(videos_dir, exist_ok=True)
-            
             # Mover video a directorio estático
-            final_video_path = os.path.join(videos_dir, output_filename)
-            import shutil
-            shutil.move(temp_output_path, final_video_path)
-            
-            # Generar URL local
-            video_url = f"/static/videos/merged/{output_filename}"
-            logger.info(f'📁 Video guardado localmente: {video_url}')
+            video_url = publish_local_video(temp_output_path, 'merged', output_filename)
             
             # Limpiar archivos temporales
             for temp_path in temp_video_paths:
                 os.unlink(temp_path)
             
-            # Cerrar clips para liberar memoria
-            for clip in video_clips + resized_clips:
-                clip.close()
-            final_video.close()
-            
             logger.info(f'✅ Video unido exitosamente: {video_url}')
             
             return jsonify({
@@ -1514,13 +4234,19 @@ def process_video_merge(videos, output_quality, output_format, transition_type,
                 'video_url': video_url,
                 'video_details': {
                     'filename': output_filename,
-                    'duration': f"{int(final_duration//60)}:{(int(final_duration%60)):02d}",
+                    'duration': format_mmss(details['duration']),
                     'size': format_file_size(file_size),
-                    'resolution': f"{final_size[0]}x{final_size[1]}",
+                    'resolution': details['resolution'],
                     'format': output_format.upper(),
                     'quality': output_quality,
                     'transition': transition_type,
-                    'videos_merged': len(videos)
+                    'videos_merged': len(videos),
+                    'plan': {
+                        'strategy': plan['strategy'],
+                        'reencoded': [i + 1 for i in plan['reencode']],
+                        'reason': plan['reason'],
+                        'engine': engine
+                    }
                 }
             })
             
@@ -1537,14 +4263,105 @@ def process_video_merge(videos, output_quality, output_format, transition_type,
         logger.error(f"❌ Error procesando unión de videos: {e}")
         return jsonify({'error': str(e)}), 500
 
-def process_video_loop(video_file, target_duration, loop_quality, loop_format, loop_transition, processing_mode='auto'):
-    """Procesar loop de video usando moviepy"""
+def loop_video_moviepy(source_path, target_duration, quality, loop_transition, processing_mode, output_path):
+    """Loop recodificando con moviepy (transiciones o resolución distinta a la de salida)"""
+    from moviepy.editor import VideoFileClip, concatenate_videoclips
+    configure_moviepy()
+    
+    # Cargar video con moviepy
+    original_clip = VideoFileClip(source_path)
+    original_duration = original_clip.duration
+    
+    logger.info(f'📹 Video original: {original_duration:.2f}s')
+    logger.info(f'🎯 Duración objetivo: {target_duration}s')
+    
+    # Calcular cuántos loops necesitamos
+    loops_needed = int(target_duration / original_duration) + 1
+    logger.info(f'🔄 Loops necesarios: {loops_needed}')
+    
+    # Redimensionar video
+    logger.info(f'🔧 Ajustando resolución a {quality["height"]}p...')
+    resized_clip = original_clip.resize(height=quality['height'])
+    
+    # Crear lista de clips para el loop
+    loop_clips = []
+    
+    for i in range(loops_needed):
+        # Crear una copia del clip para cada loop
+        loop_clip = resized_clip.copy()
+        
+        # Aplicar transiciones si es necesario
+        if loop_transition == 'fade' and i > 0:
+            # Aplicar fade in al inicio (excepto el primer clip)
+            loop_clip = loop_clip.fadein(0.5)
+        elif loop_transition == 'crossfade' and i > 0:
+            # Aplicar crossfade (más complejo)
+            loop_clip = loop_clip.fadein(0.3).fadeout(0.3)
+        
+        loop_clips.append(loop_clip)
+        logger.info(f'🔄 Loop {i+1}/{loops_needed} preparado')
+    
+    # Concatenar todos los clips
+    logger.info('🔗 Concatenando loops...')
+    final_video = concatenate_videoclips(loop_clips)
+    
+    # Recortar a la duración exacta si es necesario
+    if final_video.duration > target_duration:
+        final_video = final_video.subclip(0, target_duration)
+        logger.info(f'✂️ Video recortado a {target_duration}s')
+    
+    # Configurar parámetros de escritura según modo de procesamiento
+    if use_gpu_encoder(processing_mode):
+        # Usar H.264 para mejor compatibilidad con navegadores
+        codec = 'h264_nvenc'
+        # Parámetros más conservadores para evitar errores de nivel
+        write_params = {
+            'codec': codec,  # Usar encoder NVIDIA H.264
+            'audio_codec': 'aac',
+            'bitrate': quality['bitrate'],
+            'preset': 'fast'  # Preset rápido para GPU
+        }
+        logger.info(f"🚀 Usando GPU (RTX 3060/4070) con {codec.upper()}")
+    else:
+        write_params = {
+            'codec': 'libx264',
+            'audio_codec': 'aac',
+            'bitrate': quality['bitrate']
+        }
+        logger.info("💻 Usando CPU para procesar videos")
+    
     try:
-        from moviepy.editor import VideoFileClip, concatenate_videoclips
-        import tempfile
-        import os
-        import time
+        final_video.write_videofile(
+            output_path,
+            **write_params,
+            verbose=False,
+            logger=None
+        )
         
+        # Obtener información del video final
+        final_duration = final_video.duration
+        final_size = final_video.size
+    finally:
+        # Cerrar clips para liberar memoria ANTES de mover el archivo
+        original_clip.close()
+        resized_clip.close()
+        final_video.close()
+        for clip in loop_clips:
+            clip.close()
+    
+    # Esperar un momento para que se libere el archivo
+    time.sleep(1)
+    
+    return {
+        'loops_created': loops_needed,
+        'original_duration': original_duration,
+        'final_duration': final_duration,
+        'resolution': f"{final_size[0]}x{final_size[1]}"
+    }
+
+def process_video_loop(video_file, target_duration, loop_quality, loop_format, loop_transition, processing_mode='auto'):
+    """Procesar loop de video: copia de streams cuando es posible y, si no, moviepy"""
+    try:
         logger.info('🔄 Iniciando procesamiento de loop de video...')
         
         # Crear archivo temporal para el video
@@ -1556,163 +4373,65 @@ def process_video_loop(video_file, target_duration, loop_quality, loop_format, l
             video_file.save(temp_video_path)
             logger.info(f'📁 Video guardado: {video_file.filename}')
             
-            # Cargar video con moviepy
-            original_clip = VideoFileClip(temp_video_path)
-            original_duration = original_clip.duration
-            
-            logger.info(f'📹 Video original: {original_duration:.2f}s')
-            logger.info(f'🎯 Duración objetivo: {target_duration}s')
-            
-            # Calcular cuántos loops necesitamos
-            loops_needed = int(target_duration / original_duration) + 1
-            logger.info(f'🔄 Loops necesarios: {loops_needed}')
-            
-            # Configurar calidad de salida
-            quality_settings = {
-                '4k': {'height': 2160, 'bitrate': '15000k'},
-                '1440p': {'height': 1440, 'bitrate': '8000k'},
-                'high': {'height': 1080, 'bitrate': '5000k'},
-                'medium': {'height': 720, 'bitrate': '2500k'},
-                'low': {'height': 480, 'bitrate': '1000k'}
-            }
-            
-            quality = quality_settings.get(loop_quality, quality_settings['medium'])
-            
-            # Redimensionar video
-            logger.info(f'🔧 Ajustando resolución a {quality["height"]}p...')
-            resized_clip = original_clip.resize(height=quality['height'])
-            
-            # Crear lista de clips para el loop
-            loop_clips = []
-            
-            for i in range(loops_needed):
-                # Crear una copia del clip para cada loop
-                loop_clip = resized_clip.copy()
-                
-                # Aplicar transiciones si es necesario
-                if loop_transition == 'fade' and i > 0:
-                    # Aplicar fade in al inicio (excepto el primer clip)
-                    loop_clip = loop_clip.fadein(0.5)
-                elif loop_transition == 'crossfade' and i > 0:
-                    # Aplicar crossfade (más complejo)
-                    loop_clip = loop_clip.fadein(0.3).fadeout(0.3)
-                
-                loop_clips.append(loop_clip)
-                logger.info(f'🔄 Loop {i+1}/{loops_needed} preparado')
-            
-            # Concatenar todos los clips
-            logger.info('🔗 Concatenando loops...')
-            final_video = concatenate_videoclips(loop_clips)
-            
-            # Recortar a la duración exacta si es necesario
-            if final_video.duration > target_duration:
-                final_video = final_video.subclip(0, target_duration)
-                logger.info(f'✂️ Video recortado a {target_duration}s')
+            quality = VIDEO_QUALITY_SETTINGS.get(loop_quality, VIDEO_QUALITY_SETTINGS['medium'])
             
             # Crear archivo de salida temporal
             timestamp = int(time.time())
             output_filename = f"video_loop_{timestamp}.{loop_format}"
             temp_output_path = os.path.join(tempfile.gettempdir(), output_filename)
             
-            # Configurar parámetros de escritura según modo de procesamiento
-            use_gpu = False
-            if processing_mode == 'gpu' and GPU_AVAILABLE:
-                use_gpu = True
-            elif processing_mode == 'cpu':
-                use_gpu = False
-            elif processing_mode == 'auto' and GPU_AVAILABLE:
-                use_gpu = True
-            
-            if use_gpu:
-                # Usar H.264 para mejor compatibilidad con navegadores
-                codec = 'h264_nvenc'
-                # Parámetros más conservadores para evitar errores de nivel
-                write_params = {
-                    'codec': codec,  # Usar encoder NVIDIA H.264
-                    'audio_codec': 'aac',
-                    'bitrate': quality['bitrate'],
-                    'preset': 'fast'  # Preset rápido para GPU
-                }
-                logger.info(f"🚀 Usando GPU (RTX 3060/4070) con {codec.upper()}")
-            else:
-                write_params = {
-                    'codec': 'libx264',
-                    'audio_codec': 'aac',
-                    'bitrate': quality['bitrate']
-                }
-                logger.info("💻 Usando CPU para procesar videos")
+            try:
+                media = probe_media(temp_video_path)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo analizar el video con ffprobe: {e}")
+                media = None
             
             logger.info(f'💾 Guardando video con loop: {output_filename}')
-            final_video.write_videofile(
-                temp_output_path,
-                **write_params,
-                verbose=False,
-                logger=None
-            )
+            details = None
+            if media and can_stream_copy_loop(media, quality, loop_format, loop_transition):
+                try:
+                    method = 'stream_copy'
+                    details = loop_video_stream_copy(temp_video_path, media, target_duration, loop_format, temp_output_path)
+                except Exception as e:
+                    logger.warning(f"⚠️ Loop sin recodificar falló, recodificando: {e}")
+            if details is None and media and media.get('video') and media['duration'] > 0:
+                try:
+                    method = 'encode_once'
+                    details = loop_video_encode_once(temp_video_path, media, target_duration, quality,
+                                                     loop_transition, loop_format, processing_mode,
+                                                     temp_output_path)
+                except Exception as e:
+                    logger.warning(f"⚠️ Loop con ffmpeg falló, usando MoviePy: {e}")
+            if details is None:
+                method = 'moviepy'
+                details = loop_video_moviepy(temp_video_path, target_duration, quality,
+                                             loop_transition, processing_mode, temp_output_path)
             
-            # Obtener información del video final
-            final_duration = final_video.duration
-            final_size = final_video.size
             file_size = os.path.getsize(temp_output_path)
             
-            # Crear directorio de videos si no existe
-            videos_dir = os.path.join('static', 'videos', 'loops')
-            os.makedirs(videos_dir, exist_ok=True)
-            
-            # Cerrar clips para liberar memoria ANTES de mover el archivo
-            original_clip.close()
-            resized_clip.close()
-            final_video.close()
-            for clip in loop_clips:
-                clip.close()
-            
-            # Esperar un momento para que se libere el archivo
-            import time
-            time.sleep(1)
-            
             # Mover video a directorio estático
-            final_video_path = os.path.join(videos_dir, output_filename)
-            import shutil
-            
-            # Intentar mover el archivo con reintentos
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    shutil.move(temp_output_path, final_video_path)
-                    break
-                except (OSError, PermissionError) as e:
-                    if attempt < max_retries - 1:
-                        logger.warning(f'⚠️ Intento {attempt + 1} fallido, reintentando en 2 segundos...')
-                        time.sleep(2)
-                    else:
-                        # Como último recurso, copiar en lugar de mover
-                        shutil.copy2(temp_output_path, final_video_path)
-                        os.unlink(temp_output_path)
-                        logger.info('📁 Archivo copiado en lugar de movido')
-            
-            # Generar URL local
-            video_url = f"/static/videos/loops/{output_filename}"
-            logger.info(f'📁 Video guardado localmente: {video_url}')
+            video_url = publish_local_video(temp_output_path, 'loops', output_filename)
             
             # Limpiar archivos temporales
             os.unlink(temp_video_path)
             
-            logger.info(f'✅ Loop de video creado exitosamente: {video_url}')
+            logger.info(f'✅ Loop de video creado exitosamente ({method}): {video_url}')
             
             return jsonify({
                 'success': True,
                 'video_url': video_url,
                 'video_details': {
                     'filename': output_filename,
-                    'original_duration': f"{int(original_duration//60)}:{(int(original_duration%60)):02d}",
-                    'final_duration': f"{int(final_duration//60)}:{(int(final_duration%60)):02d}",
-                    'target_duration': f"{int(target_duration//60)}:{(int(target_duration%60)):02d}",
-                    'loops_created': loops_needed,
+                    'original_duration': format_mmss(details['original_duration']),
+                    'final_duration': format_mmss(details['final_duration']),
+                    'target_duration': format_mmss(target_duration),
+                    'loops_created': details['loops_created'],
                     'size': format_file_size(file_size),
-                    'resolution': f"{final_size[0]}x{final_size[1]}",
+                    'resolution': details['resolution'],
                     'format': loop_format.upper(),
                     'quality': loop_quality,
-                    'transition': loop_transition
+                    'transition': loop_transition,
+                    'method': method
                 }
             })
             
@@ -1783,6 +4502,441 @@ def api_save_preset():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+def load_presets():
+    """Preajustes guardados por slot ({} si todavía no hay archivo)"""
+    if not os.path.exists(PRESETS_FILE):
+        return {}
+    with open(PRESETS_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f).get('presets', {})
+
+# Guiones de diálogo: cada línea empieza con [slot de preajuste] o [nombre de voz]
+DIALOGUE_LINE = re.compile(r'^\s*\[([^\]]+)\]\s*(.*)$')
+
+def parse_dialogue_script(script):
+    """Líneas del guion en orden; las líneas sin etiqueta continúan la intervención anterior"""
+    lines = []
+    for number, raw in enumerate(script.splitlines(), 1):
+        stripped = raw.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        m = DIALOGUE_LINE.match(raw)
+        if m:
+            lines.append({'speaker': m.group(1).strip(), 'text': m.group(2).strip(), 'line': number})
+        elif lines:
+            lines[-1]['text'] = f"{lines[-1]['text']} {stripped}".strip()
+        else:
+            raise ValueError(f'Línea {number}: falta la etiqueta de voz, p. ej. [1] o [es-ES-Neural2-B]')
+    return [line for line in lines if line['text']]
+
+def resolve_voice_params(presets, preset_slot=None, voice_name=None, overrides=None):
+    """Parámetros de síntesis a partir de un slot de presets.json y/o una voz, con valores explícitos encima"""
+    overrides = {k: v for k, v in (overrides or {}).items() if v not in (None, '')}
+    preset = {}
+    if preset_slot:
+        preset = presets.get(str(preset_slot))
+        if not preset or not (preset.get('voice_name') or preset.get('voice_language')):
+            raise ValueError(f'El preajuste [{preset_slot}] no existe o no tiene voz configurada')
+    params = {**preset, **overrides}
+    voice_name = voice_name or params.get('voice_name')
+    if voice_name and not params.get('voice_language'):
+        parts = voice_name.split('-')
+        if len(parts) < 3:
+            raise ValueError(f'Voz no válida: [{voice_name}]')
+        params['voice_language'] = '-'.join(parts[:2])
+    voice_language = params.get('voice_language') or CONFIG.get('default_voice_language', 'es-ES')
+    voice_name = voice_name or get_default_voice_name(voice_language)
+    return {
+        'voice_language': voice_language,
+        'voice_name': resolve_voice_name(voice_language, voice_name),
+        'voice_style': params.get('voice_style', 'none'),
+        'effects_profile_id': params.get('effects_profile_id', ''),
+        'speaking_rate': float(params.get('speaking_rate', CONFIG.get('default_speaking_rate', 1.0))),
+        'pitch': float(params.get('pitch', CONFIG.get('default_pitch', 0.0))),
+        'volume_gain_db': float(params.get('volume_gain_db', CONFIG.get('default_volume_gain_db', 0.0)))
+    }
+
+def resolve_dialogue_speaker(tag, presets):
+    """Parámetros de síntesis de una etiqueta: slot de presets.json o nombre de voz completo"""
+    if tag.isdigit():
+        return resolve_voice_params(presets, preset_slot=tag)
+    return resolve_voice_params(presets, voice_name=tag)
+
+def assemble_pcm_lines(lines, gap_ms, output_path):
+    """Unir las líneas (listas de chunks WAV) en orden con gap_ms de silencio entre ellas"""
+    params = None
+    with wave.open(output_path, 'wb') as writer:
+        for index, chunk_paths in enumerate(lines):
+            if index and gap_ms and params:
+                channels, sampwidth, framerate = params
+                writer.writeframesraw(b'\x00' * (int(framerate * gap_ms / 1000) * channels * sampwidth))
+            for chunk_path in chunk_paths:
+                params = append_pcm_chunk(writer, chunk_path, params)
+    return output_path
+
+def run_dialogue_job(job_id, script, gap_ms, audio_format):
+    """Sintetizar un guion de diálogo: chunks agrupados por voz en paralelo y ensamblado en el orden del guion"""
+    tts_client = get_backend('tts')
+    update_job(job_id, stage='parsing', progress=2)
+    lines = parse_dialogue_script(script)
+    if not lines:
+        raise ValueError('El guion no contiene líneas')
+    
+    presets = load_presets()
+    speakers = {tag: resolve_dialogue_speaker(tag, presets) for tag in dict.fromkeys(line['speaker'] for line in lines)}
+    logger.info(f'🎭 Guion: {len(lines)} líneas, {len(speakers)} voces')
+    
+    # Todas las voces a la misma frecuencia para poder unir el PCM sin remuestrear
+    sample_rate = CONFIG.get('dialogue_sample_rate', 24000)
+    audio_configs = {
+        tag: texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding.LINEAR16,
+            sample_rate_hertz=sample_rate,
+            speaking_rate=speaker['speaking_rate'],
+            pitch=speaker['pitch'],
+            volume_gain_db=speaker['volume_gain_db'],
+            effects_profile_id=[speaker['effects_profile_id']] if speaker['effects_profile_id'] else None
+        )
+        for tag, speaker in speakers.items()
+    }
+    
+    # Chunks de cada línea (dentro del límite de bytes), enviados agrupados por voz
+    tasks = []
+    for line_index, line in enumerate(lines):
+        style = speakers[line['speaker']]['voice_style']
+        for chunk_index, packed in enumerate(pack_tts_chunks(split_text_pieces(line['text']), style, len(line['text']))):
+            tasks.append((line['speaker'], line_index, chunk_index, packed))
+    speaker_order = {tag: i for i, tag in enumerate(speakers)}
+    tasks.sort(key=lambda task: speaker_order[task[0]])
+    
+    run_id = uuid.uuid4().hex[:8]
+    line_chunks = [[] for _ in lines]
+    final_path = None
+    # Todos los chunks escritos por los workers (incluidos los que nadie llegó a consumir)
+    written_paths = []
+    written_lock = threading.Lock()
+    cancelled = threading.Event()
+    
+    def synthesize(i, task):
+        tag, line_index, chunk_index, packed = task
+        if cancelled.is_set():
+            return line_index, chunk_index, None, False
+        speaker = speakers[tag]
+        audio_content, cached = synthesize_tts_chunk(
+            tts_client, packed['text'], packed['ssml'], speaker['voice_language'], speaker['voice_name'],
+            audio_configs[tag], speaker['voice_style'], len(lines[line_index]['text'])
+        )
+        if cancelled.is_set():
+            return line_index, chunk_index, None, cached
+        chunk_path = os.path.join(tempfile.gettempdir(), f"dialogue_{run_id}_{line_index}_{chunk_index}.wav")
+        with written_lock:
+            written_paths.append(chunk_path)
+        with open(chunk_path, 'wb') as out:
+            out.write(audio_content)
+        return line_index, chunk_index, chunk_path, cached
+    
+    update_job(job_id, stage='synthesizing', progress=5)
+    workers = max(1, CONFIG.get('tts_max_concurrency', 4))
+    results = iter_ordered_results(tasks, synthesize, workers)
+    try:
+        cache_hits = 0
+        for done, (line_index, chunk_index, chunk_path, cached) in enumerate(results, 1):
+            line_chunks[line_index].append((chunk_index, chunk_path))
+            cache_hits += 1 if cached else 0
+            update_job(job_id, progress=5 + int(done / len(tasks) * 80))
+        
+        update_job(job_id, stage='assembling', progress=88)
+        timestamp = int(time.time())
+        final_filename = f"dialogue_{timestamp}.{audio_format}"
+        final_path = os.path.join(tempfile.gettempdir(), f"{run_id}_{final_filename}")
+        ordered = [[path for _, path in sorted(chunks)] for chunks in line_chunks]
+        if audio_format == 'wav':
+            assemble_pcm_lines(ordered, gap_ms, final_path)
+        else:
+            fd, pcm_path = tempfile.mkstemp(suffix='.wav')
+            os.close(fd)
+            try:
+                assemble_pcm_lines(ordered, gap_ms, pcm_path)
+                encode_audio_file(pcm_path, final_path, audio_format)
+            finally:
+                os.unlink(pcm_path)
+        
+        update_job(job_id, stage='uploading', progress=95)
+        audio_url = upload_audio_to_gcs_public(final_path, f"audio/synthesized/{timestamp}_{final_filename}")
+        logger.info(f'✅ Diálogo generado: {audio_url}')
+        
+        return {
+            'success': True,
+            'audio_url': audio_url,
+            'method': 'dialogue',
+            'filename': final_filename,
+            'lines': len(lines),
+            'speakers': {tag: speaker['voice_name'] for tag, speaker in speakers.items()},
+            'chunks_processed': len(tasks),
+            'tts_cache': {'hits': cache_hits, 'misses': len(tasks) - cache_hits}
+        }
+    finally:
+        # Línea fallida: cancelar lo pendiente y esperar a los workers en curso antes de borrar
+        cancelled.set()
+        results.close()
+        with written_lock:
+            leftover = list(written_paths)
+        for path in leftover + ([final_path] if final_path else []):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+@app.route('/api/dialogue-to-audio', methods=['POST'])
+def dialogue_to_audio():
+    """Encolar la síntesis de un guion multivoz (archivo script_file o campo script)"""
+    try:
+        if 'script_file' in request.files and request.files['script_file'].filename:
+            script = request.files['script_file'].read().decode('utf-8')
+        else:
+            script = request.form.get('script', '')
+        if not script.strip():
+            return jsonify({'error': 'No se proporcionó guion'}), 400
+        
+        # Validar el guion y las voces antes de encolar
+        lines = parse_dialogue_script(script)
+        if not lines:
+            return jsonify({'error': 'El guion no contiene líneas'}), 400
+        presets = load_presets()
+        for tag in dict.fromkeys(line['speaker'] for line in lines):
+            resolve_dialogue_speaker(tag, presets)
+        
+        gap_ms = max(0, int(request.form.get('gap_ms', CONFIG.get('dialogue_gap_ms', 400))))
+        audio_format = request.form.get('audio_format', CONFIG.get('default_audio_format', 'mp3'))
+        if audio_format not in AUDIO_OUTPUT_CODECS:
+            return jsonify({'error': f'Formato no soportado: {audio_format}'}), 400
+        
+        job_id = submit_job('dialogue', run_dialogue_job, script, gap_ms, audio_format)
+        return job_accepted_response(job_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"❌ Error en diálogo: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Lotes de TTS: muchos textos cortos en un solo trabajo con la cuota compartida
+BATCH_VOICE_FIELDS = ('voice_language', 'voice_name', 'voice_style', 'effects_profile_id',
+                      'speaking_rate', 'pitch', 'volume_gain_db')
+
+def read_batch_zip(file_storage, defaults):
+    """Elementos del lote desde un ZIP de .txt (el nombre del archivo es el id)"""
+    max_bytes = CONFIG.get('batch_max_text_mb', 20) * 1024 * 1024
+    items = []
+    with zipfile.ZipFile(file_storage.stream) as archive:
+        entries = [info for info in archive.infolist()
+                   if not info.is_dir() and info.filename.lower().endswith('.txt')
+                   and not os.path.basename(info.filename).startswith('.')]
+        if sum(info.file_size for info in entries) > max_bytes:
+            raise ValueError(f'El ZIP supera {CONFIG.get("batch_max_text_mb", 20)} MB de texto')
+        for info in sorted(entries, key=lambda info: info.filename):
+            text = archive.read(info).decode('utf-8')
+            items.append({**defaults, 'id': os.path.splitext(os.path.basename(info.filename))[0], 'text': text})
+    return items
+
+def prepare_batch_items(raw_items, presets):
+    """Validar los elementos y resolver sus voces antes de encolar"""
+    if not raw_items or not isinstance(raw_items, list):
+        raise ValueError('El lote no contiene textos')
+    if len(raw_items) > CONFIG.get('batch_max_items', 500):
+        raise ValueError(f'El lote supera el máximo de {CONFIG.get("batch_max_items", 500)} textos')
+    max_bytes = CONFIG.get('batch_max_text_mb', 20) * 1024 * 1024
+    total_bytes = 0
+    items = []
+    seen_ids = set()
+    for index, raw in enumerate(raw_items):
+        if not isinstance(raw, dict) or not isinstance(raw.get('text'), str) or not raw['text'].strip():
+            raise ValueError(f'Elemento {index}: "text" debe ser un texto no vacío')
+        total_bytes += len(raw['text'].encode('utf-8'))
+        if total_bytes > max_bytes:
+            raise ValueError(f'El lote supera {CONFIG.get("batch_max_text_mb", 20)} MB de texto')
+        item_id = re.sub(r'[^A-Za-z0-9_.-]', '_', str(raw.get('id') or f'{index + 1:04d}'))
+        if item_id in seen_ids:
+            item_id = f'{item_id}_{index + 1}'
+        seen_ids.add(item_id)
+        params = resolve_voice_params(
+            presets, preset_slot=raw.get('preset'),
+            overrides={field: raw.get(field) for field in BATCH_VOICE_FIELDS}
+        )
+        items.append({'id': item_id, 'text': raw['text'], **params})
+    return items
+
+def run_batch_tts_job(job_id, items, audio_format, output):
+    """Sintetizar un lote: todos los chunks en un pool acotado y cada texto ensamblado y subido al terminar"""
+    tts_client = get_backend('tts')
+    run_id = uuid.uuid4().hex[:8]
+    timestamp = int(time.time())
+    
+    # Textos de un solo chunk se piden ya en el formato final; los largos en LINEAR16 para unirlos
+    tasks = []
+    for item_index, item in enumerate(items):
+        chunks = list(pack_tts_chunks(split_text_pieces(item['text']), item['voice_style'], len(item['text'])))
+        item['chunk_format'] = audio_format if len(chunks) == 1 and audio_format in ('mp3', 'ogg', 'wav') else 'wav'
+        item['audio_config'] = texttospeech.AudioConfig(
+            audio_encoding=get_audio_encoding(item['chunk_format']),
+            speaking_rate=item['speaking_rate'],
+            pitch=item['pitch'],
+            volume_gain_db=item['volume_gain_db'],
+            effects_profile_id=[item['effects_profile_id']] if item['effects_profile_id'] else None
+        )
+        item['chunks'] = len(chunks)
+        for chunk_index, packed in enumerate(chunks):
+            tasks.append((item_index, chunk_index, packed))
+    logger.info(f'📦 Lote: {len(items)} textos, {len(tasks)} chunks')
+    
+    def synthesize(i, task):
+        item_index, chunk_index, packed = task
+        item = items[item_index]
+        try:
+            audio_content, cached = synthesize_tts_chunk(
+                tts_client, packed['text'], packed['ssml'], item['voice_language'], item['voice_name'],
+                item['audio_config'], item['voice_style'], len(item['text'])
+            )
+        except Exception as e:
+            return item_index, None, False, str(e)
+        chunk_path = os.path.join(tempfile.gettempdir(), f"batch_{run_id}_{item_index}_{chunk_index}.{item['chunk_format']}")
+        with open(chunk_path, 'wb') as out:
+            out.write(audio_content)
+        return item_index, chunk_path, cached, None
+    
+    def finalize(item_index, chunk_paths, error):
+        """Ensamblar y subir (o solo ensamblar para el ZIP) un texto terminado"""
+        item = items[item_index]
+        entry = {'id': item['id'], 'voice_name': item['voice_name'], 'chars': len(item['text']), 'chunks': item['chunks']}
+        filename = f"{item['id']}.{audio_format}"
+        output_path = os.path.join(tempfile.gettempdir(), f"batch_{run_id}_{filename}")
+        try:
+            if error:
+                raise RuntimeError(error)
+            if len(chunk_paths) == 1 and item['chunk_format'] == audio_format:
+                shutil.move(chunk_paths[0], output_path)
+            else:
+                assemble_audio_chunks(chunk_paths, item['chunk_format'], audio_format, output_path)
+            if output == 'zip':
+                return {**entry, 'success': True, 'filename': filename, 'path': output_path}
+            audio_url = upload_audio_to_gcs_public(output_path, f"audio/batch/{timestamp}_{run_id}_{filename}")
+            os.unlink(output_path)
+            return {**entry, 'success': True, 'filename': filename, 'audio_url': audio_url}
+        except Exception as e:
+            logger.error(f"❌ Error en elemento {item['id']} del lote: {e}")
+            return {**entry, 'success': False, 'error': str(e)}
+        finally:
+            for chunk_path in chunk_paths:
+                try:
+                    os.unlink(chunk_path)
+                except OSError:
+                    pass
+    
+    update_job(job_id, stage='synthesizing', progress=2)
+    workers = max(1, CONFIG.get('tts_max_concurrency', 4))
+    manifest = []
+    cache_hits = 0
+    finalizers = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, CONFIG.get('batch_upload_workers', 4)), thread_name_prefix='batch-upload') as uploader:
+            current, paths, error = None, [], None
+            # Los resultados llegan en orden, así que los chunks de cada texto llegan seguidos
+            for done, (item_index, chunk_path, cached, chunk_error) in enumerate(iter_ordered_results(tasks, synthesize, workers), 1):
+                if current is not None and item_index != current:
+                    finalizers.append(uploader.submit(finalize, current, paths, error))
+                    paths, error = [], None
+                current = item_index
+                if chunk_path:
+                    paths.append(chunk_path)
+                error = error or chunk_error
+                cache_hits += 1 if cached else 0
+                update_job(job_id, progress=2 + int(done / len(tasks) * 85))
+            if current is not None:
+                finalizers.append(uploader.submit(finalize, current, paths, error))
+            manifest = [future.result() for future in finalizers]
+        
+        result = {
+            'success': True,
+            'method': 'batch',
+            'audio_format': audio_format,
+            'total': len(items),
+            'succeeded': sum(1 for entry in manifest if entry['success']),
+            'failed': sum(1 for entry in manifest if not entry['success']),
+            'chunks_processed': len(tasks),
+            'tts_cache': {'hits': cache_hits, 'misses': len(tasks) - cache_hits}
+        }
+        
+        if output == 'zip':
+            update_job(job_id, stage='packaging', progress=90)
+            zip_filename = f"batch_{timestamp}_{run_id}.zip"
+            zip_path = os.path.join(tempfile.gettempdir(), zip_filename)
+            try:
+                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as archive:
+                    for entry in manifest:
+                        if entry.get('path'):
+                            archive.write(entry['path'], entry['filename'])
+                    archive.writestr('manifest.json', json.dumps(
+                        [{k: v for k, v in entry.items() if k != 'path'} for entry in manifest],
+                        ensure_ascii=False, indent=2))
+                update_job(job_id, stage='uploading', progress=95)
+                result['zip_url'] = upload_audio_to_gcs_public(zip_path, f"audio/batch/{zip_filename}")
+                result['filename'] = zip_filename
+            finally:
+                try:
+                    os.unlink(zip_path)
+                except OSError:
+                    pass
+        
+        result['items'] = [{k: v for k, v in entry.items() if k != 'path'} for entry in manifest]
+        logger.info(f"✅ Lote completado: {result['succeeded']}/{len(items)} textos")
+        return result
+    finally:
+        for entry in manifest:
+            if entry.get('path'):
+                try:
+                    os.unlink(entry['path'])
+                except OSError:
+                    pass
+
+@app.route('/api/batch-text-to-audio', methods=['POST'])
+def batch_text_to_audio():
+    """Encolar un lote de textos: JSON {items, audio_format, output} o form-data con batch_file (.zip)"""
+    try:
+        presets = load_presets()
+        if request.is_json:
+            payload = request.get_json(force=True) or {}
+            raw_items = payload.get('items') or []
+            defaults = {}
+        else:
+            payload = request.form
+            batch_file = request.files.get('batch_file')
+            if not batch_file or not batch_file.filename:
+                return jsonify({'error': 'No se proporcionó archivo ZIP ni lista JSON'}), 400
+            # Parámetros del formulario aplicados a todos los textos del ZIP
+            defaults = {field: payload.get(field) for field in ('preset',) + BATCH_VOICE_FIELDS}
+            raw_items = read_batch_zip(batch_file, defaults)
+        
+        audio_format = payload.get('audio_format') or CONFIG.get('default_audio_format', 'mp3')
+        if audio_format not in AUDIO_OUTPUT_CODECS:
+            return jsonify({'error': f'Formato no soportado: {audio_format}'}), 400
+        output = payload.get('output') or 'manifest'
+        if output not in ('manifest', 'zip'):
+            return jsonify({'error': 'output debe ser "manifest" o "zip"'}), 400
+        
+        items = prepare_batch_items(raw_items, presets)
+        job_id = submit_job('batch_tts', run_batch_tts_job, items, audio_format, output)
+        return job_accepted_response(job_id)
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"❌ Error en lote de texto a audio: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Retomar operaciones de Long Audio pendientes
+if not IS_RELOADER_PARENT:
+    resume_long_audio_operations()
+
+mark_startup_phase('routes')
+logger.info(f"⏱️ Arranque en {round((time.perf_counter() - STARTUP_BEGIN) * 1000)} ms")
+
 if __name__ == '__main__':
     # Usar configuración cargada desde config.json
     host = CONFIG.get('host', '127.0.0.1')
@@ -475,6 +475,58 @@ async function reloadGoogleClients() {
     }
 }
 
+// Etiquetas de etapas de trabajos en segundo plano
+const JOB_STAGE_LABELS = {
+    queued: 'En cola...',
+    extracting_audio: 'Extrayendo audio...',
+    uploading_audio: 'Subiendo audio...',
+    transcribing: 'Transcribiendo audio...',
+    translating: 'Traduciendo texto...',
+    generating_subtitles: 'Generando subtítulos...',
+    completed: 'Completado!'
+};
+
+// Esperar a que termine un trabajo consultando su estado periódicamente
+async function waitForJob(jobId, onProgress, intervalMs = 2000) {
+    while (true) {
+        const response = await fetch(`/api/jobs/${jobId}`);
+        const data = await response.json();
+        if (!data.success) {
+            throw new Error(data.error || 'Trabajo no encontrado');
+        }
+        const job = data.job;
+        if (onProgress) onProgress(job);
+        if (job.status === 'failed') {
+            throw new Error(job.error || 'Error desconocido');
+        }
+        if (job.status === 'completed') {
+            const resultResponse = await fetch(`/api/jobs/${jobId}/result`);
+            return await resultResponse.json();
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
+// Esperar a que termine una operación de Long Audio
+async function waitForLongAudio(statusUrl, onProgress, intervalMs = 5000) {
+    while (true) {
+        const response = await fetch(statusUrl);
+        const data = await response.json();
+        if (!data.success) {
+            throw new Error(data.error || 'Operación no encontrada');
+        }
+        const op = data.operation;
+        if (onProgress) onProgress(op);
+        if (op.status === 'failed') {
+            throw new Error(op.error || 'Error desconocido');
+        }
+        if (op.status === 'completed') {
+            return op.result;
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
 // Procesar video
 async function processVideo(event) {
     event.preventDefault();
@@ -489,28 +541,28 @@ async function processVideo(event) {
     
     progressSection.style.display = 'block';
     progressFill.style.width = '0%';
-    progressText.textContent = 'Procesando video...';
+    progressText.textContent = 'Subiendo video...';
     
     try {
-        // Simular progreso
-        let progress = 0;
-        const progressInterval = setInterval(() => {
-            progress += Math.random() * 15;
-            if (progress > 90) progress = 90;
-            progressFill.style.width = `${progress}%`;
-        }, 500);
-        
         const response = await fetch('/api/process', {
             method: 'POST',
             body: formData
         });
         
-        clearInterval(progressInterval);
+        const accepted = await response.json();
+        if (!accepted.success) {
+            throw new Error(accepted.error || 'Error desconocido');
+        }
+        
+        // Consultar el progreso real del trabajo
+        const result = await waitForJob(accepted.job_id, (job) => {
+            progressFill.style.width = `${job.progress || 0}%`;
+            progressText.textContent = JOB_STAGE_LABELS[job.stage] || 'Procesando video...';
+        });
+        
         progressFill.style.width = '100%';
         progressText.textContent = 'Completado!';
         
-        const result = await response.json();
-        
         if (result.success) {
             // Ocultar progreso
             setTimeout(() => {
@@ -525,7 +577,6 @@ async function processVideo(event) {
         }
         
     } catch (error) {
-        clearInterval(progressInterval);
         progressSection.style.display = 'none';
         showNotification(`Error: ${error.message}`, 'error');
         console.error('Error procesando video:', error);
@@ -613,6 +664,10 @@ async function processTextToAudio(event) {
     progressFill.style.width = '0%';
     progressText.textContent = 'Procesando texto...';
     
+    if (formData.get('stream') === 'true') {
+        return streamTextToAudio(formData, progressSection, progressFill, progressText);
+    }
+    
     let progressInterval;
     
     try {
@@ -629,12 +684,24 @@ async function processTextToAudio(event) {
             body: formData
         });
         
+        let result = await response.json();
+        
+        // Long Audio API: la síntesis sigue en el servidor, consultar su estado
+        if (result.success && result.operation_id) {
+            clearInterval(progressInterval);
+            progressText.textContent = 'Sintetizando audio largo...';
+            result = await waitForLongAudio(result.status_url, (op) => {
+                progressFill.style.width = `${Math.min(95, op.progress || 0)}%`;
+                progressText.textContent = op.stage === 'fallback'
+                    ? 'Reintentando por fragmentos...'
+                    : `Sintetizando audio largo... ${Math.round(op.progress || 0)}%`;
+            });
+        }
+        
         clearInterval(progressInterval);
         progressFill.style.width = '100%';
         progressText.textContent = 'Completado!';
         
-        const result = await response.json();
-        
         if (result.success) {
             // Ocultar progreso
             setTimeout(() => {
@@ -658,6 +725,86 @@ async function processTextToAudio(event) {
     }
 }
 
+// Texto a audio progresivo: reproducir cada chunk (SSE) en orden mientras se sintetiza el resto
+async function streamTextToAudio(formData, progressSection, progressFill, progressText) {
+    const audioPlayer = document.getElementById('audioPlayer');
+    const resultsSection = document.getElementById('textResultsSection');
+    const queue = [];
+    const player = document.createElement('audio');
+    player.controls = true;
+    player.style.width = '100%';
+    audioPlayer.innerHTML = '';
+    audioPlayer.appendChild(player);
+    resultsSection.style.display = 'block';
+    
+    const playNext = () => {
+        if (!player.paused && !player.ended) return;
+        const next = queue.shift();
+        if (!next) return;
+        player.src = next;
+        player.play().catch(() => {});
+    };
+    player.addEventListener('ended', () => {
+        URL.revokeObjectURL(player.src);
+        playNext();
+    });
+    
+    const handleEvent = (event, data) => {
+        if (event === 'start') {
+            progressText.textContent = `Sintetizando ${data.chunks} fragmentos...`;
+        } else if (event === 'chunk') {
+            const bytes = Uint8Array.from(atob(data.audio), c => c.charCodeAt(0));
+            queue.push(URL.createObjectURL(new Blob([bytes], { type: data.mime_type })));
+            progressFill.style.width = `${Math.round(((data.index + 1) / data.total) * 90)}%`;
+            progressText.textContent = `Fragmento ${data.index + 1}/${data.total} listo`;
+            playNext();
+        } else if (event === 'done') {
+            progressFill.style.width = '100%';
+            progressText.textContent = 'Completado!';
+            setTimeout(() => { progressSection.style.display = 'none'; }, 1000);
+            currentAudioUrl = data.audio_url;
+            currentAudioFilename = data.filename || 'audio.mp3';
+            document.getElementById('textPreview').textContent = data.text_preview;
+            showNotification('Audio generado exitosamente', 'success');
+        } else if (event === 'error') {
+            throw new Error(data.error || 'Error desconocido');
+        }
+    };
+    
+    try {
+        const response = await fetch('/api/text-to-audio', { method: 'POST', body: formData });
+        if (!response.ok || !response.body) {
+            const result = await response.json();
+            throw new Error(result.error || `HTTP ${response.status}`);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const raw = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                raw.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                if (data) handleEvent(event, JSON.parse(data));
+            }
+        }
+    } catch (error) {
+        progressSection.style.display = 'none';
+        showNotification(`Error: ${error.message}`, 'error');
+        console.error('Error generando audio:', error);
+    }
+}
+
 // Mostrar resultados de texto a audio
 function showTextResults(result) {
     const resultsSection = document.getElementById('textResultsSection');
@@ -1699,6 +1846,16 @@ function showMergeResults(result, processingTime = null, processingMode = null)
             <span class="detail-value">${details.videos_merged}</span>
         </div>`;
     
+    if (details.plan) {
+        const planLabels = { remux: 'Copia sin recodificar', partial: 'Recodificación parcial', transcode: 'Recodificación completa' };
+        const reencoded = details.plan.strategy === 'partial' ? ` (videos ${details.plan.reencoded.join(', ')})` : '';
+        detailsHTML += `
+        <div class="detail-item">
+            <span class="detail-label">Plan</span>
+            <span class="detail-value">${planLabels[details.plan.strategy] || details.plan.strategy}${reencoded}</span>
+        </div>`;
+    }
+    
     // Agregar información de procesamiento si está disponible
     if (processingTime && processingMode) {
         detailsHTML += `